@@ -0,0 +1,62 @@
+"""
+Time per ray of World.color_at for growing numbers of randomly placed spheres,
+without acceleration structure, with the bounding volume hierarchy and with the
+uniform grid.
+
+Run from the top folder with
+
+    uv run python -m benchmarks.bvh_scaling
+"""
+
+import math
+import random
+import time
+
+from src.raytracer import (Camera, Color, Point, PointLight, Sphere, Vector,
+                           World, scaling, translation, view_transform)
+
+
+def random_world(count: int, accelerator: str | None) -> World:
+    rng = random.Random(count)
+    world = World(accelerator=accelerator)
+    radius = 0.5 * (1000 / count) ** (1 / 3)
+    for _ in range(count):
+        sphere = Sphere()
+        sphere.set_transform(
+            translation(
+                rng.uniform(-10, 10), rng.uniform(-10, 10), rng.uniform(-10, 10)
+            ).multiply(scaling(radius, radius, radius))
+        )
+        world.objects.append(sphere)
+    world.lightSource = PointLight(Point(-30, 30, -30), Color(1, 1, 1))
+    return world
+
+
+def time_per_ray(world: World, size: int = 24) -> float:
+    camera = Camera(size, size, math.pi / 3)
+    camera.transform = view_transform(
+        Point(0, 0, -30), Point(0, 0, 0), Vector(0, 1, 0)
+    )
+    world.acceleration_structure()  # build outside of the timing
+    start = time.perf_counter()
+    camera.render(world)
+    return (time.perf_counter() - start) / (size * size)
+
+
+def main():
+    print(
+        f"{'spheres':>8} {'linear [ms/ray]':>16} {'bvh [ms/ray]':>13}"
+        f" {'grid [ms/ray]':>14}"
+    )
+    for count in [10, 100, 1000, 10000]:
+        linear = time_per_ray(random_world(count, None)) if count <= 1000 else math.nan
+        bvh = time_per_ray(random_world(count, "bvh"))
+        grid = time_per_ray(random_world(count, "grid"))
+        print(
+            f"{count:>8} {linear * 1000:>16.3f} {bvh * 1000:>13.3f}"
+            f" {grid * 1000:>14.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
+from .accelerator import Accelerator, load_accelerator, scene_hash
+from .bounds import BoundingBox
+from .bvh import BVH, FlatBVH
 from .camera import Camera
 from .canvas import Canvas
+from .grid import UniformGrid, grid_resolution
 from .lights import *
 from .materials import (ConstantPattern, Material, StripePattern, Texture,
-                        TexturePath, lighting)
-from .matrix import Matrix, create_identity_matrix
-from .ray import Ray
-from .shapes import (Intersection, IntersectionInfo, Plane, Sphere, hit,
-                     prepare_computations)
+                        TextureCache, TexturePath, decode_texture, downsample,
+                        lighting, lighting_array, lighting_batch,
+                        mapped_texture, texture_cache)
+from .matrix import AffineTransform, Matrix, create_identity_matrix
+from .mesh import Mesh, Triangle, intersect_triangles, load_obj
+from .ray import Ray, RayBundle
+from .shapes import (Group, Instance, Intersection, IntersectionInfo, Plane,
+                     Shape, Sphere, hit, prepare_computations)
 from .transformations import *
 from .tuples import ABS_TOL, Color, Colors, Point, Tuple, Vector, create_tuple
-from .world import World
+from .world import SceneObjects, World
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import abc
+import hashlib
+import json
+import math
+import os
+import struct
+from collections.abc import Iterable, Iterator, Sequence
+
+import numpy as np
+
+from .ray import Ray, RayBundle
+from .shapes import Intersection, Shape
+from .tuples import ABS_TOL
+
+# first bytes of the files written by Accelerator.save
+FILE_MAGIC = b"RTACCEL1"
+# the arrays of a saved accelerator start at multiples of this many bytes
+FILE_ALIGNMENT = 64
+
+
+class Accelerator(metaclass=abc.ABCMeta):
+    """
+    Base class of the acceleration structures over the shapes of a scene.
+
+    Shapes with infinite world bounds, like planes, cannot be sorted into a
+    spatial index and are tested for every ray. The world bounds of the other
+    shapes are kept as (N, 3) arrays of their minimum and maximum corners.
+
+    Subclasses keep their index in flat arrays, which lets save write them to a
+    file that load_accelerator maps back into memory.
+    """
+
+    # name of the accelerator in World and in saved files
+    kind = ""
+
+    def __init__(self, shapes: Iterable[Shape]) -> None:
+        self.bounded: list[Shape] = []
+        self.unbounded: list[Shape] = []
+        bounded_indices = []
+        unbounded_indices = []
+        corners = []
+        for index, shape in enumerate(shapes):
+            box = shape.world_bounds()
+            if box.is_empty():
+                continue
+            if box.is_finite():
+                self.bounded.append(shape)
+                bounded_indices.append(index)
+                minimum, maximum = box.minimum, box.maximum
+                corners.append(
+                    (minimum.x, minimum.y, minimum.z, maximum.x, maximum.y, maximum.z)
+                )
+            else:
+                self.unbounded.append(shape)
+                unbounded_indices.append(index)
+        # positions of the shapes in the sequence the accelerator was built from
+        self.bounded_indices = np.array(bounded_indices, np.int64)
+        self.unbounded_indices = np.array(unbounded_indices, np.int64)
+        corners_array = np.array(corners, np.float64).reshape((-1, 6))
+        # pad the boxes so rounding cannot make a ray miss the box of a shape it hits
+        self.minimum = corners_array[:, :3] - ABS_TOL
+        self.maximum = corners_array[:, 3:] + ABS_TOL
+
+    @abc.abstractmethod
+    def candidates(
+        self, ray: Ray, t_min: float = -math.inf, t_max: float = math.inf
+    ) -> Iterator[Shape]:
+        """
+        Shapes that can be hit by the ray between t_min and t_max, every shape
+        is yielded at most once
+        """
+
+    def bundle_candidates(
+        self, bundle: RayBundle, t_max: np.ndarray
+    ) -> Iterator[tuple[Shape, np.ndarray]]:
+        """
+        Vectorised variant of candidates for rays starting at t = 0, every shape
+        that can be hit by rays of the bundle is yielded once together with the
+        indices of these rays
+
+        This queries candidates for one ray after the other, subclasses that can
+        traverse their index with all rays at once override it.
+
+        :param t_max: (N,) array with the distance up to which every ray is
+            followed, callers may lower it while iterating
+        """
+        shapes: dict[int, Shape] = {}
+        rays: dict[int, list[int]] = {}
+        for index, distance in enumerate(t_max.tolist()):
+            for shape in self.candidates(bundle[index], 0, distance):
+                shapes[id(shape)] = shape
+                rays.setdefault(id(shape), []).append(index)
+        for key, indices in rays.items():
+            yield shapes[key], np.array(indices, np.int64)
+
+    def intersect(
+        self, ray: Ray, t_min: float = -math.inf, t_max: float = math.inf
+    ) -> list[Intersection]:
+        """
+        Unsorted intersections with every candidate shape, these can include
+        intersections outside of t_min and t_max
+        """
+        intersections = []
+        for shape in self.candidates(ray, t_min, t_max):
+            intersections += shape.intersect(ray)
+        return intersections
+
+    def occluder(self, ray: Ray, t_max: float) -> Shape | None:
+        """
+        Any shape hit by the ray between t = 0 and t_max, None if there is none
+
+        The traversal stops at the first such shape.
+        """
+        for shape in self.candidates(ray, 0, t_max):
+            if shape.occludes(ray, t_max):
+                return shape
+        return None
+
+    def closest_hit(self, ray: Ray, t_max: float = math.inf) -> Intersection | None:
+        """
+        Nearest intersection with 0 < t < t_max over all shapes
+        """
+        closest = None
+        for shape in self.candidates(ray, 0, t_max):
+            intersection = shape.closest_hit(ray, t_max)
+            if intersection is not None:
+                closest = intersection
+                t_max = intersection.t
+        return closest
+
+    def _closest_unbounded_hit(
+        self, ray: Ray, t_max: float
+    ) -> Intersection | None:
+        closest = None
+        for shape in self.unbounded:
+            intersection = shape.closest_hit(ray, t_max)
+            if intersection is not None:
+                closest = intersection
+                t_max = intersection.t
+        return closest
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """
+        Flat arrays that describe the accelerator completely, see restore
+        """
+        return {
+            "bounded_indices": self.bounded_indices,
+            "unbounded_indices": self.unbounded_indices,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+        }
+
+    def restore(self, shapes: Sequence[Shape], arrays: dict[str, np.ndarray]) -> None:
+        """
+        Set up an accelerator created without __init__ from the result of arrays
+
+        :param shapes: the shapes the accelerator was built from, in the same order
+        """
+        self.bounded_indices = arrays["bounded_indices"]
+        self.unbounded_indices = arrays["unbounded_indices"]
+        self.bounded = [shapes[index] for index in self.bounded_indices.tolist()]
+        self.unbounded = [shapes[index] for index in self.unbounded_indices.tolist()]
+        self.minimum = arrays["minimum"]
+        self.maximum = arrays["maximum"]
+
+    def save(self, file: str | os.PathLike, shapes: Sequence[Shape]) -> None:
+        """
+        Write the accelerator to a binary file, together with the scene_hash of
+        the shapes it was built from
+
+        The file is written next to its destination and then moved into place,
+        so concurrent readers never see a partial file.
+
+        :param shapes: the shapes the accelerator was built from, in the same order
+        """
+        arrays = {
+            name: np.ascontiguousarray(array) for name, array in self.arrays().items()
+        }
+        header = {"kind": self.kind, "scene_hash": scene_hash(shapes), "arrays": {}}
+        # the header size depends on the offsets, which depend on the header size
+        offset = 0
+        while True:
+            position = offset
+            for name, array in arrays.items():
+                header["arrays"][name] = {
+                    "dtype": array.dtype.str,
+                    "shape": list(array.shape),
+                    "offset": position,
+                }
+                position = _aligned(position + array.nbytes)
+            encoded = json.dumps(header).encode()
+            start = _aligned(len(FILE_MAGIC) + 8 + len(encoded))
+            if start == offset:
+                break
+            offset = start
+
+        temporary = f"{os.fspath(file)}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as stream:
+            stream.write(FILE_MAGIC)
+            stream.write(struct.pack("<Q", len(encoded)))
+            stream.write(encoded)
+            for name, array in arrays.items():
+                stream.seek(header["arrays"][name]["offset"])
+                stream.write(array.tobytes())
+        os.replace(temporary, file)
+
+
+def _aligned(position: int) -> int:
+    return -(-position // FILE_ALIGNMENT) * FILE_ALIGNMENT
+
+
+def scene_hash(shapes: Iterable[Shape]) -> str:
+    """
+    Hash of the types, world inverse transforms and world bounds of the shapes
+    and of all shapes inside groups, in order. The world inverse of an instance
+    includes the transform of its prototype, the bounds cover geometry like the
+    vertices of meshes.
+    """
+    digest = hashlib.sha256()
+    for shape in shapes:
+        digest.update(b"(")
+        for leaf in shape.leaves():
+            digest.update(type(leaf).__qualname__.encode())
+            matrix = np.ascontiguousarray(leaf.world_inverse.matrix, np.float64)
+            digest.update(matrix.tobytes())
+            box = leaf.world_bounds()
+            corners = [box.minimum, box.maximum]
+            digest.update(
+                np.array([(p.x, p.y, p.z) for p in corners], np.float64).tobytes()
+            )
+        digest.update(b")")
+    return digest.hexdigest()
+
+
+def load_accelerator(
+    file: str | os.PathLike, shapes: Sequence[Shape]
+) -> Accelerator | None:
+    """
+    Accelerator saved with Accelerator.save, its arrays are mapped into memory
+    read only instead of being read
+
+    :param shapes: the shapes the accelerator was built from, in the same order
+    :returns: None if the scene_hash of the shapes does not match the file
+    """
+    with open(file, "rb") as stream:
+        if stream.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{os.fspath(file)} is not an acceleration structure")
+        (length,) = struct.unpack("<Q", stream.read(8))
+        header = json.loads(stream.read(length))
+    if header["scene_hash"] != scene_hash(shapes):
+        return None
+    kinds = {cls.kind: cls for cls in Accelerator.__subclasses__()}
+    if header["kind"] not in kinds:
+        raise ValueError(f"Unknown accelerator {header['kind']}")
+
+    arrays = {}
+    for name, description in header["arrays"].items():
+        dtype = np.dtype(description["dtype"])
+        shape = tuple(description["shape"])
+        if 0 in shape:
+            # empty arrays cannot be mapped
+            arrays[name] = np.empty(shape, dtype)
+        else:
+            arrays[name] = np.memmap(
+                file, dtype, mode="r", offset=description["offset"], shape=shape
+            )
+    accelerator = kinds[header["kind"]].__new__(kinds[header["kind"]])
+    accelerator.restore(shapes, arrays)
+    return accelerator
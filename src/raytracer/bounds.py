@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import math
+
+from .matrix import Matrix
+from .ray import Ray
+from .tuples import Point
+
+
+class BoundingBox:
+    """
+    Axis aligned box given by its minimum and maximum corner
+    """
+
+    def __init__(
+        self, minimum: Point | None = None, maximum: Point | None = None
+    ) -> None:
+        # the default box is empty and grows when points are added
+        if minimum is None:
+            minimum = Point(math.inf, math.inf, math.inf)
+        if maximum is None:
+            maximum = Point(-math.inf, -math.inf, -math.inf)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @classmethod
+    def infinite(cls) -> BoundingBox:
+        return cls(
+            Point(-math.inf, -math.inf, -math.inf), Point(math.inf, math.inf, math.inf)
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, BoundingBox):
+            return self.minimum == other.minimum and self.maximum == other.maximum
+        else:
+            return False
+
+    def __repr__(self):
+        return f"BoundingBox({self.minimum}, {self.maximum})"
+
+    def is_empty(self) -> bool:
+        return (
+            self.minimum.x > self.maximum.x
+            or self.minimum.y > self.maximum.y
+            or self.minimum.z > self.maximum.z
+        )
+
+    def is_finite(self) -> bool:
+        return all(
+            math.isfinite(value)
+            for value in (
+                self.minimum.x,
+                self.minimum.y,
+                self.minimum.z,
+                self.maximum.x,
+                self.maximum.y,
+                self.maximum.z,
+            )
+        )
+
+    def add_point(self, point: Point) -> None:
+        self.minimum = Point(
+            min(self.minimum.x, point.x),
+            min(self.minimum.y, point.y),
+            min(self.minimum.z, point.z),
+        )
+        self.maximum = Point(
+            max(self.maximum.x, point.x),
+            max(self.maximum.y, point.y),
+            max(self.maximum.z, point.z),
+        )
+
+    def add_box(self, other: BoundingBox) -> None:
+        if not other.is_empty():
+            self.add_point(other.minimum)
+            self.add_point(other.maximum)
+
+    def intersects(
+        self, ray: Ray, t_min: float = -math.inf, t_max: float = math.inf
+    ) -> bool:
+        """
+        Whether the ray passes through the box between t_min and t_max
+        """
+        if self.is_empty():
+            return False
+        if not self.is_finite():
+            return True
+        box = (
+            self.minimum.x,
+            self.minimum.y,
+            self.minimum.z,
+            self.maximum.x,
+            self.maximum.y,
+            self.maximum.z,
+        )
+        return box_entry(box, slab_data(ray), t_min, t_max) is not None
+
+    def corners(self) -> list[Point]:
+        return [
+            Point(x, y, z)
+            for x in (self.minimum.x, self.maximum.x)
+            for y in (self.minimum.y, self.maximum.y)
+            for z in (self.minimum.z, self.maximum.z)
+        ]
+
+    def transform(self, matrix: Matrix) -> BoundingBox:
+        """
+        Smallest axis aligned box containing this box after the transformation
+        """
+        if self.is_empty():
+            return BoundingBox()
+        if not self.is_finite():
+            # infinite extents do not survive rotations, stay conservative
+            return BoundingBox.infinite()
+        box = BoundingBox()
+        for corner in self.corners():
+            box.add_point(matrix.multiply_tuple(corner))
+        return box
+
+
+def slab_data(ray: Ray) -> tuple[float, float, float, float, float, float]:
+    # a huge factor instead of an infinite one avoids 0 * inf for axis parallel rays
+    origin, direction = ray.origin, ray.direction
+    return (
+        origin.x,
+        origin.y,
+        origin.z,
+        1 / direction.x if direction.x else 1e300,
+        1 / direction.y if direction.y else 1e300,
+        1 / direction.z if direction.z else 1e300,
+    )
+
+
+def box_entry(
+    box: tuple,
+    slab: tuple[float, float, float, float, float, float],
+    t_min: float,
+    t_max: float,
+) -> float | None:
+    """
+    Distance at which the ray enters the box, None if it misses the box between
+    t_min and t_max
+
+    :param box: minimum x, y, z followed by maximum x, y, z of the box
+    :param slab: origin and inverse direction of the ray from slab_data
+    """
+    ox, oy, oz, ix, iy, iz = slab
+    t0 = (box[0] - ox) * ix
+    t1 = (box[3] - ox) * ix
+    near, far = (t0, t1) if t0 < t1 else (t1, t0)
+    t0 = (box[1] - oy) * iy
+    t1 = (box[4] - oy) * iy
+    if t0 > t1:
+        t0, t1 = t1, t0
+    near = max(near, t0)
+    far = min(far, t1)
+    t0 = (box[2] - oz) * iz
+    t1 = (box[5] - oz) * iz
+    if t0 > t1:
+        t0, t1 = t1, t0
+    near = max(near, t0, t_min)
+    far = min(far, t1, t_max)
+    if near > far:
+        return None
+    return near
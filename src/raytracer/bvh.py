@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import math
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from typing import Any
+
+import numpy as np
+
+from .accelerator import Accelerator
+from .bounds import box_entry, slab_data
+from .ray import Ray, RayBundle
+from .shapes import Intersection, Shape
+
+# maximum number of items stored in a leaf
+LEAF_SIZE = 4
+# bundles of fewer rays traverse the hierarchy one ray after the other, for them
+# this is faster than testing every node with array operations
+MIN_BUNDLE_SIZE = 8
+
+
+class FlatBVH:
+    """
+    Bounding volume hierarchy over axis aligned boxes, stored in flat arrays.
+
+    Nodes are laid out depth first, so the left child of an interior node is the
+    node right after it. A leaf references node_count[i] > 0 entries of items
+    starting at node_start[i]. For an interior node, node_count[i] is 0 and
+    node_start[i] is the index of its right child.
+    """
+
+    def __init__(
+        self,
+        node_minimum: np.ndarray,
+        node_maximum: np.ndarray,
+        node_start: np.ndarray,
+        node_count: np.ndarray,
+        items: np.ndarray,
+    ) -> None:
+        self.node_minimum = node_minimum
+        self.node_maximum = node_maximum
+        self.node_start = node_start
+        self.node_count = node_count
+        self.items = items
+        # plain python copies of the arrays, element access on them is much faster
+        self._nodes: list[tuple] | None = None
+        self._items: list[int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.node_start)
+
+    @classmethod
+    def build(
+        cls, minimum: np.ndarray, maximum: np.ndarray, leaf_size: int = LEAF_SIZE
+    ) -> FlatBVH:
+        """
+        :param minimum: (N, 3) array with the minimum corner of every item
+        :param maximum: (N, 3) array with the maximum corner of every item
+        """
+        minimum = np.asarray(minimum, np.float64).reshape((-1, 3))
+        maximum = np.asarray(maximum, np.float64).reshape((-1, 3))
+        centroids = (minimum + maximum) / 2
+        items = np.arange(len(minimum))
+
+        # a node is a range of items, all nodes of a level are split at once at
+        # the median centroid along the axis of their largest spread
+        unsplit: set[tuple[int, int]] = set()
+        starts = np.array([0] if len(items) else [], np.int64)
+        ends = np.array([len(items)] if len(items) else [], np.int64)
+        while True:
+            large = ends - starts > leaf_size
+            starts, ends = starts[large], ends[large]
+            if not len(starts):
+                break
+            lower = _range_reduce(np.minimum, centroids[items], starts, ends)
+            upper = _range_reduce(np.maximum, centroids[items], starts, ends)
+            extent = upper - lower
+            axis = np.argmax(extent, axis=1)
+            flat = extent[np.arange(len(axis)), axis] == 0
+            unsplit.update(zip(starts[flat].tolist(), ends[flat].tolist()))
+            starts, ends, axis = starts[~flat], ends[~flat], axis[~flat]
+            lower = lower[~flat, axis]
+            extent = extent[~flat, axis]
+            sizes = ends - starts
+            ranges = np.repeat(np.arange(len(sizes)), sizes)
+            positions = np.arange(sizes.sum()) + np.repeat(
+                starts - np.cumsum(sizes) + sizes, sizes
+            )
+            selection = items[positions]
+            # a single sort of all ranges at once: the integer part of the key is
+            # the range, the fraction in [0, 0.5] the position along its axis
+            keys = centroids[selection, axis[ranges]] - lower[ranges]
+            keys = ranges + keys / (2 * extent[ranges])
+            items[positions] = selection[np.argsort(keys)]
+            # keep the ranges in order, the gaps between them are reduced too
+            middles = (starts + ends) // 2
+            starts = np.column_stack([starts, middles]).ravel()
+            ends = np.column_stack([middles, ends]).ravel()
+
+        # number the nodes depth first
+        node_start: list[int] = []
+        node_count: list[int] = []
+        range_start: list[int] = []
+        range_end: list[int] = []
+
+        def build_node(start: int, end: int) -> int:
+            index = len(node_start)
+            node_start.append(start)
+            node_count.append(end - start)
+            range_start.append(start)
+            range_end.append(end)
+            if end - start <= leaf_size or (start, end) in unsplit:
+                return index
+            middle = (start + end) // 2
+            build_node(start, middle)
+            node_start[index] = build_node(middle, end)
+            node_count[index] = 0
+            return index
+
+        if len(items) > 0:
+            build_node(0, len(items))
+        first = np.array(range_start, np.int64)
+        last = np.array(range_end, np.int64)
+        return cls(
+            _range_reduce(np.minimum, minimum[items], first, last).reshape((-1, 3)),
+            _range_reduce(np.maximum, maximum[items], first, last).reshape((-1, 3)),
+            np.array(node_start, np.int64),
+            np.array(node_count, np.int64),
+            items,
+        )
+
+    def _traversal_data(self) -> tuple[list[tuple], list[int]]:
+        if self._nodes is None or self._items is None:
+            self._nodes = list(
+                zip(
+                    *self.node_minimum.T.tolist(),
+                    *self.node_maximum.T.tolist(),
+                    self.node_start.tolist(),
+                    self.node_count.tolist(),
+                )
+            )
+            self._items = self.items.tolist()
+        return self._nodes, self._items
+
+    def candidates(
+        self, ray: Ray, t_min: float = -math.inf, t_max: float = math.inf
+    ) -> Iterator[int]:
+        """
+        Items of all leaves whose box the ray passes between t_min and t_max
+        """
+        nodes, items = self._traversal_data()
+        if not nodes:
+            return
+        slab = slab_data(ray)
+        stack = [0]
+        while stack:
+            index = stack.pop()
+            node = nodes[index]
+            if box_entry(node, slab, t_min, t_max) is None:
+                continue
+            start, count = node[6], node[7]
+            if count:
+                yield from items[start : start + count]
+            else:
+                stack.append(start)
+                stack.append(index + 1)
+
+    def bundle_leaves(
+        self, origins: np.ndarray, directions: np.ndarray, t_max: np.ndarray
+    ) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Vectorised variant of candidates for rays starting at t = 0. The rays
+        traverse the hierarchy together, every node is tested against all rays
+        that reached it.
+
+        :param origins: (N, 3) array with the origin of every ray
+        :param directions: (N, 3) array with the direction of every ray
+        :param t_max: (N,) array with the distance up to which every ray is
+            followed. It may be lowered while iterating, for example to the
+            closest hit so far, nodes are only entered by rays reaching them
+            before their current t_max.
+        :returns: items of every leaf that was reached, with the indices of the
+            rays that reached it
+        """
+        if not len(self) or not len(origins):
+            return
+        with np.errstate(divide="ignore"):
+            # a huge factor instead of an infinite one avoids 0 * inf, see slab_data
+            inverse = np.where(directions == 0, 1e300, 1 / directions)
+        stack = [(0, np.arange(len(origins)))]
+        while stack:
+            node, rays = stack.pop()
+            t0 = (self.node_minimum[node] - origins[rays]) * inverse[rays]
+            t1 = (self.node_maximum[node] - origins[rays]) * inverse[rays]
+            near = np.maximum(np.minimum(t0, t1).max(axis=1), 0)
+            far = np.minimum(np.maximum(t0, t1).min(axis=1), t_max[rays])
+            rays = rays[near <= far]
+            if not len(rays):
+                continue
+            start, count = int(self.node_start[node]), int(self.node_count[node])
+            if count == 0:
+                stack.append((start, rays))
+                stack.append((node + 1, rays))
+            else:
+                yield self.items[start : start + count], rays
+
+    def closest_hit(
+        self, ray: Ray, t_max: float, hit_item: Callable[[int, float], Any]
+    ) -> Any:
+        """
+        Closest hit over all items, visiting the nodes front to back
+
+        :param hit_item: called with an item and the current t_max, returns a hit
+            with an attribute t < t_max or None. Every hit shrinks t_max, so boxes
+            entered beyond the closest hit so far are skipped.
+        :returns: the hit with the smallest t, None if no item was hit
+        """
+        nodes, items = self._traversal_data()
+        if not nodes:
+            return None
+        slab = slab_data(ray)
+        closest = None
+        entry = box_entry(nodes[0], slab, 0, t_max)
+        stack = [] if entry is None else [(entry, 0)]
+        while stack:
+            entry, index = stack.pop()
+            if entry >= t_max:
+                continue
+            node = nodes[index]
+            start, count = node[6], node[7]
+            if count:
+                for item in items[start : start + count]:
+                    hit = hit_item(item, t_max)
+                    if hit is not None:
+                        closest = hit
+                        t_max = hit.t
+                continue
+            left = box_entry(nodes[index + 1], slab, 0, t_max)
+            right = box_entry(nodes[start], slab, 0, t_max)
+            # push the farther child first, so the nearer one is visited next
+            if left is not None and right is not None and left < right:
+                stack.append((right, start))
+                stack.append((left, index + 1))
+            else:
+                if left is not None:
+                    stack.append((left, index + 1))
+                if right is not None:
+                    stack.append((right, start))
+        return closest
+
+
+def _range_reduce(
+    ufunc: np.ufunc, values: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> np.ndarray:
+    # ufunc over the rows starts[i] <= row < ends[i] of values for every i
+    if not len(starts):
+        return np.zeros((0, values.shape[1]))
+    # padding keeps ends within range, every second result covers a gap
+    padded = np.concatenate([values, values[:1]])
+    bounds = np.column_stack([starts, ends]).ravel()
+    return ufunc.reduceat(padded, bounds, axis=0)[::2]
+
+
+class BVH(Accelerator):
+    """
+    Bounding volume hierarchy over the shapes of a scene
+    """
+
+    kind = "bvh"
+
+    def __init__(self, shapes: Iterable[Shape], leaf_size: int = LEAF_SIZE) -> None:
+        super().__init__(shapes)
+        self.nodes = FlatBVH.build(self.minimum, self.maximum, leaf_size)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        return {
+            **super().arrays(),
+            "node_minimum": self.nodes.node_minimum,
+            "node_maximum": self.nodes.node_maximum,
+            "node_start": self.nodes.node_start,
+            "node_count": self.nodes.node_count,
+            "items": self.nodes.items,
+        }
+
+    def restore(self, shapes: Sequence[Shape], arrays: dict[str, np.ndarray]) -> None:
+        super().restore(shapes, arrays)
+        self.nodes = FlatBVH(
+            arrays["node_minimum"],
+            arrays["node_maximum"],
+            arrays["node_start"],
+            arrays["node_count"],
+            arrays["items"],
+        )
+
+    def candidates(
+        self, ray: Ray, t_min: float = -math.inf, t_max: float = math.inf
+    ) -> Iterator[Shape]:
+        """
+        Shapes whose bounds the ray passes between t_min and t_max
+        """
+        yield from self.unbounded
+        for item in self.nodes.candidates(ray, t_min, t_max):
+            yield self.bounded[item]
+
+    def bundle_candidates(
+        self, bundle: RayBundle, t_max: np.ndarray
+    ) -> Iterator[tuple[Shape, np.ndarray]]:
+        """
+        Shapes whose bounds are passed by rays of the bundle, which traverse the
+        hierarchy together, see FlatBVH.bundle_leaves
+        """
+        if len(bundle) < MIN_BUNDLE_SIZE:
+            yield from super().bundle_candidates(bundle, t_max)
+            return
+        rays = np.arange(len(bundle))
+        for shape in self.unbounded:
+            yield shape, rays
+        for items, rays in self.nodes.bundle_leaves(
+            bundle.origins[:, :3], bundle.directions[:, :3], t_max
+        ):
+            for item in items.tolist():
+                yield self.bounded[item], rays
+
+    def closest_hit(self, ray: Ray, t_max: float = math.inf) -> Intersection | None:
+        """
+        Nearest intersection with 0 < t < t_max over all shapes
+        """
+        closest = self._closest_unbounded_hit(ray, t_max)
+        if closest is not None:
+            t_max = closest.t
+        in_tree = self.nodes.closest_hit(
+            ray, t_max, lambda item, t: self.bounded[item].closest_hit(ray, t)
+        )
+        return closest if in_tree is None else in_tree
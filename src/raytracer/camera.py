@@ -1,13 +1,30 @@
+from __future__ import annotations
+
 import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
+from .bounds import BoundingBox
 from .canvas import Canvas
 from .matrix import create_identity_matrix
-from .ray import Ray
-from .tuples import Point
+from .ray import Ray, RayBundle
+from .shapes import Shape
+from .transformations import Transformable
+from .tuples import ABS_TOL, Point
 from .world import World
 
+# pixels (x0, y0, x1, y1) with x0 <= x < x1 and y0 <= y < y1
+Rectangle = tuple[int, int, int, int]
+
+# side length of the tiles Camera.render restricts primary rays to
+CULLING_TILE_SIZE = 16
+# longest list of objects rays are tested against one by one in a world with an
+# acceleration structure, the structure is used for longer lists
+MAX_CULLED_CANDIDATES = 16
 
-class Camera:
+
+class Camera(Transformable):
     def __init__(self, hsize: int, vsize: int, fov: float):
         self.hsize = hsize
         self.vsize = vsize
@@ -28,6 +45,19 @@ class Camera:
 
         self.pixel_size = self.half_width * 2 / self.hsize
 
+    def invalidate_transform(self) -> None:
+        super().invalidate_transform()
+        self._origin: Point | None = None
+
+    @property
+    def origin(self) -> Point:
+        """
+        Position of the camera in world space
+        """
+        if self._origin is None:
+            self._origin = self.inverse_transform.multiply(Point(0, 0, 0))
+        return self._origin
+
     def ray_for_pixel(self, px: int, py: int) -> Ray:
         xoffest = (px + 0.5) * self.pixel_size
         yoffset = (py + 0.5) * self.pixel_size
@@ -35,18 +65,265 @@ class Camera:
         world_x = self.half_width - xoffest
         world_y = self.half_height - yoffset
 
-        pixel = self.transform.inverse().multiply(Point(world_x, world_y, -1))
-        origin = self.transform.inverse().multiply(Point(0, 0, 0))
+        pixel = self.inverse_transform.multiply(Point(world_x, world_y, -1))
+        origin = self.origin
         direction = (pixel - origin).normalize()
 
-        return Ray(origin, direction)
+        # at distance 1 the ray is as wide as a pixel
+        return Ray(origin, direction, self.pixel_size)
+
+    def rays_for_pixels(self, px: np.ndarray, py: np.ndarray) -> RayBundle:
+        """
+        Vectorised variant of ray_for_pixel for arrays of pixel coordinates
+        """
+        count = len(px)
+        world_x = self.half_width - (px + 0.5) * self.pixel_size
+        world_y = self.half_height - (py + 0.5) * self.pixel_size
+        pixels = np.stack(
+            [world_x, world_y, np.full(count, -1.0), np.ones(count)], axis=1
+        )
+        inverse = self.inverse_transform.matrix
+        pixels = pixels @ inverse.T
+        origin = inverse[:, 3]
+        directions = pixels - origin
+        directions[:, 3] = 0
+        directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+        return RayBundle(np.tile(origin, (count, 1)), directions, self.pixel_size)
+
+    def screen_rectangle(self, box: BoundingBox) -> Rectangle | None:
+        """
+        Pixels whose rays can hit something inside a box given in world space
+
+        The rectangle is conservative: it covers the whole image if the box is
+        infinite or reaches behind the camera, and it is None if no ray can
+        enter the box.
+        """
+        if box.is_empty():
+            return None
+        if not box.is_finite():
+            return (0, 0, self.hsize, self.vsize)
+        minimum = np.array([[box.minimum.x, box.minimum.y, box.minimum.z]])
+        maximum = np.array([[box.maximum.x, box.maximum.y, box.maximum.z]])
+        rectangles, visible = self.screen_rectangles_array(minimum, maximum)
+        return tuple(rectangles[0].tolist()) if visible[0] else None
+
+    def screen_rectangles_array(
+        self, minimum: np.ndarray, maximum: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorised variant of screen_rectangle for finite boxes
+
+        :param minimum: (N, 3) array with the minimum corner of every box
+        :param maximum: (N, 3) array with the maximum corner of every box
+        :returns: (N, 4) array of rectangles and a mask of the boxes that can be
+            seen, the rectangles of the others are meaningless
+        """
+        count = len(minimum)
+        # the 8 corners of every box in camera space, the camera looks down -z
+        selection = np.array(
+            [(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)], bool
+        )
+        corners = np.where(selection, maximum[:, np.newaxis], minimum[:, np.newaxis])
+        corners = np.concatenate([corners, np.ones((count, 8, 1))], axis=2)
+        corners = corners @ self.transform.matrix.T
+        z = corners[:, :, 2]
+        behind = (z > ABS_TOL).all(axis=1)
+        around = (z > -ABS_TOL).any(axis=1)
+        # project onto the image plane at z = -1
+        depth = np.where(around[:, np.newaxis], 1.0, -z)
+        screen_x = corners[:, :, 0] / depth
+        screen_y = corners[:, :, 1] / depth
+        # one extra pixel on every side absorbs rounding of the ray directions
+        x0 = np.floor((self.half_width - screen_x.max(axis=1)) / self.pixel_size) - 1
+        x1 = np.ceil((self.half_width - screen_x.min(axis=1)) / self.pixel_size) + 1
+        y0 = np.floor((self.half_height - screen_y.max(axis=1)) / self.pixel_size) - 1
+        y1 = np.ceil((self.half_height - screen_y.min(axis=1)) / self.pixel_size) + 1
+        rectangles = np.stack(
+            [
+                np.clip(x0, 0, self.hsize),
+                np.clip(y0, 0, self.vsize),
+                np.clip(x1, 0, self.hsize),
+                np.clip(y1, 0, self.vsize),
+            ],
+            axis=1,
+        ).astype(np.int64)
+        rectangles[around] = (0, 0, self.hsize, self.vsize)
+        visible = ~behind & (rectangles[:, 0] < rectangles[:, 2])
+        visible &= rectangles[:, 1] < rectangles[:, 3]
+        return rectangles, visible
+
+    def screen_rectangles(self, world: World) -> list[tuple[Rectangle, Shape]]:
+        """
+        Screen rectangles of all objects of the world that can be seen
+        """
+        image = (0, 0, self.hsize, self.vsize)
+        rectangles: list[tuple[Rectangle, Shape]] = []
+        finite = []
+        corners = []
+        for object in world.objects:
+            box = object.world_bounds()
+            if box.is_empty():
+                continue
+            if not box.is_finite():
+                rectangles.append((image, object))
+                continue
+            finite.append(object)
+            minimum, maximum = box.minimum, box.maximum
+            corners.append(
+                (minimum.x, minimum.y, minimum.z, maximum.x, maximum.y, maximum.z)
+            )
+        if finite:
+            corners_array = np.array(corners)
+            projected, visible = self.screen_rectangles_array(
+                corners_array[:, :3], corners_array[:, 3:]
+            )
+            for rectangle, object, seen in zip(
+                projected.tolist(), finite, visible.tolist()
+            ):
+                if seen:
+                    rectangles.append((tuple(rectangle), object))
+        return rectangles
+
+    @staticmethod
+    def primary_candidates(
+        world: World,
+        rectangles: list[tuple[Rectangle, Shape]],
+        x0: int,
+        y0: int,
+        x1: int,
+        y1: int,
+    ) -> list[Shape] | None:
+        """
+        Objects whose screen rectangle overlaps the pixels x0 <= x < x1, y0 <= y < y1
+
+        :returns: None if the rays are better off with the acceleration structure
+            of the world, that is if these are all objects or too many of them
+        """
+        candidates = [
+            object
+            for (left, top, right, bottom), object in rectangles
+            if left < x1 and x0 < right and top < y1 and y0 < bottom
+        ]
+        if len(candidates) == len(world.objects):
+            return None
+        if world.accelerator is not None and len(candidates) > MAX_CULLED_CANDIDATES:
+            return None
+        return candidates
+
+    def render_tile(
+        self,
+        world: World,
+        x0: int,
+        y0: int,
+        x1: int,
+        y1: int,
+        vectorized: bool = True,
+        rectangles: list[tuple[Rectangle, Shape]] | None = None,
+    ) -> np.ndarray:
+        """
+        Render the pixels x0 <= x < x1, y0 <= y < y1
+
+        Rays from the camera are only tested against objects whose screen rectangle
+        overlaps the tile.
+
+        :param bool vectorized: shade all pixels of the tile with array operations
+            instead of one ray at a time
+        :param rectangles: result of screen_rectangles, computed if not given
+        :returns: (y1 - y0, x1 - x0, 3) array of colors
+        """
+        if rectangles is None:
+            rectangles = self.screen_rectangles(world)
+        candidates = self.primary_candidates(world, rectangles, x0, y0, x1, y1)
+        if not vectorized:
+            colors = np.zeros((y1 - y0, x1 - x0, 3))
+            for y in range(y0, y1):
+                for x in range(x0, x1):
+                    color = world.color_at(self.ray_for_pixel(x, y), candidates)
+                    colors[y - y0, x - x0] = (color.red, color.green, color.blue)
+            return colors
+        py, px = np.mgrid[y0:y1, x0:x1]
+        bundle = self.rays_for_pixels(px.ravel(), py.ravel())
+        colors = world.color_at_bundle(bundle, candidates)
+        return colors.reshape((y1 - y0, x1 - x0, 3))
+
+    def tiles(self, tile_size: int) -> list[tuple[int, int, int, int]]:
+        """
+        Split the image into (x0, y0, x1, y1) tiles of at most tile_size pixels per side
+        """
+        return [
+            (x0, y0, min(x0 + tile_size, self.hsize), min(y0 + tile_size, self.vsize))
+            for y0 in range(0, self.vsize, tile_size)
+            for x0 in range(0, self.hsize, tile_size)
+        ]
+
+    def render_vectorized(self, world: World, tile_size: int = 128) -> Canvas:
+        """
+        Render the world tile by tile, shading all pixels of a tile at once
+
+        Produces the same image as render within ABS_TOL.
+        """
+        canvas = Canvas(self.hsize, self.vsize)
+        rectangles = self.screen_rectangles(world)
+        for tile in self.tiles(tile_size):
+            canvas.tile(*tile)[:] = self.render_tile(
+                world, *tile, rectangles=rectangles
+            )
+        return canvas
+
+    def render_parallel(
+        self,
+        world: World,
+        workers: int | None = None,
+        tile_size: int = 64,
+        vectorized: bool = True,
+    ) -> Canvas:
+        """
+        Render the tiles of the image in a pool of worker processes
+
+        The camera and the world are sent to every worker once when it starts.
+        The result does not depend on the number of workers.
+
+        :param workers: number of processes, defaults to the number of CPUs
+        """
+        canvas = Canvas(self.hsize, self.vsize)
+        tiles = self.tiles(tile_size)
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(self, world)
+        ) as executor:
+            results = executor.map(
+                _render_tile_in_worker, tiles, [vectorized] * len(tiles)
+            )
+            for tile, colors in zip(tiles, results):
+                canvas.tile(*tile)[:] = colors
+        return canvas
 
     def render(self, world: World) -> Canvas:
         canvas = Canvas(self.hsize, self.vsize)
-        for y in range(self.vsize):
-            for x in range(self.hsize):
-                ray = self.ray_for_pixel(x, y)
-                color = world.color_at(ray)
-                canvas.write_pixel(x, y, color)
+        rectangles = self.screen_rectangles(world)
+        for x0, y0, x1, y1 in self.tiles(CULLING_TILE_SIZE):
+            candidates = self.primary_candidates(world, rectangles, x0, y0, x1, y1)
+            for y in range(y0, y1):
+                for x in range(x0, x1):
+                    ray = self.ray_for_pixel(x, y)
+                    color = world.color_at(ray, candidates)
+                    canvas.write_pixel(x, y, color)
 
         return canvas
+
+
+# scene of the current worker process of Camera.render_parallel
+_worker_scene: tuple[Camera, World, list[tuple[Rectangle, Shape]]] | None = None
+
+
+def _init_worker(camera: Camera, world: World) -> None:
+    global _worker_scene
+    _worker_scene = (camera, world, camera.screen_rectangles(world))
+
+
+def _render_tile_in_worker(
+    tile: tuple[int, int, int, int], vectorized: bool
+) -> np.ndarray:
+    camera, world, rectangles = _worker_scene
+    return camera.render_tile(
+        world, *tile, vectorized=vectorized, rectangles=rectangles
+    )
@@ -1,18 +1,58 @@
+import io
+import struct
+import zlib
+from os import PathLike
+from typing import IO
+
+import numpy as np
+from PIL import Image
+
 from .tuples import Color
 
+# maximum length of a line in a plain PPM file
+PPM_LINE_LENGTH = 70
+
+# size of the pixel data scaled and written at once by write_ppm, in bytes
+PPM_CHUNK_SIZE = 1 << 16
+
+# uncompressed size of the strips the image data of a TIFF file is split into
+TIFF_STRIP_SIZE = 1 << 16
+
 
 class Canvas:
     def __init__(self, width: int, height: int, color=Color(0, 0, 0)) -> None:
         self.width = width
         self.height = height
         self.maximum_color_value = 255
-        self.pixels = [color for i in range(width * height)]
+        # row-major pixel data, buffer[row, column] holds red, green and blue
+        self.buffer = np.empty((height, width, 3), np.float32)
+        self.buffer[:] = (color.red, color.green, color.blue)
+
+    @property
+    def pixels(self) -> np.ndarray:
+        """
+        View of the buffer with one row per pixel, in the order row * width + column
+        """
+        return self.buffer.reshape((-1, 3))
+
+    def row(self, row: int) -> np.ndarray:
+        """
+        View of the (width, 3) pixel data of a single row
+        """
+        return self.buffer[row]
+
+    def tile(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """
+        View of the (y1 - y0, x1 - x0, 3) pixel data of x0 <= x < x1, y0 <= y < y1
+        """
+        return self.buffer[y0:y1, x0:x1]
 
     def pixel_at(self, column, row) -> Color:
-        return self.pixels[row * self.width + column]
+        red, green, blue = self.buffer[row, column].tolist()
+        return Color(red, green, blue)
 
     def write_pixel(self, column, row, color):
-        self.pixels[row * self.width + column] = color
+        self.buffer[row, column] = (color.red, color.green, color.blue)
 
     def scale(self, pixel_value):
         scale_value = round(pixel_value * self.maximum_color_value)
@@ -22,34 +62,142 @@ class Canvas:
             return 0
         return scale_value
 
+    def scaled_buffer(self, maximum_color_value: int | None = None) -> np.ndarray:
+        """
+        Vectorised variant of scale for the whole buffer, as an integer array
+
+        :param maximum_color_value: scale to this value instead of maximum_color_value
+        """
+        return self.scaled_rows(0, self.height, maximum_color_value)
+
+    def scaled_rows(
+        self, start: int, stop: int, maximum_color_value: int | None = None
+    ) -> np.ndarray:
+        """
+        scaled_buffer of the rows start <= row < stop only
+        """
+        if maximum_color_value is None:
+            maximum_color_value = self.maximum_color_value
+        # scale in double precision so the result matches scale for every pixel
+        rows = self.buffer[start:stop].astype(np.float64)
+        scaled = np.round(rows * maximum_color_value)
+        return np.clip(scaled, 0, maximum_color_value).astype(np.int64)
+
+    def write_ppm(self, file: IO, binary: bool = False) -> None:
+        """
+        Stream the canvas to a file object, only a few rows are scaled at a time
+
+        :param file: text file for the plain P3 format, binary file for P6
+        :param bool binary: write the binary P6 format instead of P3
+        """
+        header = f"{self.width} {self.height}\n{self.maximum_color_value}\n"
+        rows_per_chunk = max(1, PPM_CHUNK_SIZE // max(1, 3 * self.width))
+        chunks = (
+            self.scaled_rows(start, start + rows_per_chunk)
+            for start in range(0, self.height, rows_per_chunk)
+        )
+        if binary:
+            file.write(f"P6\n{header}".encode("ascii"))
+            file.writelines(chunk.astype(np.uint8).tobytes() for chunk in chunks)
+            return
+
+        file.write(f"P3\n{header}")
+        tokens = [f"{value} " for value in range(self.maximum_color_value + 1)]
+        for chunk in chunks:
+            for row in chunk.reshape((len(chunk), -1)).tolist():
+                lines = []
+                line_length = 0
+                line_start = 0
+                for index, value in enumerate(row):
+                    token_length = len(tokens[value])
+                    if line_length + token_length > PPM_LINE_LENGTH:
+                        lines.append("".join(tokens[v] for v in row[line_start:index]))
+                        line_start = index
+                        line_length = 0
+                    line_length += token_length
+                lines.append("".join(tokens[v] for v in row[line_start:]))
+                file.write("\n".join(lines))
+                file.write("\n")
+
     def convert_to_ppm(self) -> str:
-        ppm = f"P3\n{self.width} {self.height}\n{self.maximum_color_value}"
-
-        for row in range(self.height):
-            ppm += "\n"
-
-            for column in range(self.width):
-                pixel = self.pixel_at(column, row)
-                ppm = (
-                    ppm
-                    + f"{self.scale(pixel.red)} {self.scale(pixel.green)} {self.scale(pixel.blue)} "
-                )
-        ppm += "\n"
-
-        # ppm_with_linebreaks = ""
-        # for line in ppm.splitlines():
-        #     if len(line) > 70:
-        #         splitted = line.split()
-
-        #         index = 0
-        #         while index < len(splitted):
-        #             current_line = ""
-        #             while len(current_line) <= 70 and index < len(splitted):
-        #                 current_line += splitted[index]
-        #                 index += 1
-        #             ppm_with_linebreaks = current_line + "\n"
-        #         #ppm_with_linebreaks  += str('\n'.join(line[i:i+70] for i in range(0,len(line), 70)))
-        #     else:
-        #         ppm_with_linebreaks += line
-        #         ppm_with_linebreaks += "\n"
-        return ppm
+        ppm = io.StringIO()
+        self.write_ppm(ppm)
+        return ppm.getvalue()
+
+    def save_png(self, file: str | PathLike | IO[bytes]) -> None:
+        """
+        Save the canvas as an 8 bit RGB PNG image
+        """
+        image = Image.fromarray(self.scaled_buffer().astype(np.uint8))
+        image.save(file, format="PNG")
+
+    def save_tiff(self, file: str | PathLike | IO[bytes]) -> None:
+        """
+        Save the canvas as a deflate compressed 16 bit RGB TIFF image
+        """
+        # Pillow cannot write 16 bit RGB images, so the TIFF file is assembled here
+        scaled = self.scaled_buffer(65535).astype("<u2")
+        rows_per_strip = max(1, TIFF_STRIP_SIZE // max(1, scaled[0].nbytes))
+        strips = [
+            zlib.compress(scaled[row : row + rows_per_strip].tobytes())
+            for row in range(0, self.height, rows_per_strip)
+        ]
+
+        entry_count = 13
+        # header, image file directory, then the values that do not fit into it
+        bits_offset = 8 + 2 + 12 * entry_count + 4
+        resolution_offset = bits_offset + 6
+        strip_offsets_offset = resolution_offset + 8
+        strip_counts_offset = strip_offsets_offset + 4 * len(strips)
+        strip_offsets = []
+        offset = strip_counts_offset + 4 * len(strips)
+        for strip in strips:
+            strip_offsets.append(offset)
+            offset += len(strip)
+
+        short, long, rational = 3, 4, 5
+
+        def entry(tag: int, field_type: int, count: int, value: int) -> bytes:
+            if field_type == short and count == 1:
+                return struct.pack("<HHIHH", tag, field_type, count, value, 0)
+            return struct.pack("<HHII", tag, field_type, count, value)
+
+        if len(strips) == 1:
+            # a single value is stored directly in the entry instead of an offset
+            strip_offsets_entry = entry(273, long, 1, strip_offsets[0])
+            strip_counts_entry = entry(279, long, 1, len(strips[0]))
+        else:
+            strip_offsets_entry = entry(273, long, len(strips), strip_offsets_offset)
+            strip_counts_entry = entry(279, long, len(strips), strip_counts_offset)
+        entries = [
+            entry(256, long, 1, self.width),
+            entry(257, long, 1, self.height),
+            entry(258, short, 3, bits_offset),
+            entry(259, short, 1, 8),  # adobe deflate
+            entry(262, short, 1, 2),  # RGB
+            strip_offsets_entry,
+            entry(277, short, 1, 3),
+            entry(278, long, 1, rows_per_strip),
+            strip_counts_entry,
+            entry(282, rational, 1, resolution_offset),
+            entry(283, rational, 1, resolution_offset),
+            entry(284, short, 1, 1),  # chunky
+            entry(296, short, 1, 1),  # no resolution unit
+        ]
+
+        data = [
+            struct.pack("<2sHI", b"II", 42, 8),
+            struct.pack("<H", entry_count),
+            *entries,
+            struct.pack("<I", 0),
+            struct.pack("<HHH", 16, 16, 16),
+            struct.pack("<II", 1, 1),
+            struct.pack(f"<{len(strips)}I", *strip_offsets),
+            struct.pack(f"<{len(strips)}I", *[len(strip) for strip in strips]),
+            *strips,
+        ]
+        if isinstance(file, (str, PathLike)):
+            with open(file, "wb") as binary_file:
+                binary_file.writelines(data)
+        else:
+            file.writelines(data)
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import itertools
+import math
+from collections.abc import Iterable, Iterator, Sequence
+
+import numpy as np
+
+from .accelerator import Accelerator
+from .bounds import box_entry, slab_data
+from .ray import Ray
+from .shapes import Intersection, Shape
+
+# cells per shape the grid resolution aims for
+GRID_DENSITY = 3.0
+# upper limit of the number of cells along each axis
+MAX_GRID_RESOLUTION = 128
+
+
+def grid_resolution(
+    extent: np.ndarray, count: int, density: float = GRID_DENSITY
+) -> np.ndarray:
+    """
+    Number of cells along each axis for count shapes in a box of the given extent
+
+    The cells are close to cubes and there are about density cells per shape.
+    """
+    # flat scenes still get a volume, their thin axis ends up with a single cell
+    extent = np.maximum(extent, extent.max() * 1e-3)
+    cells_per_unit = (density * count / np.prod(extent)) ** (1 / 3)
+    resolution = np.round(extent * cells_per_unit).astype(np.int64)
+    return np.clip(resolution, 1, MAX_GRID_RESOLUTION)
+
+
+class UniformGrid(Accelerator):
+    """
+    Regular grid over the bounds of the shapes of a scene, every cell lists the
+    shapes overlapping it.
+
+    Rays walk through the cells they pass in order (3D-DDA), so the closest hit
+    can stop at the first cell containing a hit. For many small shapes spread
+    evenly over the scene this beats the BVH.
+
+    The cells are stored like a sparse matrix: the shapes of cell i are
+    cell_items[cell_start[i]:cell_start[i + 1]], where cells are numbered
+    x + resolution[0] * (y + resolution[1] * z).
+    """
+
+    kind = "grid"
+
+    def __init__(
+        self, shapes: Iterable[Shape], density: float = GRID_DENSITY
+    ) -> None:
+        super().__init__(shapes)
+        if self.bounded:
+            self.grid_minimum = self.minimum.min(axis=0)
+            grid_maximum = self.maximum.max(axis=0)
+            extent = grid_maximum - self.grid_minimum
+            self.resolution = grid_resolution(extent, len(self.bounded), density)
+            self.cell_size = np.maximum(extent, 1e-12) / self.resolution
+        else:
+            self.grid_minimum = np.zeros(3)
+            self.resolution = np.zeros(3, np.int64)
+            self.cell_size = np.ones(3)
+
+        low = self._cell_coordinates(self.minimum)
+        high = self._cell_coordinates(self.maximum)
+        cells: list[int] = []
+        items: list[int] = []
+        nx, ny = int(self.resolution[0]), int(self.resolution[1])
+        for item, (x0, y0, z0), (x1, y1, z1) in zip(
+            itertools.count(), low.tolist(), high.tolist()
+        ):
+            for z, y, x in itertools.product(
+                range(z0, z1 + 1), range(y0, y1 + 1), range(x0, x1 + 1)
+            ):
+                cells.append(x + nx * (y + ny * z))
+                items.append(item)
+        cells_array = np.array(cells, np.int64)
+        order = np.argsort(cells_array, kind="stable")
+        self.cell_items = np.array(items, np.int64)[order]
+        counts = np.bincount(cells_array, minlength=int(np.prod(self.resolution)))
+        self.cell_start = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        # plain python copies of the arrays, element access on them is much faster
+        self._cell_start: list[int] | None = None
+        self._cell_items: list[int] | None = None
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        return {
+            **super().arrays(),
+            "grid_minimum": self.grid_minimum,
+            "resolution": self.resolution,
+            "cell_size": self.cell_size,
+            "cell_start": self.cell_start,
+            "cell_items": self.cell_items,
+        }
+
+    def restore(self, shapes: Sequence[Shape], arrays: dict[str, np.ndarray]) -> None:
+        super().restore(shapes, arrays)
+        self.grid_minimum = arrays["grid_minimum"]
+        self.resolution = arrays["resolution"]
+        self.cell_size = arrays["cell_size"]
+        self.cell_start = arrays["cell_start"]
+        self.cell_items = arrays["cell_items"]
+        self._cell_start = None
+        self._cell_items = None
+
+    def _cell_coordinates(self, points: np.ndarray) -> np.ndarray:
+        coordinates = np.floor((points - self.grid_minimum) / self.cell_size)
+        return np.clip(coordinates, 0, self.resolution - 1).astype(np.int64)
+
+    def _traversal_data(self) -> tuple[list[int], list[int]]:
+        if self._cell_start is None or self._cell_items is None:
+            self._cell_start = self.cell_start.tolist()
+            self._cell_items = self.cell_items.tolist()
+        return self._cell_start, self._cell_items
+
+    def cells(
+        self, ray: Ray, t_min: float = -math.inf, t_max: float = math.inf
+    ) -> Iterator[tuple[int, float, float]]:
+        """
+        Cells the ray passes between t_min and t_max, in the order it enters them
+
+        :returns: cell number with the distances at which the ray enters and
+            leaves the cell
+        """
+        if not self.bounded:
+            return
+        minimum = self.grid_minimum.tolist()
+        size = self.cell_size.tolist()
+        resolution = self.resolution.tolist()
+        grid_box = (*minimum, *(minimum + self.resolution * self.cell_size).tolist())
+        t = box_entry(grid_box, slab_data(ray), t_min, t_max)
+        if t is None:
+            return
+        origin = (ray.origin.x, ray.origin.y, ray.origin.z)
+        direction = (ray.direction.x, ray.direction.y, ray.direction.z)
+        cell = [0, 0, 0]
+        step = [0, 0, 0]
+        next_t = [math.inf] * 3
+        delta_t = [math.inf] * 3
+        for axis in range(3):
+            position = origin[axis] + t * direction[axis]
+            c = int((position - minimum[axis]) / size[axis])
+            cell[axis] = c = min(max(c, 0), resolution[axis] - 1)
+            d = direction[axis]
+            if d > 0:
+                step[axis] = 1
+                next_t[axis] = (minimum[axis] + (c + 1) * size[axis] - origin[axis]) / d
+                delta_t[axis] = size[axis] / d
+            elif d < 0:
+                step[axis] = -1
+                next_t[axis] = (minimum[axis] + c * size[axis] - origin[axis]) / d
+                delta_t[axis] = -size[axis] / d
+
+        nx, ny = resolution[0], resolution[1]
+        while True:
+            axis = 0 if next_t[0] < next_t[1] else 1
+            if next_t[2] < next_t[axis]:
+                axis = 2
+            exit = next_t[axis]
+            yield cell[0] + nx * (cell[1] + ny * cell[2]), t, exit
+            if exit > t_max:
+                return
+            cell[axis] += step[axis]
+            if not 0 <= cell[axis] < resolution[axis]:
+                return
+            t = exit
+            next_t[axis] += delta_t[axis]
+
+    def candidates(
+        self, ray: Ray, t_min: float = -math.inf, t_max: float = math.inf
+    ) -> Iterator[Shape]:
+        """
+        Shapes in the cells the ray passes between t_min and t_max
+        """
+        yield from self.unbounded
+        cell_start, cell_items = self._traversal_data()
+        seen = set()
+        for cell, _, _ in self.cells(ray, t_min, t_max):
+            for item in cell_items[cell_start[cell] : cell_start[cell + 1]]:
+                if item not in seen:
+                    seen.add(item)
+                    yield self.bounded[item]
+
+    def closest_hit(self, ray: Ray, t_max: float = math.inf) -> Intersection | None:
+        """
+        Nearest intersection with 0 < t < t_max over all shapes
+
+        The walk through the cells stops once the closest hit lies inside the
+        current cell, every shape is tested at most once.
+        """
+        closest = self._closest_unbounded_hit(ray, t_max)
+        if closest is not None:
+            t_max = closest.t
+        cell_start, cell_items = self._traversal_data()
+        tested = set()
+        for cell, entry, exit in self.cells(ray, 0, t_max):
+            if entry >= t_max:
+                break
+            for item in cell_items[cell_start[cell] : cell_start[cell + 1]]:
+                if item in tested:
+                    continue
+                tested.add(item)
+                intersection = self.bounded[item].closest_hit(ray, t_max)
+                if intersection is not None:
+                    closest = intersection
+                    t_max = intersection.t
+            if t_max <= exit:
+                break
+        return closest
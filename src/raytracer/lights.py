@@ -1,3 +1,7 @@
+from __future__ import annotations
+
+import numpy as np
+
 from .tuples import Color, Point
 
 # from .materials import Material
@@ -8,9 +12,15 @@ class PointLight:
         self,
         position: Point,
         intensity: Color,  # , material: Material = None
+        radius: float | None = None,
     ) -> None:
+        """
+        :param radius: distance at which the light has faded out completely, see
+            attenuation. None for a light with the same intensity everywhere.
+        """
         self.position = position
         self.intensity = intensity
+        self.radius = radius
         # if material is None:
         #    self.material = Material()
         # else:
@@ -19,8 +29,37 @@ class PointLight:
     def __eq__(self, value):
         if isinstance(value, PointLight):
             return (
-                value.position == self.position and value.intensity == self.intensity
+                value.position == self.position
+                and value.intensity == self.intensity
+                and value.radius == self.radius
                 # and value.material == self.material
             )
         else:
             return False
+
+    def attenuation(self, distance: float) -> float:
+        """
+        Factor of the intensity at the given distance from the light, it falls
+        smoothly from 1 at the light to 0 at the radius
+        """
+        if self.radius is None:
+            return 1.0
+        ratio = distance / self.radius
+        return max(1 - ratio * ratio, 0.0) ** 2
+
+    def attenuation_array(self, distances: np.ndarray) -> np.ndarray:
+        """
+        Vectorised variant of attenuation
+        """
+        if self.radius is None:
+            return np.ones(len(distances))
+        ratio = distances / self.radius
+        return np.maximum(1 - ratio * ratio, 0.0) ** 2
+
+    def intensity_at(self, point: Point) -> Color:
+        """
+        Intensity of the light arriving at the point
+        """
+        if self.radius is None:
+            return self.intensity
+        return self.intensity * self.attenuation((self.position - point).magnitude())
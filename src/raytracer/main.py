@@ -337,10 +337,7 @@ def main():
     # canvas = scence_with_patterns_chapter_ten()
     canvas = simple_scene_of_a_sphere()
 
-    ppm = canvas.convert_to_ppm()
-
-    with open("output.ppm", "w") as text_file:
-        text_file.write(ppm)
+    canvas.save_png("output.png")
 
 
 if __name__ == "__main__":
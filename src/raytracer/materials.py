@@ -7,29 +7,63 @@ if TYPE_CHECKING:
     from .lights import PointLight
 
 import abc
+import hashlib
 import math
+import os
+from collections import OrderedDict
 
 import numpy as np
 from PIL import Image
 
 from . import shapes
-from .matrix import create_identity_matrix
+from .matrix import Matrix, create_identity_matrix
+from .transformations import Transformable
 from .tuples import Color, Point
 
 
-class Pattern(metaclass=abc.ABCMeta):
+class Pattern(Transformable, metaclass=abc.ABCMeta):
     def __init__(self):
         self.transform = create_identity_matrix()
 
+    def shape_to_pattern(self, shape: shapes.Shape) -> Matrix:
+        """
+        Combined transformation from world space to pattern space for the given
+        shape, the shape keeps it, see Shape.world_to_pattern
+        """
+        return shape.world_to_pattern(self)
+
     @abc.abstractmethod
     def pattern_at(self, point: Point) -> Color:
         pass
 
-    def pattern_at_shape(self, shape: shapes.Shape, world_point: Point) -> Color:
-        object_point = shape.transform.inverse().multiply(world_point)
-        pattern_point = self.transform.inverse().multiply(object_point)
+    def pattern_at_shape(
+        self, shape: shapes.Shape, world_point: Point, footprint: float = 0.0
+    ) -> Color:
+        """
+        :param footprint: width of the ray at the point, see Ray.spread
+        """
+        pattern_point = self.shape_to_pattern(shape).multiply(world_point)
         return self.pattern_at(pattern_point)
 
+    def pattern_at_array(self, points: np.ndarray) -> np.ndarray:
+        # fallback for patterns without a vectorised lookup
+        colors = [self.pattern_at(Point(*point[:3])) for point in points.tolist()]
+        return np.array([(c.red, c.green, c.blue) for c in colors], np.float64)
+
+    def pattern_at_shape_array(
+        self,
+        shape: shapes.Shape,
+        world_points: np.ndarray,
+        footprints: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        Colors as an (N, 3) array for an (N, 4) array of world points on the shape
+
+        :param footprints: (N,) array with the width of the rays at the points
+        """
+        pattern_points = world_points @ self.shape_to_pattern(shape).matrix.T
+        return self.pattern_at_array(pattern_points)
+
 
 class TexturePath:
     earthTexture = "src/raytracer/textures/world_texture.png"
@@ -37,27 +71,333 @@ class TexturePath:
     vertical = "src/raytracer/textures/vertical.jpg"
 
 
+# default upper limit for the texels held by the texture cache, in bytes
+TEXTURE_CACHE_BYTES = 1 << 30
+# directory for converted texels that processes map into memory, None disables it
+TEXTURE_CACHE_DIRECTORY = os.environ.get("RAYTRACER_TEXTURE_CACHE")
+
+
+def decode_texture(path: str | os.PathLike) -> np.ndarray:
+    """
+    Texels of an image file as a (height, width, 3) float32 array of colors in [0, 1]
+
+    The values stay sRGB encoded, they are not linearised. The canvas writes colors
+    without encoding them either, so textures come out as stored in the file.
+    """
+    with Image.open(path) as image:
+        texels = np.asarray(image.convert("RGB"), np.float32)
+    texels /= 255
+    return texels
+
+
+def downsample(texels: np.ndarray) -> np.ndarray:
+    """
+    Next smaller mip level, every texel is the mean of 2 x 2 texels of the given
+    level. Odd sizes repeat their last row or column.
+    """
+    height, width = texels.shape[:2]
+    if height > 1:
+        if height % 2:
+            texels = np.concatenate([texels, texels[-1:]])
+        texels = (texels[0::2] + texels[1::2]) / 2
+    if width > 1:
+        if width % 2:
+            texels = np.concatenate([texels, texels[:, -1:]], axis=1)
+        texels = (texels[:, 0::2] + texels[:, 1::2]) / 2
+    return texels
+
+
+def mapped_texture(
+    path: str | os.PathLike, directory: str | os.PathLike, level: int = 0
+) -> np.ndarray:
+    """
+    Texels of an image file mapped read only from a .npy file in directory
+
+    The first call converts the image with decode_texture and writes the file,
+    later calls from any process map the same file, so they share its pages.
+    The file name covers the path, size and modification time of the image,
+    an edited image is converted again.
+
+    :param level: mip level, every level is downsampled from the previous one
+    """
+    path = os.path.abspath(path)
+    status = os.stat(path)
+    key = f"{path}\0{status.st_size}\0{status.st_mtime_ns}"
+    name = hashlib.sha256(key.encode()).hexdigest()[:32]
+    if level:
+        name = f"{name}-{level}"
+    file = os.path.join(directory, f"{name}.npy")
+    if not os.path.exists(file):
+        if level:
+            texels = downsample(mapped_texture(path, directory, level - 1))
+        else:
+            texels = decode_texture(path)
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{file}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as stream:
+            np.save(stream, texels)
+        os.replace(temporary, file)
+    return np.load(file, mmap_mode="r")
+
+
+class TextureCache:
+    """
+    Decoded textures by path, shared by all Texture instances of a process.
+
+    Every image is decoded once and handed out as the same read only array.
+    When the texels exceed max_bytes, the least recently requested textures are
+    dropped from the cache. Textures that still use them keep their array, it
+    is only decoded again for the next request.
+
+    With a directory, the texels are mapped from files written by
+    mapped_texture instead of being decoded, see TEXTURE_CACHE_DIRECTORY.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = TEXTURE_CACHE_BYTES,
+        directory: str | os.PathLike | None = TEXTURE_CACHE_DIRECTORY,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        # mip levels by absolute path, loaded up to the full resolution texels
+        self._levels: OrderedDict[str, list[np.ndarray]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    def __contains__(self, path: str | os.PathLike) -> bool:
+        return os.path.abspath(path) in self._levels
+
+    def get(self, path: str | os.PathLike) -> np.ndarray:
+        """
+        Read only (height, width, 3) float32 texels of the image at path
+        """
+        return self._entry(path)[0]
+
+    def levels(self, path: str | os.PathLike) -> list[np.ndarray]:
+        """
+        Mip pyramid of the image at path, from the texels returned by get down
+        to a single texel, see downsample. The pyramid is built once.
+        """
+        key = os.path.abspath(path)
+        levels = self._entry(key)
+        while max(levels[-1].shape[:2]) > 1:
+            if self.directory is None:
+                level = downsample(levels[-1])
+                level.flags.writeable = False
+            else:
+                level = mapped_texture(key, self.directory, len(levels))
+            levels.append(level)
+            self.nbytes += level.nbytes
+        self.evict()
+        return levels
+
+    def _entry(self, path: str | os.PathLike) -> list[np.ndarray]:
+        key = os.path.abspath(path)
+        levels = self._levels.get(key)
+        if levels is not None:
+            self.hits += 1
+            self._levels.move_to_end(key)
+            return levels
+        self.misses += 1
+        if self.directory is None:
+            texels = decode_texture(key)
+            texels.flags.writeable = False
+        else:
+            texels = mapped_texture(key, self.directory)
+        levels = [texels]
+        self._levels[key] = levels
+        self.nbytes += texels.nbytes
+        self.evict()
+        return levels
+
+    def evict(self) -> None:
+        """
+        Drop least recently requested textures until the cache fits max_bytes,
+        the most recent one is always kept
+        """
+        while self.nbytes > self.max_bytes and len(self._levels) > 1:
+            _, levels = self._levels.popitem(last=False)
+            self.nbytes -= sum(level.nbytes for level in levels)
+
+    def clear(self) -> None:
+        self._levels.clear()
+        self.nbytes = 0
+
+
+# the cache used by Texture
+texture_cache = TextureCache()
+
+
+# filtering modes of Texture
+TEXTURE_FILTERS = ("nearest", "bilinear")
+
+
 class Texture(Pattern):
-    def __init__(self, pathToTexture: TexturePath) -> None:
-        image = Image.open(pathToTexture)
-        self.texture = np.asarray(image)
+    """
+    Image mapped onto a shape through its texture_transform.
+
+    Rays with a footprint, see Ray.spread, sample the mip level whose texels
+    are about as wide as the footprint, so distant shapes do not alias.
+    """
+
+    def __init__(
+        self, pathToTexture: TexturePath, filtering: str = "nearest"
+    ) -> None:
+        """
+        :param filtering: "nearest" to use the closest texel, "bilinear" to
+            interpolate between the four closest texels of the mip level
+        """
+        super().__init__()
+        if filtering not in TEXTURE_FILTERS:
+            raise ValueError(f"Unknown texture filtering {filtering}")
+        self.path = pathToTexture
+        self.filtering = filtering
+        self.texture = texture_cache.get(pathToTexture)
         self.u_max, self.v_max, _ = self.texture.shape
-
-    def pattern_at_shape(self, shape: shapes.Shape, world_point: Point) -> Color:
-        object_point = shape.transform.inverse().multiply(world_point)
-        # if abs(object_point.magnitude() - 1) < 0.001:
-        #    return Color(1, 1, 0)
-        # if 1 - object_point.z < 0.2:
-        #    return Colors.red
-        # if 1 - object_point.y < 0.2:
-        #    return Colors.blue
-        # if 1 - object_point.x < 0.2:
-        #    return Colors.green
+        self._levels: list[np.ndarray] | None = None
+
+    def __getstate__(self) -> dict:
+        # worker processes look the texels up in their own cache instead of
+        # receiving a copy of them
+        state = self.__dict__.copy()
+        del state["texture"]
+        state["_levels"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.texture = texture_cache.get(self.path)
+
+    def mip_levels(self) -> list[np.ndarray]:
+        """
+        Mip pyramid of the texture, see TextureCache.levels
+        """
+        if self._levels is None:
+            self._levels = texture_cache.levels(self.path)
+        return self._levels
+
+    def pattern_at_shape(
+        self, shape: shapes.Shape, world_point: Point, footprint: float = 0.0
+    ) -> Color:
+        object_point = shape.world_inverse.multiply(world_point)
         v, u = shape.texture_transform(object_point)
-        index_u = math.floor(self.u_max * u)
-        index_v = math.floor(self.v_max * v)
-        color = self.texture[index_u, index_v]
-        return Color(color[0] / 255, color[1] / 255, color[2] / 255)
+        texels = self.texture
+        if footprint > 0:
+            texels = self.mip_levels()[self.mip_level(shape, object_point, footprint)]
+        height, width = texels.shape[:2]
+        if self.filtering == "nearest":
+            row = min(max(math.floor(height * u), 0), height - 1)
+            column = min(max(math.floor(width * v), 0), width - 1)
+            return Color(*texels[row, column].tolist())
+        # texel centers lie at half integer coordinates
+        y = height * u - 0.5
+        x = width * v - 0.5
+        row = math.floor(y)
+        column = math.floor(x)
+        fy = y - row
+        fx = x - column
+        row0 = min(max(row, 0), height - 1)
+        row1 = min(max(row + 1, 0), height - 1)
+        column0 = min(max(column, 0), width - 1)
+        column1 = min(max(column + 1, 0), width - 1)
+        corners = texels[[row0, row0, row1, row1], [column0, column1, column0, column1]]
+        weights = ((1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy)
+        return Color(
+            *[sum(w * c for w, c in zip(weights, channel)) for channel in corners.T]
+        )
+
+    def mip_level(
+        self, shape: shapes.Shape, object_point: Point, footprint: float
+    ) -> int:
+        """
+        Mip level whose texels are about as wide as the footprint at the point
+
+        The texels a footprint covers are estimated from the change of the
+        texture coordinates when the point moves by the footprint along each
+        object axis.
+
+        :param object_point: point on the shape in object space
+        :param footprint: footprint in world space
+        """
+        offset = footprint * shape.object_scale
+        v, u = shape.texture_transform(object_point)
+        texels = 1.0
+        for moved in (
+            Point(object_point.x + offset, object_point.y, object_point.z),
+            Point(object_point.x, object_point.y + offset, object_point.z),
+            Point(object_point.x, object_point.y, object_point.z + offset),
+        ):
+            moved_v, moved_u = shape.texture_transform(moved)
+            # the horizontal coordinate wraps around, as on a sphere
+            dv = (moved_v - v + 0.5) % 1 - 0.5
+            texels = max(texels, abs(moved_u - u) * self.u_max, abs(dv) * self.v_max)
+        level = math.floor(math.log2(texels) + 0.5)
+        return min(level, len(self.mip_levels()) - 1)
+
+    def pattern_at_shape_array(
+        self,
+        shape: shapes.Shape,
+        world_points: np.ndarray,
+        footprints: np.ndarray | None = None,
+    ) -> np.ndarray:
+        object_points = world_points @ shape.world_inverse.matrix.T
+        v, u = shape.texture_transform_array(object_points)
+        if footprints is None or not np.any(footprints > 0):
+            return self._sample(self.texture, u, v)
+        levels = self.mip_level_array(shape, object_points, footprints)
+        colors = np.empty((len(world_points), 3))
+        for level in np.unique(levels).tolist():
+            mask = levels == level
+            colors[mask] = self._sample(self.mip_levels()[level], u[mask], v[mask])
+        return colors
+
+    def mip_level_array(
+        self, shape: shapes.Shape, object_points: np.ndarray, footprints: np.ndarray
+    ) -> np.ndarray:
+        """
+        Vectorised variant of mip_level
+
+        :param object_points: (N, 4) array of points on the shape in object space
+        :param footprints: (N,) array of footprints in world space
+        """
+        offsets = footprints * shape.object_scale
+        v, u = shape.texture_transform_array(object_points)
+        texels = np.ones(len(object_points))
+        for axis in range(3):
+            moved = object_points.copy()
+            moved[:, axis] += offsets
+            moved_v, moved_u = shape.texture_transform_array(moved)
+            dv = (moved_v - v + 0.5) % 1 - 0.5
+            texels = np.maximum(texels, abs(moved_u - u) * self.u_max)
+            texels = np.maximum(texels, abs(dv) * self.v_max)
+        levels = np.floor(np.log2(texels) + 0.5).astype(np.intp)
+        return np.minimum(levels, len(self.mip_levels()) - 1)
+
+    def _sample(self, texels: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        # u runs down the rows of the texels, v along the columns
+        height, width = texels.shape[:2]
+        if self.filtering == "nearest":
+            rows = np.clip(np.floor(height * u), 0, height - 1).astype(np.intp)
+            columns = np.clip(np.floor(width * v), 0, width - 1).astype(np.intp)
+            return texels[rows, columns].astype(np.float64)
+        y = height * u - 0.5
+        x = width * v - 0.5
+        row = np.floor(y)
+        column = np.floor(x)
+        fy = (y - row)[:, np.newaxis]
+        fx = (x - column)[:, np.newaxis]
+        row0 = np.clip(row, 0, height - 1).astype(np.intp)
+        row1 = np.clip(row + 1, 0, height - 1).astype(np.intp)
+        column0 = np.clip(column, 0, width - 1).astype(np.intp)
+        column1 = np.clip(column + 1, 0, width - 1).astype(np.intp)
+        top = texels[row0, column0] * (1 - fx) + texels[row0, column1] * fx
+        bottom = texels[row1, column0] * (1 - fx) + texels[row1, column1] * fx
+        return top * (1 - fy) + bottom * fy
 
     def pattern_at(self, point):
         return
@@ -75,6 +415,14 @@ class StripePattern(Pattern):
         else:
             return self.c2
 
+    def pattern_at_array(self, points: np.ndarray) -> np.ndarray:
+        first = np.floor(points[:, 0]) % 2 == 0
+        return np.where(
+            first[:, np.newaxis],
+            (self.c1.red, self.c1.green, self.c1.blue),
+            (self.c2.red, self.c2.green, self.c2.blue),
+        )
+
 
 class ConstantPattern(Pattern):
     def __init__(self, color: Color):
@@ -84,6 +432,10 @@ class ConstantPattern(Pattern):
     def pattern_at(self, point: Point) -> Color:
         return self.color
 
+    def pattern_at_array(self, points: np.ndarray) -> np.ndarray:
+        color = (self.color.red, self.color.green, self.color.blue)
+        return np.tile(color, (len(points), 1))
+
 
 @dataclass
 class Material:
@@ -116,28 +468,125 @@ def lighting(
     shape = intersectionInfo.intersection.shape
     m = shape.material
 
-    color = m.pattern.pattern_at_shape(shape, intersectionInfo.point)
+    color = m.pattern.pattern_at_shape(
+        shape, intersectionInfo.point, intersectionInfo.footprint
+    )
 
-    effective_color = color.hadamard_product(light.intensity)
-    lightv = (light.position - intersectionInfo.point).normalize()
-    ambient = effective_color * m.ambient
+    intensity = light.intensity_at(intersectionInfo.point)
+    effective_color = color.hadamard_product(intensity)
+    lightv = (light.position - intersectionInfo.point).normalize_()
 
     if in_shadow:
-        return ambient
+        return effective_color.imul(m.ambient)
 
     light_dot_normal = lightv.dot(intersectionInfo.normalv)
     if light_dot_normal < 0:
-        diffuse = Color(0, 0, 0)
-        specular = Color(0, 0, 0)
-    else:
-        diffuse = effective_color * m.diffuse * light_dot_normal
-        reflectv = -lightv.reflect(intersectionInfo.normalv)
-        reflect_dot_eye = reflectv.dot(intersectionInfo.eyev)
-
-        if reflect_dot_eye <= 0:
-            specular = Color(0, 0, 0)
-        else:
-            factor = reflect_dot_eye**m.shininess
-            specular = light.intensity * m.specular * factor
+        # neither diffuse nor specular contribution
+        return effective_color.imul(m.ambient)
+
+    result = effective_color * m.ambient
+    result.fma(effective_color, m.diffuse * light_dot_normal)
+    reflectv = -lightv.reflect(intersectionInfo.normalv)
+    reflect_dot_eye = reflectv.dot(intersectionInfo.eyev)
 
-    return ambient + diffuse + specular
+    if reflect_dot_eye > 0:
+        factor = reflect_dot_eye**m.shininess
+        result.fma(intensity, m.specular * factor)
+
+    return result
+
+
+def lighting_array(
+    light: PointLight,
+    shape: shapes.Shape,
+    points: np.ndarray,
+    eyev: np.ndarray,
+    normalv: np.ndarray,
+    in_shadow: np.ndarray,
+    footprints: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Vectorised variant of lighting for many hits on the same shape
+
+    :param points: (N, 4) array of world points
+    :param eyev: (N, 4) array of eye vectors
+    :param normalv: (N, 4) array of normal vectors
+    :param in_shadow: (N,) boolean array
+    :param footprints: (N,) array with the width of the rays at the points
+    :returns: (N, 3) array of colors
+    """
+    m = shape.material
+    color = m.pattern.pattern_at_shape_array(shape, points, footprints)
+    return lighting_batch(
+        light,
+        color,
+        points,
+        eyev,
+        normalv,
+        m.ambient,
+        m.diffuse,
+        m.specular,
+        m.shininess,
+        in_shadow,
+    )
+
+
+def lighting_batch(
+    light: PointLight,
+    colors: np.ndarray,
+    points: np.ndarray,
+    eyev: np.ndarray,
+    normalv: np.ndarray,
+    ambient: float | np.ndarray,
+    diffuse: float | np.ndarray,
+    specular: float | np.ndarray,
+    shininess: float | np.ndarray,
+    in_shadow: np.ndarray,
+) -> np.ndarray:
+    """
+    Lighting of many hits at once, which can lie on shapes with different
+    materials
+
+    The branches of lighting become masks: hits in shadow or facing away from
+    the light only get ambient light, and specular light needs the reflection
+    of the light to point towards the eye.
+
+    :param colors: (N, 3) array with the pattern colors at the hits
+    :param points: (N, 4) array of world points
+    :param eyev: (N, 4) array of eye vectors
+    :param normalv: (N, 4) array of normal vectors
+    :param ambient: material parameter, a float or an (N,) array, as are
+        diffuse, specular and shininess
+    :param in_shadow: (N,) boolean array
+    :returns: (N, 3) array of colors
+    """
+    intensity = np.array(
+        (light.intensity.red, light.intensity.green, light.intensity.blue)
+    )
+    position = np.array((light.position.x, light.position.y, light.position.z, 0))
+    ambient, diffuse, specular, shininess = (
+        np.asarray(parameter, np.float64)
+        for parameter in (ambient, diffuse, specular, shininess)
+    )
+
+    lightv = position - points
+    lightv[:, 3] = 0
+    distances = np.linalg.norm(lightv, axis=1)
+    lightv /= distances[:, np.newaxis]
+    if light.radius is not None:
+        intensity = intensity * light.attenuation_array(distances)[:, np.newaxis]
+    effective_color = colors * intensity
+    result = effective_color * ambient[..., np.newaxis]
+
+    light_dot_normal = np.einsum("ij,ij->i", lightv, normalv)
+    lit = ~in_shadow & (light_dot_normal >= 0)
+    diffuse = np.where(lit, diffuse * light_dot_normal, 0)
+    result += effective_color * diffuse[:, np.newaxis]
+
+    # reflect(-lightv, normal) == -lightv.reflect(normal)
+    reflectv = 2 * light_dot_normal[:, np.newaxis] * normalv - lightv
+    reflect_dot_eye = np.einsum("ij,ij->i", reflectv, eyev)
+    shiny = lit & (reflect_dot_eye > 0)
+    factor = np.where(shiny, reflect_dot_eye, 0) ** shininess
+    result += intensity * np.where(shiny, specular * factor, 0)[:, np.newaxis]
+    return result
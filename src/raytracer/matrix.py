@@ -4,10 +4,59 @@ import math
 
 import numpy as np
 
-from .ray import Ray
+from .ray import Ray, RayBundle
 from .tuples import Tuple
 
 
+class AffineTransform:
+    """
+    Affine 4x4 transformation stored as the plain float coefficients of its
+    first three rows (the last row is always 0, 0, 0, 1).
+
+    Transforming a single tuple with scalar arithmetic avoids the per-call
+    overhead of NumPy, which dominates for 4-vectors.
+    """
+
+    __slots__ = (
+        "m00", "m01", "m02", "m03",
+        "m10", "m11", "m12", "m13",
+        "m20", "m21", "m22", "m23",
+    )  # fmt: skip
+
+    def __init__(self, matrix: np.ndarray) -> None:
+        (
+            (self.m00, self.m01, self.m02, self.m03),
+            (self.m10, self.m11, self.m12, self.m13),
+            (self.m20, self.m21, self.m22, self.m23),
+        ) = matrix[:3].tolist()
+
+    def multiply_tuple(self, other: Tuple) -> Tuple:
+        x, y, z, w = other.x, other.y, other.z, other.w
+        return Tuple(
+            self.m00 * x + self.m01 * y + self.m02 * z + self.m03 * w,
+            self.m10 * x + self.m11 * y + self.m12 * z + self.m13 * w,
+            self.m20 * x + self.m21 * y + self.m22 * z + self.m23 * w,
+            w,
+        )
+
+    def multiply_ray(self, other: Ray) -> Ray:
+        return Ray(
+            self.multiply_tuple(other.origin), self.multiply_tuple(other.direction)
+        )
+
+    def multiply_vector(self, other: Tuple) -> Tuple:
+        """
+        Product of the upper left 3x3 block with the x, y and z of other, w is 0
+        """
+        x, y, z = other.x, other.y, other.z
+        return Tuple(
+            self.m00 * x + self.m01 * y + self.m02 * z,
+            self.m10 * x + self.m11 * y + self.m12 * z,
+            self.m20 * x + self.m21 * y + self.m22 * z,
+            0,
+        )
+
+
 class Matrix:
     def __init__(self, values: list[float] | None = None, dimension: int = 4) -> None:
         self.dimension = dimension
@@ -19,11 +68,48 @@ class Matrix:
         else:
             raise ValueError("Mismatch between length of values and dimension")
 
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix
+
+    @matrix.setter
+    def matrix(self, matrix: np.ndarray) -> None:
+        self._matrix = matrix
+        self._affine_checked = False
+        self._linear: AffineTransform | None = None
+
+    def is_affine(self) -> bool:
+        return self.dimension == 4 and bool((self._matrix[3] == (0, 0, 0, 1)).all())
+
+    @property
+    def affine(self) -> AffineTransform | None:
+        """
+        Scalar fast path for this matrix, None if the matrix is not an affine 4x4 matrix
+        """
+        if not self._affine_checked:
+            self._affine = AffineTransform(self._matrix) if self.is_affine() else None
+            self._affine_checked = True
+        return self._affine
+
+    def multiply_vector(self, other: Tuple) -> Tuple:
+        """
+        Transform the direction other by the upper left 3x3 block of this 4x4
+        matrix, the result has w = 0 whatever the last row of the matrix is
+
+        This is how normals are transformed by the inverse transpose, whose
+        last row holds the translation, so it has a scalar fast path of its own.
+        """
+        if self._linear is None:
+            self._linear = AffineTransform(self._matrix)
+        return self._linear.multiply_vector(other)
+
     def get_value_at(self, row: int, column: int) -> float:
         return self.matrix[row][column]
 
     def set_value_at(self, row: int, column: int, value: float) -> None:
         self.matrix[row][column] = value
+        self._affine_checked = False
+        self._linear = None
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, Matrix):
@@ -48,25 +134,40 @@ class Matrix:
         else:
             return False
 
-    def multiply(self, other: Matrix | Tuple | Ray) -> Matrix | Tuple | Ray:
+    def multiply(
+        self, other: Matrix | Tuple | Ray | RayBundle
+    ) -> Matrix | Tuple | Ray | RayBundle:
         if isinstance(other, Tuple):
             return self.multiply_tuple(other)
         elif isinstance(other, Matrix):
             return self.multiply_matrix(other)
         elif isinstance(other, Ray):
             return self._multiply_ray(other)
+        elif isinstance(other, RayBundle):
+            return self._multiply_ray_bundle(other)
 
     def _multiply_ray(self, other: Ray):
+        affine = self.affine
+        if affine is not None:
+            return affine.multiply_ray(other)
         transformed_origin = self.multiply_tuple(other.origin)
         transformed_direction = self.multiply_tuple(other.direction)
         return Ray(transformed_origin, transformed_direction)
 
+    def _multiply_ray_bundle(self, other: RayBundle) -> RayBundle:
+        # rows are tuples, so M @ t for every row is rows @ M^T
+        transposed = self.matrix.T
+        return RayBundle(other.origins @ transposed, other.directions @ transposed)
+
     def multiply_matrix(self, other: Matrix) -> Matrix:
         result = Matrix()
         result.matrix = self.matrix @ other.matrix
         return result
 
     def multiply_tuple(self, other: Tuple) -> Tuple:
+        affine = self.affine
+        if affine is not None:
+            return affine.multiply_tuple(other)
         tuple = np.array([other.x, other.y, other.z, other.w])
         result = self.matrix @ tuple
         return Tuple(result[0], result[1], result[2], result[3])
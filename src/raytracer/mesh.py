@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import io
+import os
+import re
+from collections.abc import Iterator
+
+import numpy as np
+
+from .bounds import BoundingBox
+from .bvh import FlatBVH
+from .ray import Ray, RayBundle
+from .shapes import Intersection, Shape
+from .tuples import ABS_TOL, Point, Vector
+
+# rays whose determinant with a triangle is smaller are parallel to it
+PARALLEL_TOL = 1e-12
+# maximum number of triangles in a leaf of the hierarchy inside a mesh
+MESH_LEAF_SIZE = 8
+# number of bytes of an OBJ file parsed at once
+OBJ_CHUNK_SIZE = 1 << 24
+
+
+def intersect_triangles(
+    origins: np.ndarray,
+    directions: np.ndarray,
+    v0: np.ndarray,
+    e1: np.ndarray,
+    e2: np.ndarray,
+) -> np.ndarray:
+    """
+    Möller–Trumbore test of every ray against every triangle
+
+    :param origins: (N, 3) array of ray origins
+    :param directions: (N, 3) array of ray directions
+    :param v0: (K, 3) array with the first corner of every triangle
+    :param e1: (K, 3) array of edges from the first to the second corner
+    :param e2: (K, 3) array of edges from the first to the third corner
+    :returns: (N, K) array of distances, inf where a ray misses a triangle or
+        hits it at t <= 0
+    """
+    p = np.cross(directions[:, np.newaxis], e2)
+    determinant = np.einsum("nkc,kc->nk", p, e1)
+    s = origins[:, np.newaxis] - v0
+    q = np.cross(s, e1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f = 1 / determinant
+        u = f * np.einsum("nkc,nkc->nk", s, p)
+        v = f * np.einsum("nkc,nc->nk", q, directions)
+        t = f * np.einsum("nkc,kc->nk", q, e2)
+    hits = np.abs(determinant) >= PARALLEL_TOL
+    hits &= (u >= 0) & (u <= 1) & (v >= 0) & (u + v <= 1) & (t > 0)
+    return np.where(hits, t, np.inf)
+
+
+def _intersect_triangle(triangle: tuple, ray: Ray) -> float | None:
+    # scalar variant of intersect_triangles, also returns negative distances
+    ax, ay, az, e1x, e1y, e1z, e2x, e2y, e2z = triangle
+    dx, dy, dz = ray.direction.x, ray.direction.y, ray.direction.z
+    px = dy * e2z - dz * e2y
+    py = dz * e2x - dx * e2z
+    pz = dx * e2y - dy * e2x
+    determinant = e1x * px + e1y * py + e1z * pz
+    if abs(determinant) < PARALLEL_TOL:
+        return None
+    f = 1 / determinant
+    sx, sy, sz = ray.origin.x - ax, ray.origin.y - ay, ray.origin.z - az
+    u = f * (sx * px + sy * py + sz * pz)
+    if u < 0 or u > 1:
+        return None
+    qx = sy * e1z - sz * e1y
+    qy = sz * e1x - sx * e1z
+    qz = sx * e1y - sy * e1x
+    v = f * (dx * qx + dy * qy + dz * qz)
+    if v < 0 or u + v > 1:
+        return None
+    return f * (e2x * qx + e2y * qy + e2z * qz)
+
+
+class Triangle(Shape):
+    """
+    Triangle with the corners p1, p2 and p3, many triangles are better stored
+    in a Mesh
+    """
+
+    def __init__(self, p1: Point, p2: Point, p3: Point):
+        super().__init__()
+        self.p1 = p1
+        self.p2 = p2
+        self.p3 = p3
+        self.e1 = p2 - p1
+        self.e2 = p3 - p1
+        self.normal = self.e2.cross(self.e1).normalize()
+        e1, e2 = self.e1, self.e2
+        self._data = (p1.x, p1.y, p1.z, e1.x, e1.y, e1.z, e2.x, e2.y, e2.z)
+
+    def bounds(self) -> BoundingBox:
+        box = BoundingBox()
+        for corner in (self.p1, self.p2, self.p3):
+            box.add_point(corner)
+        return box
+
+    def shape_specific_intersect(self, ray: Ray) -> list[Intersection]:
+        t = _intersect_triangle(self._data, ray)
+        return [] if t is None else [Intersection(t, self)]
+
+    def shape_specific_normal_at(
+        self, object_point: Point, hit: Intersection | None = None
+    ) -> Vector:
+        return self.normal
+
+    def shape_specific_normal_at_array(
+        self, object_points: np.ndarray, faces: np.ndarray | None = None
+    ) -> np.ndarray:
+        normal = (self.normal.x, self.normal.y, self.normal.z, 0.0)
+        return np.tile(normal, (len(object_points), 1))
+
+    def shape_specific_intersect_bundle(self, bundle: RayBundle) -> np.ndarray:
+        data = np.array(self._data).reshape((3, 1, 3))
+        return intersect_triangles(
+            bundle.origins[:, :3], bundle.directions[:, :3], *data
+        )[:, 0]
+
+
+class Mesh(Shape):
+    """
+    Triangle mesh given by an (V, 3) array of vertices and an (F, 3) array with
+    the indices of the corners of every triangle. Normals are flat, every face
+    has its own.
+
+    Rays are tested against the triangles through a bounding volume hierarchy
+    over the faces, built in object space. Intersections carry the index of the
+    face that was hit.
+    """
+
+    def __init__(
+        self,
+        vertices: np.ndarray,
+        faces: np.ndarray,
+        leaf_size: int = MESH_LEAF_SIZE,
+    ):
+        super().__init__()
+        self.vertices = np.ascontiguousarray(vertices, np.float64).reshape((-1, 3))
+        self.faces = np.ascontiguousarray(faces, np.int64).reshape((-1, 3))
+        if len(self.faces) and (
+            self.faces.min() < 0 or self.faces.max() >= len(self.vertices)
+        ):
+            raise ValueError("Mesh faces refer to vertices that do not exist")
+        corners = self.vertices[self.faces]
+        self.v0 = corners[:, 0]
+        self.e1 = corners[:, 1] - self.v0
+        self.e2 = corners[:, 2] - self.v0
+        normals = np.cross(self.e2, self.e1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # degenerate faces get nan normals, but they are never hit
+            self.normals = normals / np.linalg.norm(normals, axis=1)[:, np.newaxis]
+        minimum = corners.min(axis=1)
+        maximum = corners.max(axis=1)
+        self._box = BoundingBox()
+        if len(self.faces):
+            self._box = BoundingBox(
+                Point(*minimum.min(axis=0)), Point(*maximum.max(axis=0))
+            )
+        # flat faces have flat boxes, pad them like the boxes of the scene BVH
+        self.tree = FlatBVH.build(minimum - ABS_TOL, maximum + ABS_TOL, leaf_size)
+        self._triangles: list[tuple] | None = None
+
+    def _triangle_data(self) -> list[tuple]:
+        # plain python copies of the triangles for the scalar ray queries
+        if self._triangles is None:
+            self._triangles = [
+                tuple(row)
+                for row in np.hstack([self.v0, self.e1, self.e2]).tolist()
+            ]
+        return self._triangles
+
+    def bounds(self) -> BoundingBox:
+        return self._box
+
+    def shape_specific_intersect(self, ray: Ray) -> list[Intersection]:
+        triangles = self._triangle_data()
+        intersections = []
+        for face in self.tree.candidates(ray):
+            t = _intersect_triangle(triangles[face], ray)
+            if t is not None:
+                intersections.append(Intersection(t, self, face))
+        intersections.sort(key=lambda intersection: intersection.t)
+        return intersections
+
+    def shape_specific_closest_hit(
+        self, ray: Ray, t_max: float
+    ) -> Intersection | None:
+        triangles = self._triangle_data()
+
+        def hit_face(face: int, t_max: float) -> Intersection | None:
+            t = _intersect_triangle(triangles[face], ray)
+            if t is not None and 0 < t < t_max:
+                return Intersection(t, self, face)
+            return None
+
+        return self.tree.closest_hit(ray, t_max, hit_face)
+
+    def shape_specific_occludes(self, ray: Ray, t_max: float) -> bool:
+        triangles = self._triangle_data()
+        for face in self.tree.candidates(ray, 0, t_max):
+            t = _intersect_triangle(triangles[face], ray)
+            if t is not None and 0 < t < t_max:
+                return True
+        return False
+
+    def shape_specific_intersect_bundle(self, bundle: RayBundle) -> np.ndarray:
+        return self.shape_specific_intersect_bundle_faces(bundle)[0]
+
+    def shape_specific_intersect_bundle_faces(
+        self, bundle: RayBundle
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The rays traverse the hierarchy together, every node is tested against
+        all rays that reached it and have not hit anything closer
+        """
+        origins = bundle.origins[:, :3]
+        directions = bundle.directions[:, :3]
+        ts = np.full(len(bundle), np.inf)
+        faces = np.full(len(bundle), -1, np.int64)
+        # lowering ts to the hits keeps the rays out of nodes behind them
+        for items, rays in self.tree.bundle_leaves(origins, directions, ts):
+            leaf_ts = intersect_triangles(
+                origins[rays],
+                directions[rays],
+                self.v0[items],
+                self.e1[items],
+                self.e2[items],
+            )
+            nearest = np.argmin(leaf_ts, axis=1)
+            leaf_t = leaf_ts[np.arange(len(rays)), nearest]
+            closer = leaf_t < ts[rays]
+            ts[rays[closer]] = leaf_t[closer]
+            faces[rays[closer]] = items[nearest[closer]]
+        return ts, faces
+
+    def shape_specific_normal_at(
+        self, object_point: Point, hit: Intersection | None = None
+    ) -> Vector:
+        if hit is None or hit.face is None:
+            raise ValueError("The normal of a mesh depends on the face that was hit")
+        return Vector(*self.normals[hit.face])
+
+    def shape_specific_normal_at_array(
+        self, object_points: np.ndarray, faces: np.ndarray | None = None
+    ) -> np.ndarray:
+        if faces is None:
+            raise ValueError("The normal of a mesh depends on the face that was hit")
+        normals = np.zeros((len(object_points), 4))
+        normals[:, :3] = self.normals[faces]
+        return normals
+
+
+# lines of an OBJ file with vertices and faces, the group is the rest of the
+# line after the keyword, which can be surrounded by any whitespace but line breaks
+_VERTEX_LINE = re.compile(rb"^[^\S\n]*v[^\S\n](.*\n)", re.MULTILINE)
+_FACE_LINE = re.compile(rb"^[^\S\n]*f[^\S\n](.*\n)", re.MULTILINE)
+# texture coordinate and normal indices of face corners
+_CORNER_SUFFIX = re.compile(rb"/\S*")
+
+
+def load_obj(file: str | os.PathLike) -> Mesh:
+    """
+    Mesh with the vertices and faces of a Wavefront OBJ file
+
+    Polygons are split into triangles. Texture coordinates, normals, groups and
+    materials are ignored. The file is parsed in chunks, each of which goes
+    through numpy as a whole instead of line by line.
+    """
+    vertices: list[np.ndarray] = []
+    faces: list[np.ndarray] = []
+    vertex_count = 0
+    for chunk in _obj_chunks(file):
+        parsed = _parse_obj_chunk(chunk)
+        if parsed is None:
+            parsed = _parse_obj_lines(chunk, vertex_count)
+        vertices.append(parsed[0])
+        faces.append(parsed[1])
+        vertex_count += len(parsed[0])
+    return Mesh(
+        np.concatenate(vertices) if vertices else np.zeros((0, 3)),
+        np.concatenate(faces) if faces else np.zeros((0, 3), np.int64),
+    )
+
+
+def _obj_chunks(file: str | os.PathLike) -> Iterator[bytes]:
+    # blocks of whole lines
+    with open(file, "rb") as stream:
+        rest = b""
+        while block := stream.read(OBJ_CHUNK_SIZE):
+            block = (rest + block).replace(b"\r", b"")
+            end = block.rfind(b"\n") + 1
+            rest = block[end:]
+            if end:
+                yield block[:end]
+        if rest:
+            yield rest + b"\n"
+
+
+def _parse_numbers(text: bytes, rows: int, dtype: type) -> np.ndarray | None:
+    # (rows, width) array with the numbers of the lines of text, None if the
+    # lines have different numbers of words, a word is not a number or a line
+    # has no numbers
+    if not rows:
+        return np.zeros((0, 3), dtype)
+    try:
+        numbers = np.loadtxt(io.BytesIO(text), dtype, ndmin=2)
+    except ValueError:
+        return None
+    # loadtxt skips lines without numbers
+    return numbers if len(numbers) == rows else None
+
+
+def _parse_obj_chunk(chunk: bytes) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Vertices and faces of a chunk of lines, None if the chunk needs to be parsed
+    line by line
+    """
+    vertex_lines = _VERTEX_LINE.findall(chunk)
+    face_lines = _FACE_LINE.findall(chunk)
+    vertices = _parse_numbers(b"".join(vertex_lines), len(vertex_lines), np.float64)
+    if vertices is None or vertices.shape[1] < 3:
+        return None
+    indices = _parse_numbers(
+        _CORNER_SUFFIX.sub(b"", b"".join(face_lines)), len(face_lines), np.int64
+    )
+    # anything but triangles with positive indices
+    if indices is None or indices.shape[1] != 3 or (indices <= 0).any():
+        return None
+    return vertices[:, :3], indices - 1
+
+
+def _parse_obj_lines(
+    chunk: bytes, vertex_count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    # general case with polygons and indices relative to the last vertex
+    vertices = []
+    faces = []
+    for line in chunk.decode().splitlines():
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == "v":
+            vertices.append([float(word) for word in words[1:4]])
+        elif words[0] == "f":
+            count = vertex_count + len(vertices)
+            corners = [_corner_index(word, count) for word in words[1:]]
+            for index in range(1, len(corners) - 1):
+                faces.append((corners[0], corners[index], corners[index + 1]))
+    return (
+        np.array(vertices, np.float64).reshape((-1, 3)),
+        np.array(faces, np.int64).reshape((-1, 3)),
+    )
+
+
+def _corner_index(word: str, vertex_count: int) -> int:
+    index = int(word.split("/", 1)[0])
+    return index - 1 if index > 0 else vertex_count + index
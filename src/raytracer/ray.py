@@ -1,10 +1,70 @@
-from .tuples import Point, Vector
+from __future__ import annotations
+
+import numpy as np
+
+from .tuples import Point, Tuple, Vector
 
 
 class Ray:
-    def __init__(self, origin: Point, direction: Vector) -> None:
+    def __init__(self, origin: Point, direction: Vector, spread: float = 0.0) -> None:
+        """
+        :param spread: growth of the width of the ray per unit of t. Camera rays
+            widen to cover a pixel, textures pick their mip level from the width
+            t * spread at a hit.
+        """
         self.origin = origin
         self.direction = direction
+        self.spread = spread
 
     def position(self, t: float) -> Point:
         return self.origin + t * self.direction
+
+
+class RayBundle:
+    """
+    Batch of rays stored as a structure of arrays.
+
+    :param origins: (N, 4) array with one homogeneous point per row
+    :param directions: (N, 4) array with one homogeneous vector per row
+    :param spread: spread of every ray, see Ray
+    """
+
+    def __init__(
+        self, origins: np.ndarray, directions: np.ndarray, spread: float = 0.0
+    ) -> None:
+        self.origins = np.asarray(origins, np.float64)
+        self.directions = np.asarray(directions, np.float64)
+        self.spread = spread
+        if (
+            self.origins.ndim != 2
+            or self.origins.shape[1] != 4
+            or self.origins.shape != self.directions.shape
+        ):
+            raise ValueError("Origins and directions must both be (N, 4) arrays")
+
+    @classmethod
+    def from_rays(cls, rays: list[Ray]) -> RayBundle:
+        origins = [(r.origin.x, r.origin.y, r.origin.z, r.origin.w) for r in rays]
+        directions = [
+            (r.direction.x, r.direction.y, r.direction.z, r.direction.w) for r in rays
+        ]
+        return cls(
+            np.array(origins, np.float64).reshape(-1, 4),
+            np.array(directions, np.float64).reshape(-1, 4),
+        )
+
+    def __len__(self) -> int:
+        return len(self.origins)
+
+    def __getitem__(self, index: int) -> Ray:
+        return Ray(
+            Tuple(*self.origins[index].tolist()),
+            Tuple(*self.directions[index].tolist()),
+            self.spread,
+        )
+
+    def position(self, t: np.ndarray) -> np.ndarray:
+        """
+        Points at distance t along each ray as an (N, 4) array
+        """
+        return self.origins + np.asarray(t)[:, np.newaxis] * self.directions
@@ -2,49 +2,332 @@ from __future__ import annotations
 
 import abc
 import math
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 
+import numpy as np
+
 from . import materials as mat
+from .bounds import BoundingBox
 from .matrix import Matrix, create_identity_matrix
-from .ray import Ray
+from .ray import Ray, RayBundle
+from .transformations import Transformable
 from .tuples import ABS_TOL, Point, Vector
 
 
-class Shape(metaclass=abc.ABCMeta):
+class ChangeCounter:
+    """
+    Number of changes to the shapes of a scene, shared by the scene and all
+    shapes in it, see Shape.add_scene
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        # the scenes of a shape that is part of this scene only, shared by all
+        # such shapes
+        self.alone = (self,)
+        # shapes added to the scene more than once, e.g. the prototype of several
+        # instances, and how often, they leave the scene once removed as often
+        self.references: dict[Shape, int] = {}
+
+
+class Shape(Transformable, metaclass=abc.ABCMeta):
+    # incremented whenever the transform of the shape, or of a shape inside it,
+    # or the children of a group change, lets cached bounds and world space
+    # matrices notice they are outdated
+    version = 0
+    # counters of the scenes the shape is part of
+    _scenes: tuple[ChangeCounter, ...] = ()
+
     def __init__(self):
+        self.parent: Group | None = None
         self.transform = create_identity_matrix()
         self.material = mat.Material()
 
-    def set_transform(self, transform: Matrix) -> None:
-        self.transform = transform
+    def invalidate_transform(self) -> None:
+        super().invalidate_transform()
+        self._world_matrices: tuple[tuple, Matrix, Matrix] | None = None
+        self._world_bounds: tuple[tuple, BoundingBox] | None = None
+        # pattern -> (pattern inverse and world inverse the entry was built from,
+        # world to pattern space), see world_to_pattern
+        self._pattern_transforms: dict[
+            mat.Pattern, tuple[Matrix, Matrix, Matrix]
+        ] = {}
+        # (world inverse the scale was built from, object scale)
+        self._object_scale: tuple[Matrix, float] | None = None
+        self._changed()
+
+    def _changed(self) -> None:
+        # the shape changed and with it all groups containing it
+        shape: Shape | None = self
+        while shape is not None:
+            shape.version += 1
+            for changes in shape._scenes:
+                changes.count += 1
+            shape = shape.parent
+
+    def _world_key(self) -> tuple:
+        # versions of the shape and of the groups containing it, world space data
+        # cached with other versions is outdated
+        key = []
+        shape: Shape | None = self
+        while shape is not None:
+            key.append(shape.version)
+            shape = shape.parent
+        return tuple(key)
+
+    def add_scene(self, changes: ChangeCounter) -> None:
+        """
+        Count changes to the shape, and to shapes inside it, in changes from now
+        on. Shapes are added to the scene of a world when they become one of its
+        objects.
+        """
+        if any(scene is changes for scene in self._scenes):
+            changes.references[self] = changes.references.get(self, 1) + 1
+            return
+        if not self._scenes:
+            self._scenes = changes.alone
+        else:
+            self._scenes += (changes,)
+        for shape in self._scene_parts():
+            shape.add_scene(changes)
+
+    def remove_scene(self, changes: ChangeCounter) -> None:
+        """
+        Stop counting changes to the shape in changes, undoes add_scene. Shapes are
+        removed from the scene of a world when they stop being one of its objects.
+        """
+        if all(scene is not changes for scene in self._scenes):
+            return
+        references = changes.references.pop(self, 1) - 1
+        if references > 1:
+            changes.references[self] = references
+        if references:
+            return
+        self._scenes = tuple(scene for scene in self._scenes if scene is not changes)
+        for shape in self._scene_parts():
+            shape.remove_scene(changes)
+
+    def _scene_parts(self) -> Iterable[Shape]:
+        # shapes that are part of every scene the shape is part of
+        return ()
+
+    def _world_inverse_and_transpose(self) -> tuple[Matrix, Matrix]:
+        if self.parent is None:
+            return self.inverse_transform, self.inverse_transpose
+        key = self._world_key()
+        if self._world_matrices is None or self._world_matrices[0] != key:
+            inverse = self.inverse_transform.multiply(self.parent.world_inverse)
+            self._world_matrices = (key, inverse, inverse.transpose())
+        return self._world_matrices[1], self._world_matrices[2]
+
+    @property
+    def world_inverse(self) -> Matrix:
+        """
+        Transformation from world to object space, including all parent groups
+        """
+        return self._world_inverse_and_transpose()[0]
+
+    @property
+    def world_inverse_transpose(self) -> Matrix:
+        """
+        Transformation of normals from object to world space
+        """
+        return self._world_inverse_and_transpose()[1]
+
+    @property
+    def object_scale(self) -> float:
+        """
+        Factor that turns lengths in world space into lengths in object space,
+        averaged over all directions
+        """
+        world_inverse = self.world_inverse
+        if self._object_scale is None or self._object_scale[0] is not world_inverse:
+            determinant = np.linalg.det(world_inverse.matrix[:3, :3])
+            self._object_scale = (world_inverse, abs(float(determinant)) ** (1 / 3))
+        return self._object_scale[1]
+
+    def world_to_pattern(self, pattern: mat.Pattern) -> Matrix:
+        """
+        Combined transformation from world space to the space of a pattern on the
+        shape, cached until the transform of either changes
+        """
+        pattern_inverse = pattern.inverse_transform
+        world_inverse = self.world_inverse
+        cached = self._pattern_transforms.get(pattern)
+        if (
+            cached is None
+            or cached[0] is not pattern_inverse
+            or cached[1] is not world_inverse
+        ):
+            transform = pattern_inverse.multiply(world_inverse)
+            cached = (pattern_inverse, world_inverse, transform)
+            self._pattern_transforms[pattern] = cached
+        return cached[2]
+
+    @property
+    def world_transform(self) -> Matrix:
+        """
+        Transformation from object to world space, including all parent groups
+        """
+        if self.parent is None:
+            return self.transform
+        return self.parent.world_transform.multiply(self.transform)
+
+    def leaves(self) -> Iterator[Shape]:
+        """
+        Shapes that are intersected and shaded on their own, the shape itself
+        unless it is a group
+        """
+        yield self
+
+    def bounds(self) -> BoundingBox:
+        """
+        Bounding box in object space, infinite unless the shape knows better
+        """
+        return BoundingBox.infinite()
+
+    def parent_space_bounds(self) -> BoundingBox:
+        return self.bounds().transform(self.transform)
+
+    def world_bounds(self) -> BoundingBox:
+        key = self._world_key()
+        if self._world_bounds is None or self._world_bounds[0] != key:
+            box = self.bounds().transform(self.world_transform)
+            self._world_bounds = (key, box)
+        return self._world_bounds[1]
 
     def intersect(self, ray: Ray) -> list[Intersection]:
         """
         :param Ray ray: ray in world coordinates
         """
         # transform ray from world to object space
-        ray = self.transform.inverse().multiply(ray)
+        ray = self.inverse_transform.multiply(ray)
         return self.shape_specific_intersect(ray)
 
-    def normal_at(self, world_point: Point) -> Vector:
-        object_point = self.transform.inverse().multiply(world_point)
-        object_normal = self.shape_specific_normal_at(object_point)
-        world_normal = self.transform.inverse().transpose().multiply(object_normal)
+    def closest_hit(self, ray: Ray, t_max: float = math.inf) -> Intersection | None:
+        """
+        Nearest intersection with 0 < t < t_max, None if there is none
+
+        Hits at or beyond t_max are rejected without creating an Intersection, so
+        callers can pass the distance of the closest hit found so far.
+
+        :param Ray ray: ray in world coordinates
+        """
+        ray = self.inverse_transform.multiply(ray)
+        return self.shape_specific_closest_hit(ray, t_max)
+
+    def occludes(self, ray: Ray, t_max: float) -> bool:
+        """
+        Whether the ray hits the shape anywhere between t = 0 and t_max, cheaper
+        than intersect as it stops at the first such hit
+
+        :param Ray ray: ray in world coordinates
+        """
+        ray = self.inverse_transform.multiply(ray)
+        return self.shape_specific_occludes(ray, t_max)
+
+    def intersect_bundle(self, bundle: RayBundle) -> np.ndarray:
+        """
+        Distance to the nearest positive intersection for every ray, inf for misses
+
+        :param RayBundle bundle: rays in world coordinates
+        """
+        bundle = self.world_inverse.multiply(bundle)
+        return self.shape_specific_intersect_bundle(bundle)
+
+    def intersect_bundle_faces(
+        self, bundle: RayBundle
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        """
+        intersect_bundle together with the face hit by every ray, which
+        normal_at_array needs for shapes made of faces
+
+        :returns: distances and faces, None as faces for shapes without faces
+        """
+        bundle = self.world_inverse.multiply(bundle)
+        return self.shape_specific_intersect_bundle_faces(bundle)
+
+    def normal_at(self, world_point: Point, hit: Intersection | None = None) -> Vector:
+        """
+        :param hit: intersection at world_point, shapes made of faces need its face
+        """
+        object_point = self.world_inverse.multiply(world_point)
+        object_normal = self.shape_specific_normal_at(object_point, hit)
+        world_normal = self.world_inverse_transpose.multiply_vector(object_normal)
         return world_normal.normalize()
 
+    def normal_at_array(
+        self, world_points: np.ndarray, faces: np.ndarray | None = None
+    ) -> np.ndarray:
+        """
+        Normalized world space normals at an (N, 4) array of world points
+
+        :param faces: faces hit at the points, see intersect_bundle_faces
+        """
+        object_points = world_points @ self.world_inverse.matrix.T
+        object_normals = self.shape_specific_normal_at_array(object_points, faces)
+        world_normals = object_normals @ self.world_inverse_transpose.matrix.T
+        world_normals[:, 3] = 0
+        return world_normals / np.linalg.norm(world_normals, axis=1)[:, np.newaxis]
+
     @abc.abstractmethod
     def shape_specific_intersect(self, ray: Ray) -> list[Intersection]:
         pass
 
     @abc.abstractmethod
-    def shape_specific_normal_at(self, object_point: Point) -> Vector:
+    def shape_specific_normal_at(
+        self, object_point: Point, hit: Intersection | None = None
+    ) -> Vector:
         pass
 
+    def shape_specific_closest_hit(
+        self, ray: Ray, t_max: float
+    ) -> Intersection | None:
+        # fallback for shapes without a dedicated closest hit query
+        closest = None
+        for intersection in self.shape_specific_intersect(ray):
+            if 0 < intersection.t < t_max:
+                closest = intersection
+                t_max = intersection.t
+        return closest
+
+    def shape_specific_occludes(self, ray: Ray, t_max: float) -> bool:
+        # fallback for shapes without a dedicated occlusion test
+        return any(0 < i.t < t_max for i in self.shape_specific_intersect(ray))
+
+    def shape_specific_intersect_bundle(self, bundle: RayBundle) -> np.ndarray:
+        # fallback for shapes without a vectorised kernel
+        ts = np.full(len(bundle), np.inf)
+        for index in range(len(bundle)):
+            intersection = hit(self.shape_specific_intersect(bundle[index]))
+            if intersection is not None:
+                ts[index] = intersection.t
+        return ts
+
+    def shape_specific_intersect_bundle_faces(
+        self, bundle: RayBundle
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        # shapes without faces
+        return self.shape_specific_intersect_bundle(bundle), None
+
+    def shape_specific_normal_at_array(
+        self, object_points: np.ndarray, faces: np.ndarray | None = None
+    ) -> np.ndarray:
+        # fallback for shapes without a vectorised normal
+        normals = [
+            self.shape_specific_normal_at(Point(*point[:3]))
+            for point in object_points.tolist()
+        ]
+        return np.array([(n.x, n.y, n.z, n.w) for n in normals], np.float64)
+
 
 @dataclass
 class Intersection:
     t: float = 0.0
     shape: Shape = None
+    # index of the face that was hit, for shapes made of faces
+    face: int | None = None
 
 
 @dataclass
@@ -55,18 +338,25 @@ class IntersectionInfo:
     normalv: Vector = None
     inside: bool = False
     over_point: Point = None
+    # width of the ray at the point, see Ray.spread
+    footprint: float = 0.0
 
 
 def prepare_computations(intersection: Intersection, ray: Ray) -> IntersectionInfo:
     eyev = -ray.direction
     point = ray.position(intersection.t)
-    normalv = intersection.shape.normal_at(point)
+    normalv = intersection.shape.normal_at(point, intersection)
     inside = False
     if normalv.dot(eyev) < 0:
         inside = True
         normalv = -normalv
     over_point = point + normalv * ABS_TOL
-    info = IntersectionInfo(intersection, point, eyev, normalv, inside, over_point)
+    footprint = 0.0
+    if ray.spread:
+        footprint = intersection.t * ray.spread * ray.direction.magnitude()
+    info = IntersectionInfo(
+        intersection, point, eyev, normalv, inside, over_point, footprint
+    )
     return info
 
 
@@ -83,22 +373,48 @@ class Sphere(Shape):
     def __init__(self):
         super().__init__()
 
+    def bounds(self) -> BoundingBox:
+        return BoundingBox(Point(-1, -1, -1), Point(1, 1, 1))
+
     def texture_transform(self, point: Point) -> tuple[float, float]:
         """
 
         point: on unit sphere
 
         """
-        theta = math.acos(point.y)
+        theta = math.acos(min(max(point.y, -1.0), 1.0))
         phi = math.atan2(point.z, point.x)
         u = (phi + math.pi) / (2 * math.pi)
         v = theta / math.pi
         return (u, v)
 
-    def shape_specific_normal_at(self, object_point: Point) -> Vector:
+    def texture_transform_array(
+        self, points: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+
+        points: (N, 4) array of points on the unit sphere
+
+        """
+        theta = np.arccos(np.clip(points[:, 1], -1, 1))
+        phi = np.arctan2(points[:, 2], points[:, 0])
+        u = (phi + math.pi) / (2 * math.pi)
+        v = theta / math.pi
+        return (u, v)
+
+    def shape_specific_normal_at(
+        self, object_point: Point, hit: Intersection | None = None
+    ) -> Vector:
         object_normal = Vector(object_point.x, object_point.y, object_point.z)
         return object_normal
 
+    def shape_specific_normal_at_array(
+        self, object_points: np.ndarray, faces: np.ndarray | None = None
+    ) -> np.ndarray:
+        object_normals = object_points.copy()
+        object_normals[:, 3] = 0
+        return object_normals
+
     def shape_specific_intersect(self, ray: Ray) -> list[Intersection]:
         # ray = self.transform.inverse().multiply(ray) # transform ray to object space
         sphere_to_ray = ray.origin - Point(0, 0, 0)
@@ -114,14 +430,296 @@ class Sphere(Shape):
         t2 = (-b + math.sqrt(discriminant)) / (2 * a)
         return [Intersection(t1, self), Intersection(t2, self)]
 
+    def _roots(self, ray: Ray) -> tuple[float, float] | None:
+        # same as shape_specific_intersect without creating intermediate tuples
+        ox, oy, oz = ray.origin.x, ray.origin.y, ray.origin.z
+        dx, dy, dz = ray.direction.x, ray.direction.y, ray.direction.z
+        a = dx * dx + dy * dy + dz * dz
+        b = 2 * (dx * ox + dy * oy + dz * oz)
+        c = ox * ox + oy * oy + oz * oz - 1
+        discriminant = b * b - 4 * a * c
+        if discriminant < 0:
+            return None
+        root = math.sqrt(discriminant)
+        return (-b - root) / (2 * a), (-b + root) / (2 * a)
+
+    def shape_specific_closest_hit(
+        self, ray: Ray, t_max: float
+    ) -> Intersection | None:
+        roots = self._roots(ray)
+        if roots is None:
+            return None
+        t1, t2 = roots
+        if 0 < t1 < t_max:
+            return Intersection(t1, self)
+        if 0 < t2 < t_max:
+            return Intersection(t2, self)
+        return None
+
+    def shape_specific_occludes(self, ray: Ray, t_max: float) -> bool:
+        roots = self._roots(ray)
+        if roots is None:
+            return False
+        t1, t2 = roots
+        return 0 < t1 < t_max or 0 < t2 < t_max
+
+    def shape_specific_intersect_bundle(self, bundle: RayBundle) -> np.ndarray:
+        origins = bundle.origins[:, :3]
+        directions = bundle.directions[:, :3]
+        a = np.einsum("ij,ij->i", directions, directions)
+        b = 2 * np.einsum("ij,ij->i", directions, origins)
+        c = np.einsum("ij,ij->i", origins, origins) - 1
+        discriminant = b * b - 4 * a * c
+
+        # misses have a negative discriminant and end up as nan, which fails t > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            root = np.sqrt(discriminant)
+            t1 = (-b - root) / (2 * a)
+            t2 = (-b + root) / (2 * a)
+        return np.where(t1 > 0, t1, np.where(t2 > 0, t2, np.inf))
+
 
 class Plane(Shape):
-    def shape_specific_normal_at(self, object_point: Point) -> Vector:
+    def bounds(self) -> BoundingBox:
+        return BoundingBox(Point(-math.inf, 0, -math.inf), Point(math.inf, 0, math.inf))
+
+    def shape_specific_normal_at(
+        self, object_point: Point, hit: Intersection | None = None
+    ) -> Vector:
         return Vector(0, 1, 0)
 
+    def shape_specific_normal_at_array(
+        self, object_points: np.ndarray, faces: np.ndarray | None = None
+    ) -> np.ndarray:
+        return np.tile((0.0, 1.0, 0.0, 0.0), (len(object_points), 1))
+
     def shape_specific_intersect(self, ray: Ray) -> list[Intersection]:
         if abs(ray.direction.y) < ABS_TOL:
             return []
 
         t = -ray.origin.y / ray.direction.y
         return [Intersection(t, self)]
+
+    def shape_specific_closest_hit(
+        self, ray: Ray, t_max: float
+    ) -> Intersection | None:
+        if abs(ray.direction.y) < ABS_TOL:
+            return None
+        t = -ray.origin.y / ray.direction.y
+        return Intersection(t, self) if 0 < t < t_max else None
+
+    def shape_specific_occludes(self, ray: Ray, t_max: float) -> bool:
+        if abs(ray.direction.y) < ABS_TOL:
+            return False
+        return 0 < -ray.origin.y / ray.direction.y < t_max
+
+    def shape_specific_intersect_bundle(self, bundle: RayBundle) -> np.ndarray:
+        origin_y = bundle.origins[:, 1]
+        direction_y = bundle.directions[:, 1]
+        parallel = np.abs(direction_y) < ABS_TOL
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = -origin_y / direction_y
+        return np.where(~parallel & (t > 0), t, np.inf)
+
+
+class Group(Shape):
+    """
+    Shape made of child shapes, the transform of the group applies to all of them
+    """
+
+    def __init__(self, children: Iterable[Shape] = ()):
+        super().__init__()
+        self.children: list[Shape] = []
+        self._bounds: tuple[int, BoundingBox] | None = None
+        for child in children:
+            self.add_child(child)
+
+    def add_child(self, shape: Shape) -> None:
+        shape.parent = self
+        self.children.append(shape)
+        for changes in self._scenes:
+            shape.add_scene(changes)
+        # the version of the child changes too, its world space data depends on
+        # its new parent
+        shape._changed()
+
+    def _scene_parts(self) -> Iterable[Shape]:
+        return self.children
+
+    def bounds(self) -> BoundingBox:
+        """
+        Bounds of all children in object space of the group, cached until the
+        group or a shape inside it changes
+        """
+        if self._bounds is None or self._bounds[0] != self.version:
+            box = BoundingBox()
+            for child in self.children:
+                box.add_box(child.parent_space_bounds())
+            self._bounds = (self.version, box)
+        return self._bounds[1]
+
+    def leaves(self) -> Iterator[Shape]:
+        for child in self.children:
+            yield from child.leaves()
+
+    def shape_specific_intersect(self, ray: Ray) -> list[Intersection]:
+        if not self.bounds().intersects(ray):
+            return []
+        intersections = []
+        for child in self.children:
+            intersections += child.intersect(ray)
+        intersections.sort(key=lambda intersection: intersection.t)
+        return intersections
+
+    def shape_specific_closest_hit(
+        self, ray: Ray, t_max: float
+    ) -> Intersection | None:
+        if not self.bounds().intersects(ray, 0, t_max):
+            return None
+        closest = None
+        for child in self.children:
+            intersection = child.closest_hit(ray, t_max)
+            if intersection is not None:
+                closest = intersection
+                t_max = intersection.t
+        return closest
+
+    def shape_specific_occludes(self, ray: Ray, t_max: float) -> bool:
+        if not self.bounds().intersects(ray, 0, t_max):
+            return False
+        return any(child.occludes(ray, t_max) for child in self.children)
+
+    def intersect_bundle(self, bundle: RayBundle) -> np.ndarray:
+        # children transform the world space rays themselves
+        ts = np.full(len(bundle), np.inf)
+        for child in self.children:
+            np.minimum(ts, child.intersect_bundle(bundle), out=ts)
+        return ts
+
+    def intersect_bundle_faces(
+        self, bundle: RayBundle
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        return self.intersect_bundle(bundle), None
+
+    def shape_specific_normal_at(
+        self, object_point: Point, hit: Intersection | None = None
+    ) -> Vector:
+        raise NotImplementedError(
+            "Groups have no normal, it is computed by the child shape that is hit"
+        )
+
+
+class Instance(Shape):
+    """
+    Copy of a prototype shape placed by its own transform.
+
+    The instance shares geometry and material with its prototype and stores
+    nothing but its transform, which places the prototype, including the
+    prototype's own transform, in the parent space of the instance. The
+    prototype itself is usually not part of the world.
+
+    Its world_inverse maps world points into the object space of the prototype,
+    so normals, patterns and textures come out as for the prototype.
+    """
+
+    def __init__(self, prototype: Shape, transform: Matrix | None = None):
+        if list(prototype.leaves()) != [prototype]:
+            raise ValueError("Groups cannot be instanced, instance their children")
+        if isinstance(prototype, Instance):
+            raise TypeError(
+                "Instances cannot be instanced, instance their prototype instead"
+            )
+        self.prototype = prototype
+        # no super().__init__(), an instance has no material of its own
+        self.parent: Group | None = None
+        self.transform = create_identity_matrix() if transform is None else transform
+
+    @classmethod
+    def from_transforms(
+        cls, prototype: Shape, transforms: np.ndarray
+    ) -> list[Instance]:
+        """
+        Instances for an (N, 4, 4) array of transforms, their matrices are views
+        into that array instead of copies
+        """
+        instances = []
+        for transform in np.asarray(transforms, np.float64):
+            matrix = Matrix()
+            matrix.matrix = transform
+            instances.append(cls(prototype, matrix))
+        return instances
+
+    @property
+    def material(self) -> mat.Material:
+        return self.prototype.material
+
+    def _world_key(self) -> tuple:
+        # the world space data of an instance depends on its prototype as well
+        return (*super()._world_key(), self.prototype.version)
+
+    def _scene_parts(self) -> Iterable[Shape]:
+        # the prototype is usually not part of the scene itself, but changes to
+        # it change all instances
+        return (self.prototype,)
+
+    def _world_inverse_and_transpose(self) -> tuple[Matrix, Matrix]:
+        key = self._world_key()
+        if self._world_matrices is None or self._world_matrices[0] != key:
+            inverse = self.inverse_transform
+            if self.parent is not None:
+                inverse = inverse.multiply(self.parent.world_inverse)
+            inverse = self.prototype.inverse_transform.multiply(inverse)
+            self._world_matrices = (key, inverse, inverse.transpose())
+        return self._world_matrices[1], self._world_matrices[2]
+
+    def bounds(self) -> BoundingBox:
+        return self.prototype.parent_space_bounds()
+
+    def shape_specific_intersect(self, ray: Ray) -> list[Intersection]:
+        ray = self.prototype.inverse_transform.multiply(ray)
+        return [
+            Intersection(intersection.t, self, intersection.face)
+            for intersection in self.prototype.shape_specific_intersect(ray)
+        ]
+
+    def shape_specific_closest_hit(
+        self, ray: Ray, t_max: float
+    ) -> Intersection | None:
+        ray = self.prototype.inverse_transform.multiply(ray)
+        intersection = self.prototype.shape_specific_closest_hit(ray, t_max)
+        if intersection is None:
+            return None
+        return Intersection(intersection.t, self, intersection.face)
+
+    def shape_specific_occludes(self, ray: Ray, t_max: float) -> bool:
+        ray = self.prototype.inverse_transform.multiply(ray)
+        return self.prototype.shape_specific_occludes(ray, t_max)
+
+    # the object points and rays below are already in prototype space, see
+    # _world_inverse_and_transpose
+
+    def shape_specific_intersect_bundle(self, bundle: RayBundle) -> np.ndarray:
+        return self.prototype.shape_specific_intersect_bundle(bundle)
+
+    def shape_specific_intersect_bundle_faces(
+        self, bundle: RayBundle
+    ) -> tuple[np.ndarray, np.ndarray | None]:
+        return self.prototype.shape_specific_intersect_bundle_faces(bundle)
+
+    def shape_specific_normal_at(
+        self, object_point: Point, hit: Intersection | None = None
+    ) -> Vector:
+        return self.prototype.shape_specific_normal_at(object_point, hit)
+
+    def shape_specific_normal_at_array(
+        self, object_points: np.ndarray, faces: np.ndarray | None = None
+    ) -> np.ndarray:
+        return self.prototype.shape_specific_normal_at_array(object_points, faces)
+
+    def texture_transform(self, point: Point) -> tuple[float, float]:
+        return self.prototype.texture_transform(point)
+
+    def texture_transform_array(
+        self, points: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return self.prototype.texture_transform_array(points)
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import math
 
 from .matrix import Matrix, create_identity_matrix
@@ -90,3 +92,43 @@ def view_transform(eye_origin: Point, to: Point, up: Vector) -> Matrix:
     return Matrix(values=orientation).multiply(
         translation(-eye_origin.x, -eye_origin.y, -eye_origin.z)
     )
+
+
+class Transformable:
+    """
+    Base for scene objects that are placed via a transformation matrix.
+
+    The inverse and the inverse transpose of the transform are computed on
+    first use and kept until the transform is replaced, either through
+    `set_transform` or by assigning to `transform`.
+    """
+
+    _transform: Matrix
+
+    @property
+    def transform(self) -> Matrix:
+        return self._transform
+
+    @transform.setter
+    def transform(self, transform: Matrix) -> None:
+        self._transform = transform
+        self.invalidate_transform()
+
+    def set_transform(self, transform: Matrix) -> None:
+        self.transform = transform
+
+    def invalidate_transform(self) -> None:
+        self._inverse_transform: Matrix | None = None
+        self._inverse_transpose: Matrix | None = None
+
+    @property
+    def inverse_transform(self) -> Matrix:
+        if self._inverse_transform is None:
+            self._inverse_transform = self._transform.inverse()
+        return self._inverse_transform
+
+    @property
+    def inverse_transpose(self) -> Matrix:
+        if self._inverse_transpose is None:
+            self._inverse_transpose = self.inverse_transform.transpose()
+        return self._inverse_transpose
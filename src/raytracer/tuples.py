@@ -6,6 +6,8 @@ ABS_TOL = 1e-5
 
 
 class Tuple:
+    __slots__ = ("w", "x", "y", "z")
+
     def __init__(self, x, y, z, w) -> None:
         self.x = x
         self.y = y
@@ -48,15 +50,38 @@ class Tuple:
     def __truediv__(self, scalar):
         return Tuple(self.x / scalar, self.y / scalar, self.z / scalar, self.w / scalar)
 
+    # in-place variants of the operators above, they return self to allow chaining
+    def iadd(self, other: Tuple) -> Tuple:
+        self.x += other.x
+        self.y += other.y
+        self.z += other.z
+        self.w += other.w
+        return self
+
+    def imul(self, scalar: float) -> Tuple:
+        self.x *= scalar
+        self.y *= scalar
+        self.z *= scalar
+        self.w *= scalar
+        return self
+
     def magnitude(self):
         return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
 
     def normalize(self):
-        return Vector(
-            self.x / self.magnitude(),
-            self.y / self.magnitude(),
-            self.z / self.magnitude(),
-        )
+        magnitude = self.magnitude()
+        return Vector(self.x / magnitude, self.y / magnitude, self.z / magnitude)
+
+    def normalize_(self) -> Tuple:
+        """
+        In-place variant of normalize, the w component is set to 0
+        """
+        magnitude = self.magnitude()
+        self.x /= magnitude
+        self.y /= magnitude
+        self.z /= magnitude
+        self.w = 0
+        return self
 
     def dot(self, other: Tuple) -> float:
         return self.x * other.x + self.y * other.y + self.z * other.z + self.w * other.w
@@ -69,19 +94,26 @@ class Tuple:
         )
 
     def reflect(self, normal: Vector) -> Vector:
-        return self - normal * 2 * self.dot(normal)
+        factor = 2 * self.dot(normal)
+        return Tuple(
+            self.x - normal.x * factor,
+            self.y - normal.y * factor,
+            self.z - normal.z * factor,
+            self.w - normal.w * factor,
+        )
 
     # def __repr__(self):
     #    return f"Tuple({self.x}, {self.y}, {self.z}, {self.w})"
 
 
 class Color:
+    __slots__ = ("blue", "green", "red")
+
     def __init__(self, red: float, green: float, blue: float):
         self.red = red
         self.green = green
         self.blue = blue
 
-    # __slots__ = ()
     # WHITE = Color(1, 1, 1)
 
     # @property
@@ -129,6 +161,28 @@ class Color:
             self.red * other.red, self.green * other.green, self.blue * other.blue
         )
 
+    # in-place variants, they return self to allow chaining
+    def iadd(self, other: Color) -> Color:
+        self.red += other.red
+        self.green += other.green
+        self.blue += other.blue
+        return self
+
+    def imul(self, scalar: float) -> Color:
+        self.red *= scalar
+        self.green *= scalar
+        self.blue *= scalar
+        return self
+
+    def fma(self, other: Color, scalar: float) -> Color:
+        """
+        Fused multiply-add, adds other * scalar to this color in place
+        """
+        self.red += other.red * scalar
+        self.green += other.green * scalar
+        self.blue += other.blue * scalar
+        return self
+
     def __repr__(self):
         return f"Color({self.red}, {self.green}, {self.blue})"
 
@@ -142,6 +196,8 @@ class Colors:
 
 
 class Vector(Tuple):
+    __slots__ = ()
+
     def __init__(self, x: float, y: float, z: float) -> None:
         super().__init__(x, y, z, 0)
 
@@ -150,6 +206,8 @@ class Vector(Tuple):
 
 
 class Point(Tuple):
+    __slots__ = ()
+
     def __init__(self, x, y, z) -> None:
         super().__init__(x, y, z, 1)
 
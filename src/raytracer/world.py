@@ -1,16 +1,230 @@
+from __future__ import annotations
+
+import math
+import os
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+
+from .accelerator import Accelerator, load_accelerator
+from .bvh import BVH
+from .grid import UniformGrid
 from .lights import PointLight
-from .materials import ConstantPattern, Material, lighting
-from .ray import Ray
-from .shapes import (Intersection, IntersectionInfo, Sphere, hit,
-                     prepare_computations)
+from .materials import ConstantPattern, Material, lighting, lighting_batch
+from .ray import Ray, RayBundle
+from .shapes import (ChangeCounter, Intersection, IntersectionInfo, Shape,
+                     Sphere, prepare_computations)
 from .transformations import scaling
-from .tuples import Color, Point
+from .tuples import ABS_TOL, Color, Point
+
+# lights that add less than this to every color channel of a hit are skipped,
+# it is half a step of the 8 bit channels of saved images
+LIGHT_THRESHOLD = 0.5 / 255
+
+
+class SceneObjects(list):
+    """
+    List of the objects of a world that counts its modifications and those of
+    the objects in it, so that the world knows when to rebuild its acceleration
+    structure
+    """
+
+    def __init__(self, objects: Iterable[Shape] = ()) -> None:
+        super().__init__(objects)
+        self.changes = ChangeCounter()
+        self._add_scene(self)
+
+    @property
+    def version(self) -> int:
+        return self.changes.count
+
+    def __reduce__(self):
+        # pickle would add the objects through the counting methods, before the
+        # counter is restored
+        return SceneObjects, (list(self),), {"changes": self.changes}
+
+    def _add_scene(self, objects: Iterable[Shape]) -> None:
+        for object in objects:
+            object.add_scene(self.changes)
+
+    def _remove_scene(self, objects: Iterable[Shape]) -> None:
+        # changes to objects no longer in the list do not concern it
+        for object in objects:
+            object.remove_scene(self.changes)
+
+    def __setitem__(self, index: int | slice, value) -> None:
+        if isinstance(index, slice):
+            removed = self[index]
+            value = list(value)
+            super().__setitem__(index, value)
+            self._add_scene(value)
+        else:
+            removed = [self[index]]
+            super().__setitem__(index, value)
+            self._add_scene([value])
+        self._remove_scene(removed)
+
+    def __delitem__(self, index: int | slice) -> None:
+        removed = self[index] if isinstance(index, slice) else [self[index]]
+        super().__delitem__(index)
+        self._remove_scene(removed)
+
+    def __iadd__(self, objects: Iterable[Shape]) -> SceneObjects:
+        self.extend(objects)
+        return self
+
+    def __imul__(self, count: int) -> SceneObjects:
+        if count <= 0:
+            self.clear()
+            return self
+        for _ in range(count - 1):
+            self._add_scene(list(self))
+        return super().__imul__(count)
+
+    def append(self, object: Shape) -> None:
+        self._add_scene([object])
+        super().append(object)
+
+    def extend(self, objects: Iterable[Shape]) -> None:
+        objects = list(objects)
+        self._add_scene(objects)
+        super().extend(objects)
+
+    def insert(self, index: int, object: Shape) -> None:
+        self._add_scene([object])
+        super().insert(index, object)
+
+    def pop(self, index: int = -1) -> Shape:
+        object = super().pop(index)
+        self._remove_scene([object])
+        return object
+
+    def remove(self, object: Shape) -> None:
+        index = self.index(object)
+        removed = self[index]
+        super().__delitem__(index)
+        self._remove_scene([removed])
+
+    def clear(self) -> None:
+        removed = list(self)
+        super().clear()
+        self._remove_scene(removed)
+
+
+def _counting(method):
+    def modify(self, *args):
+        self.changes.count += 1
+        return method(self, *args)
+
+    return modify
+
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+):
+    setattr(SceneObjects, _name, _counting(getattr(SceneObjects, _name)))
 
 
 class World:
-    def __init__(self):
+    def __init__(self, accelerator: str | None = "bvh"):
+        """
+        :param accelerator: "bvh" to traverse a bounding volume hierarchy built
+            over the objects, "grid" to walk through a uniform grid, which suits
+            many small evenly spread objects, None to test every object for
+            every ray
+        """
         self.objects = []
-        self.lightSource = None
+        self.lights: list[PointLight] = []
+        self.accelerator = accelerator
+        # lights that add less to a hit are skipped, see LIGHT_THRESHOLD
+        self.light_threshold = LIGHT_THRESHOLD
+        # shadow rays not cast because the light could not contribute to the hit
+        self.culled_shadow_rays = 0
+        # neighbouring points are usually shadowed by the same object, so the last
+        # occluder found for a light is tested first for the next shadow ray
+        self._shadow_cache: dict[int, tuple[PointLight, Shape]] = {}
+        self.shadow_cache_hits = 0
+        self.shadow_cache_misses = 0
+
+    @property
+    def lightSource(self) -> PointLight | None:
+        """
+        The first of the lights, assigning a light replaces all lights with it
+        """
+        return self.lights[0] if self.lights else None
+
+    @lightSource.setter
+    def lightSource(self, light: PointLight | None) -> None:
+        self.lights = [] if light is None else [light]
+
+    @property
+    def objects(self) -> SceneObjects:
+        return self._objects
+
+    @objects.setter
+    def objects(self, objects: Iterable[Shape]) -> None:
+        replaced = getattr(self, "_objects", None)
+        self._objects = SceneObjects(objects)
+        if replaced is not None:
+            # the replaced list no longer follows changes to its objects
+            replaced._remove_scene(replaced)
+        self._acceleration_structure: Accelerator | None = None
+        # the version of the new objects starts over
+        self._shadow_cache_key: int | None = None
+
+    def acceleration_structure(self) -> Accelerator | None:
+        """
+        Acceleration structure over the objects, rebuilt when objects were added
+        or removed or one of them changed since it was built
+        """
+        if self.accelerator is None:
+            return None
+        key = (self.accelerator, self._objects.version)
+        if self._acceleration_structure is None or self._acceleration_key != key:
+            if self.accelerator == "bvh":
+                self._acceleration_structure = BVH(self._objects)
+            elif self.accelerator == "grid":
+                self._acceleration_structure = UniformGrid(self._objects)
+            else:
+                raise ValueError(f"Unknown accelerator {self.accelerator}")
+            self._acceleration_key = key
+        return self._acceleration_structure
+
+    def save_acceleration_structure(self, file: str | os.PathLike) -> None:
+        """
+        Write the acceleration structure over the objects to a file, see
+        load_acceleration_structure
+        """
+        structure = self.acceleration_structure()
+        if structure is None:
+            raise ValueError("The world has no accelerator")
+        structure.save(file, self._objects)
+
+    def load_acceleration_structure(self, file: str | os.PathLike) -> bool:
+        """
+        Use an acceleration structure saved with save_acceleration_structure
+        instead of building one, its arrays are mapped into memory
+
+        :returns: whether the file was used, which requires the same kind of
+            accelerator built for objects with the same types and transforms
+        """
+        structure = load_accelerator(file, self._objects)
+        if structure is None or structure.kind != self.accelerator:
+            return False
+        self._acceleration_structure = structure
+        self._acceleration_key = (self.accelerator, self._objects.version)
+        return True
 
     @classmethod
     def default(cls):
@@ -26,35 +240,276 @@ class World:
         w.lightSource = PointLight(Point(-10, 10, -10), Color(1, 1, 1))
         return w
 
-    def intersect(self, r: Ray) -> list[Intersection]:
-        intersections = []
-        for object in self.objects:
-            intersections += object.intersect(r)
+    def intersect(
+        self, r: Ray, t_min: float = -math.inf, t_max: float = math.inf
+    ) -> list[Intersection]:
+        """
+        Sorted intersections of the ray with the objects of the world
+
+        Objects that lie completely outside of t_min and t_max along the ray may be
+        skipped, the result can still contain intersections outside of this range.
+        """
+        structure = self.acceleration_structure()
+        if structure is None:
+            intersections = []
+            for object in self.objects:
+                intersections += object.intersect(r)
+        else:
+            intersections = structure.intersect(r, t_min, t_max)
         intersections.sort(key=lambda intersection: intersection.t)
         return intersections
 
     def shade_hit(self, comps: IntersectionInfo) -> Color:
-        is_shadowed = self.is_shadowed(comps.over_point)
-        return lighting(
-            self.lightSource,
-            comps,
-            is_shadowed,
-        )
+        """
+        Sum of the lighting of the hit by every light
+
+        Before casting a shadow ray, lights are skipped that add less than the
+        light_threshold to the hit, for example because they are farther away
+        than their radius. Lights behind the surface only add ambient light,
+        with or without a shadow ray.
+        """
+        material = comps.intersection.shape.material
+        reflectance = material.ambient + material.diffuse + material.specular
+        color = Color(0, 0, 0)
+        for light in self.lights:
+            lightv = light.position - comps.point
+            intensity = light.intensity
+            strength = max(intensity.red, intensity.green, intensity.blue)
+            strength *= light.attenuation(lightv.magnitude()) * reflectance
+            if strength < self.light_threshold:
+                self.culled_shadow_rays += 1
+                continue
+            if lightv.dot(comps.normalv) < 0:
+                self.culled_shadow_rays += 1
+                in_shadow = True
+            else:
+                in_shadow = self.is_shadowed(comps.over_point, light)
+            color.iadd(lighting(light, comps, in_shadow))
+        return color
+
+    def closest_hit(
+        self,
+        r: Ray,
+        t_max: float = math.inf,
+        candidates: Iterable[Shape] | None = None,
+    ) -> Intersection | None:
+        """
+        Nearest intersection with 0 < t < t_max, the same as hit(intersect(r)) but
+        without collecting and sorting all intersections
+
+        :param candidates: objects that can be hit by the ray, tested one after the
+            other instead of querying the acceleration structure
+        """
+        if candidates is None:
+            structure = self.acceleration_structure()
+            if structure is not None:
+                return structure.closest_hit(r, t_max)
+            candidates = self.objects
+        closest = None
+        for object in candidates:
+            intersection = object.closest_hit(r, t_max)
+            if intersection is not None:
+                closest = intersection
+                t_max = intersection.t
+        return closest
 
-    def color_at(self, r: Ray) -> Color:
-        intersections = self.intersect(r)
-        intersection = hit(intersections)
+    def color_at(self, r: Ray, candidates: Iterable[Shape] | None = None) -> Color:
+        """
+        :param candidates: objects that can be hit by r, see closest_hit. Only the
+            ray itself is restricted to them, shadows still consider all objects.
+        """
+        intersection = self.closest_hit(r, candidates=candidates)
         if intersection is None:
             return Color(0, 0, 0)
         else:
             comps = prepare_computations(intersection, r)
             return self.shade_hit(comps)
 
-    def is_shadowed(self, p: Point) -> bool:
-        v = self.lightSource.position - p
+    def occluder(self, r: Ray, t_max: float) -> Shape | None:
+        """
+        Any object hit by the ray between t = 0 and t_max, None if there is none
+
+        Unlike intersect, this stops at the first such object and neither
+        collects nor sorts intersections.
+        """
+        structure = self.acceleration_structure()
+        if structure is not None:
+            return structure.occluder(r, t_max)
+        for object in self.objects:
+            if object.occludes(r, t_max):
+                return object
+        return None
+
+    def is_shadowed(self, p: Point, light: PointLight | None = None) -> bool:
+        """
+        :param light: light to test against, defaults to lightSource
+        """
+        if light is None:
+            light = self.lightSource
+        v = light.position - p
         distance = v.magnitude()
-        direction = v.normalize()
-        r = Ray(p, direction)
-        intersections = self.intersect(r)
-        h = hit(intersections)
-        return h is not None and h.t < distance
+        r = Ray(p, v.normalize_())
+
+        # the cached occluders are dropped when objects or transforms change
+        if self._objects.version != self._shadow_cache_key:
+            self._shadow_cache = {}
+            self._shadow_cache_key = self._objects.version
+        cached = self._shadow_cache.get(id(light))
+        if (
+            cached is not None
+            and cached[0] is light
+            and cached[1].occludes(r, distance)
+        ):
+            self.shadow_cache_hits += 1
+            return True
+
+        self.shadow_cache_misses += 1
+        occluder = self.occluder(r, distance)
+        if occluder is not None:
+            self._shadow_cache[id(light)] = (light, occluder)
+        return occluder is not None
+
+    def color_at_bundle(
+        self, bundle: RayBundle, candidates: Iterable[Shape] | None = None
+    ) -> np.ndarray:
+        """
+        Vectorised variant of color_at, returns an (N, 3) array of colors
+
+        :param candidates: objects that can be hit by the rays, see closest_hit
+        """
+        count = len(bundle)
+        t = np.full(count, np.inf)
+        faces = np.zeros(count, np.int64)
+        # groups are resolved into their children, which are shaded on their own.
+        # nearest is the position in leaves of the leaf hit by every ray.
+        leaves: list[tuple[Shape, bool]] = []
+        nearest = np.full(count, -1, np.int64)
+        for object, rays in self._bundle_candidates(bundle, t, candidates):
+            origins, directions = bundle.origins[rays], bundle.directions[rays]
+            for leaf in object.leaves():
+                leaf_ts, leaf_faces = leaf.intersect_bundle_faces(
+                    RayBundle(origins, directions)
+                )
+                closer = leaf_ts < t[rays]
+                if not closer.any():
+                    continue
+                hit = rays[closer]
+                # lowering t also keeps the rays out of the structure behind the hit
+                t[hit] = leaf_ts[closer]
+                nearest[hit] = len(leaves)
+                if leaf_faces is not None:
+                    faces[hit] = leaf_faces[closer]
+                leaves.append((leaf, leaf_faces is not None))
+
+        colors = np.zeros((count, 3))
+        for index in np.unique(nearest[nearest >= 0]).tolist():
+            leaf, has_faces = leaves[index]
+            mask = nearest == index
+            colors[mask] = self.shade_hit_array(
+                leaf,
+                bundle.origins[mask],
+                bundle.directions[mask],
+                t[mask],
+                faces[mask] if has_faces else None,
+                bundle.spread,
+            )
+        return colors
+
+    def _bundle_candidates(
+        self,
+        bundle: RayBundle,
+        t_max: np.ndarray,
+        candidates: Iterable[Shape] | None = None,
+    ) -> Iterator[tuple[Shape, np.ndarray]]:
+        # objects with the indices of the rays of the bundle that can hit them,
+        # from the acceleration structure unless candidates are given
+        if candidates is None:
+            structure = self.acceleration_structure()
+            if structure is not None:
+                return structure.bundle_candidates(bundle, t_max)
+            candidates = self.objects
+        rays = np.arange(len(bundle))
+        return ((object, rays) for object in candidates)
+
+    def shade_hit_array(
+        self,
+        shape: Shape,
+        origins: np.ndarray,
+        directions: np.ndarray,
+        t: np.ndarray,
+        faces: np.ndarray | None = None,
+        spread: float = 0.0,
+    ) -> np.ndarray:
+        """
+        Vectorised variant of prepare_computations followed by shade_hit for rays
+        that all hit the given shape at distance t
+
+        :param faces: faces that were hit, see Shape.intersect_bundle_faces
+        :param spread: spread of the rays, see Ray
+        """
+        points = origins + t[:, np.newaxis] * directions
+        eyev = -directions
+        normalv = shape.normal_at_array(points, faces)
+        inside = np.einsum("ij,ij->i", normalv, eyev) < 0
+        normalv[inside] = -normalv[inside]
+        over_points = points + normalv * ABS_TOL
+        footprints = None
+        if spread:
+            footprints = t * spread * np.linalg.norm(directions, axis=1)
+
+        material = shape.material
+        reflectance = material.ambient + material.diffuse + material.specular
+        patterns = material.pattern.pattern_at_shape_array(shape, points, footprints)
+        colors = np.zeros((len(points), 3))
+        for light in self.lights:
+            position = light.position
+            lightv = np.array((position.x, position.y, position.z, 1)) - points
+            intensity = light.intensity
+            strength = max(intensity.red, intensity.green, intensity.blue)
+            strength *= light.attenuation_array(np.linalg.norm(lightv, axis=1))
+            reached = strength * reflectance >= self.light_threshold
+            facing = reached & (np.einsum("ij,ij->i", lightv, normalv) >= 0)
+            self.culled_shadow_rays += len(points) - int(facing.sum())
+            in_shadow = ~facing
+            if facing.any():
+                in_shadow[facing] = self.is_shadowed_array(over_points[facing], light)
+            colors[reached] += lighting_batch(
+                light,
+                patterns[reached],
+                points[reached],
+                eyev[reached],
+                normalv[reached],
+                material.ambient,
+                material.diffuse,
+                material.specular,
+                material.shininess,
+                in_shadow[reached],
+            )
+        return colors
+
+    def is_shadowed_array(
+        self, points: np.ndarray, light: PointLight | None = None
+    ) -> np.ndarray:
+        """
+        Vectorised variant of is_shadowed for an (N, 4) array of points
+        """
+        if light is None:
+            light = self.lightSource
+        position = light.position
+        v = np.array((position.x, position.y, position.z, 1)) - points
+        distance = np.linalg.norm(v, axis=1)
+        directions = v / distance[:, np.newaxis]
+        shadowed = np.zeros(len(points), bool)
+        # shadowed rays need not be followed any further
+        reach = distance.copy()
+        for object, rays in self._bundle_candidates(
+            RayBundle(points, directions), reach
+        ):
+            rays = rays[~shadowed[rays]]
+            if not len(rays):
+                continue
+            ts = object.intersect_bundle(RayBundle(points[rays], directions[rays]))
+            occluded = rays[ts < distance[rays]]
+            shadowed[occluded] = True
+            reach[occluded] = 0
+        return shadowed
@@ -0,0 +1,154 @@
+import random
+
+import numpy as np
+import pytest
+
+import raytracer as rt
+
+
+def _random_world(accelerator):
+    rng = random.Random(5)
+    w = rt.World(accelerator=accelerator)
+    for _ in range(50):
+        s = rt.Sphere()
+        s.set_transform(
+            rt.translation(
+                rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(-5, 5)
+            ).multiply(rt.scaling(0.4, 0.4, 0.4))
+        )
+        w.objects.append(s)
+    w.objects.append(rt.Plane())
+    w.objects.append(rt.Group([rt.Sphere()]))
+    w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+    return w
+
+
+@pytest.mark.parametrize("accelerator", ["bvh", "grid"])
+def test_saved_accelerator_is_mapped_on_load(tmp_path, accelerator):
+    path = tmp_path / "scene.accel"
+    saved = _random_world(accelerator)
+    saved.save_acceleration_structure(path)
+    built = saved.acceleration_structure()
+
+    w = _random_world(accelerator)
+    assert w.load_acceleration_structure(path)
+    loaded = w.acceleration_structure()
+    assert type(loaded) is type(built)
+    assert isinstance(loaded.minimum, np.memmap)
+    assert [w.objects.index(shape) for shape in loaded.bounded] == [
+        saved.objects.index(shape) for shape in built.bounded
+    ]
+    assert loaded.unbounded == [w.objects[50]]
+    rng = random.Random(1)
+    for _ in range(50):
+        direction = rt.Vector(rng.uniform(-1, 1), rng.uniform(-1, 1), 1).normalize()
+        r = rt.Ray(rt.Point(0, 0, -10), direction)
+        assert w.color_at(r) == saved.color_at(r)
+
+
+def test_saved_accelerator_is_ignored_for_other_scenes(tmp_path):
+    path = tmp_path / "scene.accel"
+    _random_world("bvh").save_acceleration_structure(path)
+    assert not _random_world("grid").load_acceleration_structure(path)
+    moved = _random_world("bvh")
+    moved.objects[3].set_transform(rt.translation(0, 1, 0))
+    assert not moved.load_acceleration_structure(path)
+    nested = _random_world("bvh")
+    nested.objects[-1].children[0].set_transform(rt.scaling(2, 2, 2))
+    assert rt.load_accelerator(path, nested.objects) is None
+    with pytest.raises(ValueError):
+        rt.World(accelerator=None).save_acceleration_structure(path)
+    (tmp_path / "other").write_bytes(b"not an accelerator")
+    with pytest.raises(ValueError):
+        rt.load_accelerator(tmp_path / "other", moved.objects)
+
+
+def test_structure_is_rebuilt_after_changes_to_loaded_scene(tmp_path):
+    path = tmp_path / "scene.accel"
+    _random_world("grid").save_acceleration_structure(path)
+    w = _random_world("grid")
+    assert w.load_acceleration_structure(path)
+    loaded = w.acceleration_structure()
+    w.objects.append(rt.Sphere())
+    assert w.acceleration_structure() is not loaded
+
+
+def test_accelerator_without_candidates_cannot_be_created():
+    class Incomplete(rt.Accelerator):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete([rt.Sphere()])
+
+
+def _row_of_spheres(accelerator):
+    w = rt.World(accelerator=accelerator)
+    for x in range(10):
+        s = rt.Sphere()
+        s.set_transform(rt.translation(3 * x, 0, 0))
+        w.objects.append(s)
+    w.lightSource = rt.PointLight(rt.Point(0, 10, -10), rt.Color(1, 1, 1))
+    return w
+
+
+def _forbid(monkeypatch, shapes, method):
+    def fail(bundle):
+        raise AssertionError("The accelerator should have skipped this shape")
+
+    for s in shapes:
+        monkeypatch.setattr(s, method, fail)
+
+
+@pytest.mark.parametrize("accelerator", ["bvh", "grid"])
+@pytest.mark.parametrize("count", [1, 20])
+def test_color_at_bundle_uses_accelerator(monkeypatch, accelerator, count):
+    w = _row_of_spheres(accelerator)
+    rng = random.Random(count)
+    rays = [
+        rt.Ray(
+            rt.Point(rng.uniform(-0.5, 0.5), rng.uniform(-0.5, 0.5), -5),
+            rt.Vector(0, 0, 1),
+        )
+        for _ in range(count)
+    ]
+    expected = [w.color_at(r) for r in rays]
+    _forbid(monkeypatch, w.objects[2:], "intersect_bundle_faces")
+    colors = w.color_at_bundle(rt.RayBundle.from_rays(rays))
+    assert [rt.Color(*color) for color in colors.tolist()] == expected
+
+
+@pytest.mark.parametrize("accelerator", ["bvh", "grid"])
+@pytest.mark.parametrize("count", [1, 20])
+def test_is_shadowed_array_uses_accelerator(monkeypatch, accelerator, count):
+    w = _row_of_spheres(accelerator)
+    rng = random.Random(count)
+    points = [
+        rt.Point(rng.uniform(-0.5, 0.5), rng.uniform(-3, 3), 2) for _ in range(count)
+    ]
+    expected = [w.is_shadowed(p) for p in points]
+    _forbid(monkeypatch, w.objects[2:], "intersect_bundle")
+    shadowed = w.is_shadowed_array(np.array([(p.x, p.y, p.z, p.w) for p in points]))
+    assert shadowed.tolist() == expected
+
+
+def test_saved_accelerator_is_ignored_after_prototype_changes(tmp_path):
+    path = tmp_path / "scene.accel"
+    prototype = rt.Sphere()
+    w = rt.World()
+    w.objects = [rt.Instance(prototype, rt.translation(x, 0, 0)) for x in range(5)]
+    w.save_acceleration_structure(path)
+    prototype.set_transform(rt.scaling(3, 3, 3))
+    assert not w.load_acceleration_structure(path)
+
+
+def test_saved_accelerator_is_ignored_for_other_mesh_vertices(tmp_path):
+    path = tmp_path / "scene.accel"
+    vertices = np.array([(0, 0, 0), (1, 0, 0), (0, 1, 0)], np.float64)
+    w = rt.World()
+    w.objects = [rt.Mesh(vertices, [(0, 1, 2)]), rt.Sphere()]
+    w.save_acceleration_structure(path)
+    moved = rt.World()
+    moved.objects = [rt.Mesh(vertices + (5, 0, 0), [(0, 1, 2)]), rt.Sphere()]
+    assert not moved.load_acceleration_structure(path)
+    r = rt.Ray(rt.Point(5.2, 0.2, -5), rt.Vector(0, 0, 1))
+    assert moved.closest_hit(r).shape is moved.objects[0]
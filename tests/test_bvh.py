@@ -0,0 +1,158 @@
+import math
+import random
+
+import raytracer as rt
+
+
+def test_empty_bounding_box():
+    box = rt.BoundingBox()
+    assert box.is_empty()
+    box.add_point(rt.Point(1, 2, 3))
+    box.add_point(rt.Point(-1, 0, 5))
+    assert box == rt.BoundingBox(rt.Point(-1, 0, 3), rt.Point(1, 2, 5))
+
+
+def test_sphere_world_bounds():
+    s = rt.Sphere()
+    s.set_transform(rt.translation(1, 2, 3).multiply(rt.scaling(2, 1, 1)))
+    assert s.world_bounds() == rt.BoundingBox(rt.Point(-1, 1, 2), rt.Point(3, 3, 4))
+
+
+def test_rotated_sphere_world_bounds():
+    s = rt.Sphere()
+    s.set_transform(rt.rotation_z(math.pi / 4))
+    box = s.world_bounds()
+    assert math.isclose(box.maximum.x, math.sqrt(2), abs_tol=rt.ABS_TOL)
+    assert math.isclose(box.minimum.y, -math.sqrt(2), abs_tol=rt.ABS_TOL)
+
+
+def test_plane_world_bounds_are_infinite():
+    p = rt.Plane()
+    p.set_transform(rt.translation(0, -1, 0))
+    assert not p.world_bounds().is_finite()
+
+
+def test_bvh_keeps_unbounded_shapes_apart():
+    s = rt.Sphere()
+    p = rt.Plane()
+    bvh = rt.BVH([s, p])
+    assert bvh.bounded == [s]
+    assert bvh.unbounded == [p]
+
+
+def test_flat_bvh_leaves_are_small():
+    rng = random.Random(4)
+    minimum = [[rng.uniform(-10, 10) for _ in range(3)] for _ in range(100)]
+    maximum = [[value + 0.5 for value in corner] for corner in minimum]
+    nodes = rt.FlatBVH.build(minimum, maximum, leaf_size=4)
+    assert sorted(nodes.items.tolist()) == list(range(100))
+    assert max(nodes.node_count) <= 4
+    assert (nodes.node_minimum[0] <= min(minimum)).all()
+
+
+def test_bvh_candidates_skip_missed_shapes():
+    shapes = []
+    for x in range(-5, 6):
+        s = rt.Sphere()
+        s.set_transform(rt.translation(3 * x, 0, 0))
+        shapes.append(s)
+    bvh = rt.BVH(shapes, leaf_size=1)
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    assert list(bvh.candidates(r)) == [shapes[5]]
+    assert bvh.intersect(r)[0].t == 4
+
+
+def _random_world(count, accelerator):
+    rng = random.Random(count)
+    w = rt.World(accelerator=accelerator)
+    for _ in range(count):
+        s = rt.Sphere()
+        s.set_transform(
+            rt.translation(
+                rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(-5, 5)
+            ).multiply(rt.scaling(0.4, 0.4, 0.4))
+        )
+        w.objects.append(s)
+    w.objects.append(rt.Plane())
+    w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+    return w
+
+
+def test_world_with_bvh_matches_linear_world():
+    bvh_world = _random_world(60, "bvh")
+    linear_world = _random_world(60, None)
+    rng = random.Random(1)
+    for _ in range(100):
+        direction = rt.Vector(rng.uniform(-1, 1), rng.uniform(-1, 1), 1).normalize()
+        r = rt.Ray(rt.Point(0, 0, -10), direction)
+        assert bvh_world.color_at(r) == linear_world.color_at(r)
+        assert [i.t for i in bvh_world.intersect(r)] == [
+            i.t for i in linear_world.intersect(r)
+        ]
+
+
+def test_bvh_closest_hit_matches_hit():
+    w = _random_world(60, "bvh")
+    bvh = w.acceleration_structure()
+    rng = random.Random(2)
+    for _ in range(100):
+        direction = rt.Vector(rng.uniform(-1, 1), rng.uniform(-1, 1), 1).normalize()
+        r = rt.Ray(rt.Point(0, 0, -10), direction)
+        expected = rt.hit(w.intersect(r))
+        for closest in [bvh.closest_hit(r), w.closest_hit(r)]:
+            if expected is None:
+                assert closest is None
+                continue
+            assert closest.t == expected.t
+            assert closest.shape is expected.shape
+        if expected is not None:
+            assert bvh.closest_hit(r, t_max=expected.t) is None
+
+
+def test_bvh_is_rebuilt_lazily():
+    w = rt.World.default()
+    bvh = w.acceleration_structure()
+    assert w.acceleration_structure() is bvh
+    s = rt.Sphere()
+    s.set_transform(rt.translation(0, 0, 10))
+    w.objects.append(s)
+    bvh = w.acceleration_structure()
+    assert s in bvh.bounded
+    s.set_transform(rt.translation(0, 5, 10))
+    assert w.acceleration_structure() is not bvh
+    r = rt.Ray(rt.Point(0, 5, -5), rt.Vector(0, 0, 1))
+    assert w.intersect(r)[0].t == 14
+
+
+def test_bvh_is_kept_when_unrelated_shapes_change():
+    w = rt.World.default()
+    other = rt.World.default()
+    bvh = w.acceleration_structure()
+    s = rt.Sphere()
+    s.set_transform(rt.translation(0, 5, 0))
+    rt.Group([s, rt.Sphere()])
+    other.objects[0].set_transform(rt.translation(0, 1, 0))
+    assert w.acceleration_structure() is bvh
+    w.objects[1].set_transform(rt.scaling(0.2, 0.2, 0.2))
+    assert w.acceleration_structure() is not bvh
+
+
+def test_bvh_is_rebuilt_after_changes_inside_objects():
+    prototype = rt.Sphere()
+    group = rt.Group()
+    w = rt.World()
+    w.objects = [group, rt.Instance(prototype, rt.translation(5, 0, 0))]
+    bvh = w.acceleration_structure()
+    child = rt.Sphere()
+    group.add_child(child)
+    assert w.acceleration_structure() is not bvh
+    bvh = w.acceleration_structure()
+    child.set_transform(rt.translation(0, 3, 0))
+    assert w.acceleration_structure() is not bvh
+    bvh = w.acceleration_structure()
+    prototype.set_transform(rt.scaling(2, 2, 2))
+    assert w.acceleration_structure() is not bvh
+    r = rt.Ray(rt.Point(6.5, 0, -5), rt.Vector(0, 0, 1))
+    assert w.closest_hit(r).shape is w.objects[1]
+    r = rt.Ray(rt.Point(0, 3, -5), rt.Vector(0, 0, 1))
+    assert w.closest_hit(r).shape is child
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 import raytracer as rt
 
 
@@ -55,3 +57,131 @@ def test_render_world():
     )
     canvas = c.render(w)
     assert canvas.pixel_at(5, 5) == rt.Color(0.38066, 0.47583, 0.2855)
+
+
+def test_ray_follows_reassigned_camera_transform():
+    c = rt.Camera(201, 101, math.pi / 2)
+    assert c.ray_for_pixel(100, 50).origin == rt.Point(0, 0, 0)
+    c.transform = rt.translation(0, -2, 5)
+    r = c.ray_for_pixel(100, 50)
+    assert r.origin == rt.Point(0, 2, -5)
+    assert r.direction == rt.Vector(0, 0, -1)
+
+
+def test_rays_for_pixels_match_ray_for_pixel():
+    c = rt.Camera(201, 101, math.pi / 2)
+    c.transform = rt.rotation_y(math.pi / 4).multiply(rt.translation(0, -2, 5))
+    bundle = c.rays_for_pixels(np.array([0, 100, 200]), np.array([0, 50, 100]))
+    for index, (x, y) in enumerate([(0, 0), (100, 50), (200, 100)]):
+        r = c.ray_for_pixel(x, y)
+        assert bundle[index].origin == r.origin
+        assert bundle[index].direction == r.direction
+
+
+def _striped_world():
+    floor = rt.Plane()
+    floor.material = rt.Material(
+        pattern=rt.StripePattern(rt.Colors.red, rt.Colors.white), specular=0
+    )
+    middle = rt.Sphere()
+    middle.set_transform(rt.translation(-0.5, 1, 0.5))
+    pattern = rt.StripePattern(rt.Colors.red, rt.Colors.white)
+    pattern.transform = rt.scaling(0.5, 1, 1.5)
+    middle.material = rt.Material(pattern=pattern, diffuse=0.7, specular=0.3)
+    right = rt.Sphere()
+    right.set_transform(
+        rt.translation(1.5, 0.5, -0.5).multiply(rt.scaling(0.5, 0.5, 0.5))
+    )
+    w = rt.World()
+    w.objects = [floor, right, middle]
+    w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+    return w
+
+
+def test_vectorized_render_matches_render():
+    c = rt.Camera(40, 20, math.pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 1.5, -5), rt.Point(0, 1, 0), rt.Vector(0, 1, 0)
+    )
+    for w in [rt.World.default(), _striped_world()]:
+        expected = c.render(w)
+        canvas = c.render_vectorized(w, tile_size=16)
+        for y in range(c.vsize):
+            for x in range(c.hsize):
+                assert canvas.pixel_at(x, y) == expected.pixel_at(x, y)
+
+
+def test_vectorized_render_matches_render_with_textures():
+    near = rt.Sphere()
+    near.material = rt.Material(pattern=rt.Texture(rt.TexturePath.earthTexture))
+    far = rt.Sphere()
+    far.set_transform(rt.translation(3, 1, 20).multiply(rt.scaling(2, 2, 2)))
+    far.material = rt.Material(
+        pattern=rt.Texture(rt.TexturePath.earthTexture, filtering="bilinear")
+    )
+    w = rt.World()
+    w.objects = [near, far]
+    w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+    c = rt.Camera(40, 20, math.pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 1.5, -5), rt.Point(0, 1, 0), rt.Vector(0, 1, 0)
+    )
+    expected = c.render(w)
+    canvas = c.render_vectorized(w, tile_size=16)
+    for y in range(c.vsize):
+        for x in range(c.hsize):
+            assert canvas.pixel_at(x, y) == expected.pixel_at(x, y)
+
+
+def test_parallel_render_matches_render():
+    w = _striped_world()
+    c = rt.Camera(30, 20, math.pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 1.5, -5), rt.Point(0, 1, 0), rt.Vector(0, 1, 0)
+    )
+    expected = c.render(w)
+    for vectorized in [True, False]:
+        canvas = c.render_parallel(w, workers=2, tile_size=8, vectorized=vectorized)
+        for y in range(c.vsize):
+            for x in range(c.hsize):
+                assert canvas.pixel_at(x, y) == expected.pixel_at(x, y)
+
+
+def test_screen_rectangle_of_shapes():
+    c = rt.Camera(101, 51, math.pi / 2)
+    c.transform = rt.view_transform(
+        rt.Point(0, 0, -5), rt.Point(0, 0, 0), rt.Vector(0, 1, 0)
+    )
+    x0, y0, x1, y1 = c.screen_rectangle(rt.Sphere().world_bounds())
+    assert 0 < x0 < 50 < x1 < 101
+    assert 0 < y0 < 25 < y1 < 51
+    assert c.screen_rectangle(rt.Plane().world_bounds()) == (0, 0, 101, 51)
+    around_camera = rt.Sphere()
+    around_camera.set_transform(rt.translation(0, 0, -5))
+    assert c.screen_rectangle(around_camera.world_bounds()) == (0, 0, 101, 51)
+    behind = rt.Sphere()
+    behind.set_transform(rt.translation(0, 0, -10))
+    assert c.screen_rectangle(behind.world_bounds()) is None
+    aside = rt.Sphere()
+    aside.set_transform(rt.translation(20, 0, 0))
+    assert c.screen_rectangle(aside.world_bounds()) is None
+
+
+def test_culled_render_matches_unculled_rays():
+    w = _striped_world()
+    for x in range(-3, 4):
+        s = rt.Sphere()
+        s.set_transform(rt.translation(x, 2.5, 0).multiply(rt.scaling(0.2, 0.2, 0.2)))
+        w.objects.append(s)
+    c = rt.Camera(48, 32, math.pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 1.5, -5), rt.Point(0, 1, 0), rt.Vector(0, 1, 0)
+    )
+    rectangles = c.screen_rectangles(w)
+    candidates = c.primary_candidates(w, rectangles, 0, 0, 16, 16)
+    assert candidates is not None and len(candidates) < len(w.objects)
+    for canvas in [c.render(w), c.render_vectorized(w, tile_size=16)]:
+        for y in range(c.vsize):
+            for x in range(c.hsize):
+                expected = w.color_at(c.ray_for_pixel(x, y))
+                assert canvas.pixel_at(x, y) == expected
@@ -1,4 +1,11 @@
+import io
+import zlib
+
+import numpy as np
+from PIL import Image
+
 from src.raytracer import Canvas, Color
+from src.raytracer import canvas as canvas_module
 
 
 def test_canvas_dimensions():
@@ -34,6 +41,24 @@ def test_canvas_write_pixel():
     assert canvas.pixel_at(2, 3) == color
 
 
+def test_canvas_is_backed_by_float32_buffer():
+    canvas = Canvas(width=10, height=20, color=Color(0.5, 0.25, 1))
+    assert canvas.buffer.shape == (20, 10, 3)
+    assert canvas.buffer.dtype == np.float32
+    assert canvas.pixel_at(9, 19) == Color(0.5, 0.25, 1)
+
+
+def test_canvas_views_write_through():
+    canvas = Canvas(width=10, height=20)
+    canvas.row(3)[2] = (1, 0, 0)
+    assert canvas.pixel_at(2, 3) == Color(1, 0, 0)
+    canvas.tile(4, 5, 6, 8)[:] = (0, 1, 0)
+    assert canvas.pixel_at(5, 7) == Color(0, 1, 0)
+    assert canvas.pixel_at(6, 7) == Color(0, 0, 0)
+    canvas.pixels[:] = (0, 0, 1)
+    assert canvas.pixel_at(2, 3) == Color(0, 0, 1)
+
+
 def test_ppm_last_line_is_newline():
     canvas = Canvas(5, 3)
     ppm = canvas.convert_to_ppm()
@@ -41,14 +66,40 @@ def test_ppm_last_line_is_newline():
 
 
 def test_break_long_lines_ppm():
-    pass
-    # canvas = Canvas(10, 2, Color(1, 0.8, 0.6))
-    # ppm = canvas.convert_to_ppm()
-    # for index, line in enumerate(ppm.splitlines()):
-    #     if index == 3 or index == 5:
-    #         assert line == "255 204 153 255 204 153 255 204 153 255 204 153 255 204 153 255 204 "
-    #     if index == 4 or index == 6:
-    #         assert line == "153 255 204 153 255 204 153 255 204 153 255 204 153 "
+    canvas = Canvas(10, 2, Color(1, 0.8, 0.6))
+    ppm = canvas.convert_to_ppm()
+    for index, line in enumerate(ppm.splitlines()):
+        if index == 3 or index == 5:
+            assert line == "255 204 153 255 204 153 255 204 153 255 204 153 255 204 153 255 204 "
+        if index == 4 or index == 6:
+            assert line == "153 255 204 153 255 204 153 255 204 153 255 204 153 "
+    assert len(ppm.splitlines()) == 7
+
+
+def test_ppm_lines_are_at_most_70_characters():
+    canvas = Canvas(100, 3, Color(1, 0.8, 0.6))
+    for line in canvas.convert_to_ppm().splitlines():
+        assert len(line.rstrip()) <= 70
+
+
+def test_scaled_buffer_matches_scale():
+    canvas = Canvas(width=5, height=1)
+    for column, value in enumerate([1.5, 0.5, -0.5, 0.3, 0.8]):
+        canvas.write_pixel(column, 0, Color(value, value, value))
+    scaled = canvas.scaled_buffer()
+    for column in range(5):
+        assert scaled[0, column, 0] == canvas.scale(canvas.pixel_at(column, 0).red)
+
+
+def test_binary_ppm():
+    canvas = Canvas(width=2, height=2)
+    canvas.write_pixel(1, 0, Color(1.5, 0.5, 0))
+    canvas.write_pixel(0, 1, Color(0, 0, 1))
+    ppm = io.BytesIO()
+    canvas.write_ppm(ppm, binary=True)
+    assert ppm.getvalue() == b"P6\n2 2\n255\n" + bytes(
+        [0, 0, 0, 255, 128, 0, 0, 0, 255, 0, 0, 0]
+    )
 
 
 def test_ppm():
@@ -74,3 +125,51 @@ def test_ppm():
             assert line == "0 0 0 0 0 0 0 128 0 0 0 0 0 0 0 "
         elif index == 5:
             assert line == "0 0 0 0 0 0 0 0 0 0 0 0 0 0 255 "
+
+
+def _gradient_canvas(width, height):
+    canvas = Canvas(width, height)
+    canvas.buffer[:] = np.linspace(-0.2, 1.2, width * height * 3).reshape(
+        (height, width, 3)
+    )
+    return canvas
+
+
+def test_save_png():
+    canvas = _gradient_canvas(7, 5)
+    png = io.BytesIO()
+    canvas.save_png(png)
+    image = Image.open(png)
+    assert image.format == "PNG"
+    assert image.size == (7, 5)
+    assert (np.asarray(image) == canvas.scaled_buffer()).all()
+
+
+def test_save_tiff_stores_16_bit_samples():
+    canvas = _gradient_canvas(300, 250)
+    tiff = io.BytesIO()
+    canvas.save_tiff(tiff)
+    image = Image.open(tiff)
+    assert image.size == (300, 250)
+    assert image.tag_v2[258] == (16, 16, 16)
+    data = tiff.getvalue()
+    strips = [
+        zlib.decompress(data[offset : offset + count])
+        for offset, count in zip(image.tag_v2[273], image.tag_v2[279])
+    ]
+    samples = np.frombuffer(b"".join(strips), "<u2").reshape((250, 300, 3))
+    assert (samples == canvas.scaled_buffer(65535)).all()
+
+
+def test_ppm_written_in_chunks_of_rows(monkeypatch):
+    c = Canvas(width=7, height=5)
+    c.buffer[:] = np.random.default_rng(3).uniform(-0.2, 1.2, c.buffer.shape)
+    expected_text = c.convert_to_ppm()
+    expected_binary = io.BytesIO()
+    c.write_ppm(expected_binary, binary=True)
+    # two rows per chunk, the last chunk has a single row
+    monkeypatch.setattr(canvas_module, "PPM_CHUNK_SIZE", 2 * 3 * 7)
+    assert c.convert_to_ppm() == expected_text
+    binary = io.BytesIO()
+    c.write_ppm(binary, binary=True)
+    assert binary.getvalue() == expected_binary.getvalue()
@@ -0,0 +1,86 @@
+import random
+
+import numpy as np
+
+import raytracer as rt
+
+
+def test_grid_resolution():
+    resolution = rt.grid_resolution(np.array([10.0, 10.0, 10.0]), 1000, density=3)
+    assert (resolution == 14).all()
+    flat = rt.grid_resolution(np.array([10.0, 0.0, 10.0]), 100)
+    assert flat[1] == 1
+    assert (rt.grid_resolution(np.array([1.0, 1.0, 1.0]), 10**9) == 128).all()
+
+
+def test_shapes_are_listed_in_overlapping_cells():
+    shapes = []
+    for x in range(4):
+        s = rt.Sphere()
+        s.set_transform(rt.translation(3 * x, 0, 0))
+        shapes.append(s)
+    grid = rt.UniformGrid(shapes + [rt.Plane()], density=1)
+    assert grid.unbounded[0].__class__ is rt.Plane
+    # cells of width 2.2 starting at x = -1
+    assert list(grid.resolution) == [5, 1, 1]
+    expected = [[0], [1], [1, 2], [2], [3]]
+    for cell in range(5):
+        start, end = grid.cell_start[cell], grid.cell_start[cell + 1]
+        assert list(grid.cell_items[start:end]) == expected[cell]
+
+
+def test_cells_are_walked_in_order():
+    shapes = []
+    for x in range(-5, 6):
+        for y in range(-5, 6):
+            s = rt.Sphere()
+            s.set_transform(rt.translation(2 * x, 2 * y, x + y))
+            shapes.append(s)
+    grid = rt.UniformGrid(shapes)
+    r = rt.Ray(rt.Point(-20, -15, -30), rt.Vector(2, 1.5, 3).normalize())
+    cells = list(grid.cells(r))
+    assert len(cells) > 3
+    assert len({cell for cell, _, _ in cells}) == len(cells)
+    for (_, entry, exit), (_, next_entry, _) in zip(cells, cells[1:]):
+        assert entry <= exit == next_entry
+    r = rt.Ray(rt.Point(-20, 40, 0), rt.Vector(1, 0, 0))
+    assert list(grid.cells(r)) == []
+    assert list(rt.UniformGrid([]).cells(r)) == []
+
+
+def _random_world(count, accelerator):
+    rng = random.Random(count)
+    w = rt.World(accelerator=accelerator)
+    for _ in range(count):
+        s = rt.Sphere()
+        s.set_transform(
+            rt.translation(
+                rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(-5, 5)
+            ).multiply(rt.scaling(0.4, 0.4, 0.4))
+        )
+        w.objects.append(s)
+    w.objects.append(rt.Plane())
+    w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+    return w
+
+
+def test_world_with_grid_matches_linear_world():
+    grid_world = _random_world(80, "grid")
+    linear_world = _random_world(80, None)
+    assert isinstance(grid_world.acceleration_structure(), rt.UniformGrid)
+    rng = random.Random(3)
+    for _ in range(100):
+        direction = rt.Vector(rng.uniform(-1, 1), rng.uniform(-1, 1), 1).normalize()
+        r = rt.Ray(rt.Point(rng.uniform(-6, 6), 0, -10), direction)
+        assert grid_world.color_at(r) == linear_world.color_at(r)
+        assert [i.t for i in grid_world.intersect(r)] == [
+            i.t for i in linear_world.intersect(r)
+        ]
+        expected = linear_world.closest_hit(r)
+        closest = grid_world.closest_hit(r)
+        if expected is None:
+            assert closest is None
+        else:
+            assert closest.t == expected.t
+        point = r.position(rng.uniform(0, 20))
+        assert grid_world.is_shadowed(point) == linear_world.is_shadowed(point)
@@ -1,3 +1,5 @@
+import numpy as np
+
 from src.raytracer import Color, Point, PointLight
 
 
@@ -7,3 +9,20 @@ def test_point_light_constructor():
     light = PointLight(position, intensity)
     assert light.position == position
     assert light.intensity == intensity
+
+
+def test_point_light_without_radius_does_not_fade():
+    light = PointLight(Point(0, 0, 0), Color(1, 0.5, 0))
+    assert light.radius is None
+    assert light.attenuation(1e6) == 1
+    assert light.intensity_at(Point(0, 1e6, 0)) == Color(1, 0.5, 0)
+
+
+def test_point_light_fades_out_at_radius():
+    light = PointLight(Point(0, 0, 0), Color(1, 0.5, 0), radius=2)
+    assert light.attenuation(0) == 1
+    assert light.attenuation(1) == 0.5625
+    assert light.attenuation(2) == 0
+    assert light.attenuation(3) == 0
+    assert light.intensity_at(Point(0, 1, 0)) == Color(0.5625, 0.28125, 0)
+    assert list(light.attenuation_array(np.array([0, 1, 2, 3]))) == [1, 0.5625, 0, 0]
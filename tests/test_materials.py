@@ -1,9 +1,17 @@
 import math
+import pickle
+import weakref
+
+import numpy as np
+import pytest
+from PIL import Image
 
 from src.raytracer import (Color, Colors, ConstantPattern, Intersection,
                            IntersectionInfo, Material, Point, PointLight,
-                           Sphere, StripePattern, Vector, lighting, scaling,
-                           translation)
+                           Sphere, StripePattern, Texture, TextureCache,
+                           TexturePath, Vector, downsample, lighting,
+                           lighting_batch, mapped_texture, scaling,
+                           texture_cache, translation)
 
 
 def test_material_constructor():
@@ -77,6 +85,90 @@ def test_lighting_with_surface_in_shadow():
     assert result == Color(0.1, 0.1, 0.1)
 
 
+# light position, eye vector and shadow flag of the lighting tests above, with
+# the expected color for a point at the origin with normal (0, 0, -1)
+LIGHTING_CASES = [
+    (Point(0, 0, -10), Vector(0, 0, -1), False, Color(1.9, 1.9, 1.9)),
+    (
+        Point(0, 0, -10),
+        Vector(0, 1 / math.sqrt(2), -1 / math.sqrt(2)),
+        False,
+        Color(1.0, 1.0, 1.0),
+    ),
+    (Point(0, 10, -10), Vector(0, 0, -1), False, Color(0.7364, 0.7364, 0.7364)),
+    (
+        Point(0, 10, -10),
+        Vector(0, -1 / math.sqrt(2), -1 / math.sqrt(2)),
+        False,
+        Color(1.6364, 1.6364, 1.6364),
+    ),
+    (Point(0, 0, 10), Vector(0, 0, -1), False, Color(0.1, 0.1, 0.1)),
+    (Point(0, 0, -10), Vector(0, 0, -1), True, Color(0.1, 0.1, 0.1)),
+]
+
+
+def as_rows(*tuples):
+    return np.array([(t.x, t.y, t.z, t.w) for t in tuples], np.float64)
+
+
+@pytest.mark.parametrize("position, eyev, in_shadow, expected", LIGHTING_CASES)
+def test_lighting_batch_matches_lighting(position, eyev, in_shadow, expected):
+    light = PointLight(position, Color(1, 1, 1))
+    m = Material()
+    result = lighting_batch(
+        light,
+        np.ones((1, 3)),
+        as_rows(Point(0, 0, 0)),
+        as_rows(eyev),
+        as_rows(Vector(0, 0, -1)),
+        m.ambient,
+        m.diffuse,
+        m.specular,
+        m.shininess,
+        np.array([in_shadow]),
+    )
+    assert Color(*result[0]) == expected
+
+
+def test_lighting_batch_with_materials_per_hit():
+    light = PointLight(Point(0, 10, -10), Color(1, 0.8, 0.6))
+    materials = [
+        Material(),
+        Material(ambient=0.3, diffuse=0.5, specular=0.2, shininess=10),
+        Material(ambient=0, diffuse=1, specular=1, shininess=1),
+    ]
+    points = [Point(0, 0, 0), Point(1, 2, 0), Point(-1, 0, 3)]
+    eyevs = [
+        Vector(0, -1 / math.sqrt(2), -1 / math.sqrt(2)),
+        Vector(0, 0, -1),
+        Vector(0.6, 0, -0.8),
+    ]
+    normalv = Vector(0, 0, -1)
+    in_shadow = [False, False, True]
+    colors = [Color(1, 1, 1), Color(0.2, 0.4, 0.6), Color(1, 0, 0)]
+    result = lighting_batch(
+        light,
+        np.array([(c.red, c.green, c.blue) for c in colors]),
+        as_rows(*points),
+        as_rows(*eyevs),
+        as_rows(normalv, normalv, normalv),
+        np.array([m.ambient for m in materials]),
+        np.array([m.diffuse for m in materials]),
+        np.array([m.specular for m in materials]),
+        np.array([m.shininess for m in materials]),
+        np.array(in_shadow),
+    )
+    for i, m in enumerate(materials):
+        s = Sphere()
+        s.material = Material(
+            m.ambient, m.diffuse, m.specular, m.shininess, ConstantPattern(colors[i])
+        )
+        info = IntersectionInfo(
+            Intersection(0, s), points[i], eyevs[i], normalv, False, None
+        )
+        assert Color(*result[i]) == lighting(light, info, in_shadow[i])
+
+
 def test_lighting_with_a_pattern():
     m = Material(
         ambient=1,
@@ -153,3 +245,219 @@ def test_stripes_with_both_object_and_pattern_transformation():
     pattern.transform = translation(0.5, 0, 0)
     c = pattern.pattern_at_shape(s, Point(2.5, 0, 0))
     assert c == Colors.white
+
+
+def test_stripes_follow_changed_object_and_pattern_transformation():
+    s = Sphere()
+    pattern = StripePattern(Colors.white, Colors.black)
+    assert pattern.pattern_at_shape(s, Point(1.5, 0, 0)) == Colors.black
+    s.set_transform(scaling(2, 2, 2))
+    assert pattern.pattern_at_shape(s, Point(1.5, 0, 0)) == Colors.white
+    pattern.transform = translation(1, 0, 0)
+    assert pattern.pattern_at_shape(s, Point(1.5, 0, 0)) == Colors.black
+
+
+def test_patterns_keep_no_state_for_shapes():
+    # the default pattern is shared by every material
+    pattern = Material().pattern
+    state = pickle.dumps(pattern)
+    s = Sphere()
+    assert pattern.pattern_at_shape(s, Point(1, 0, 0)) == Color(1, 1, 1)
+    assert pickle.dumps(pattern) == state
+    shape = weakref.ref(s)
+    del s
+    assert shape() is None
+
+
+def write_image(path, width, height, value):
+    Image.new("RGB", (width, height), (value, value // 2, 0)).save(path)
+    return path
+
+
+def test_texture_cache_decodes_to_float_texels(tmp_path):
+    path = write_image(tmp_path / "a.png", 4, 2, 255)
+    cache = TextureCache(directory=None)
+    texels = cache.get(path)
+    assert texels.shape == (2, 4, 3)
+    assert texels.dtype == np.float32
+    assert np.allclose(texels[0, 0], (1, 127 / 255, 0))
+    assert not texels.flags.writeable
+
+
+def test_texture_cache_shares_texels(tmp_path):
+    path = write_image(tmp_path / "a.png", 4, 2, 255)
+    cache = TextureCache(directory=None)
+    assert cache.get(path) is cache.get(str(path))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_texture_cache_evicts_least_recently_used(tmp_path):
+    paths = [write_image(tmp_path / f"{i}.png", 4, 4, i) for i in range(3)]
+    # room for two textures of 4 x 4 x 3 float32 texels
+    cache = TextureCache(max_bytes=2 * 4 * 4 * 3 * 4, directory=None)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert paths[0] in cache
+    assert paths[1] not in cache
+    assert paths[2] in cache
+    assert cache.nbytes == 2 * 4 * 4 * 3 * 4
+
+
+def test_texture_cache_maps_converted_texels(tmp_path):
+    path = write_image(tmp_path / "a.png", 4, 2, 255)
+    directory = tmp_path / "cache"
+    texels = TextureCache(directory=directory).get(path)
+    assert isinstance(texels, np.memmap)
+    assert not texels.flags.writeable
+    assert len(list(directory.iterdir())) == 1
+    # a second process maps the file written by the first
+    again = TextureCache(directory=directory).get(path)
+    assert np.array_equal(again, TextureCache(directory=None).get(path))
+    assert len(list(directory.iterdir())) == 1
+
+
+def test_mapped_texture_converts_edited_images_again(tmp_path):
+    path = write_image(tmp_path / "a.png", 4, 2, 255)
+    assert mapped_texture(path, tmp_path / "cache").shape == (2, 4, 3)
+    write_image(path, 8, 2, 0)
+    assert mapped_texture(path, tmp_path / "cache").shape == (2, 8, 3)
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+
+
+def test_textures_with_the_same_path_share_texels():
+    textures = [Texture(TexturePath.earthTexture) for _ in range(50)]
+    assert all(t.texture is textures[0].texture for t in textures)
+    assert TexturePath.earthTexture in texture_cache
+
+
+def test_texture_pickles_without_texels():
+    texture = Texture(TexturePath.earthTexture)
+    data = pickle.dumps(texture)
+    assert len(data) < texture.texture.nbytes / 100
+    assert pickle.loads(data).texture is texture.texture
+
+
+def test_texture_colors_match_image():
+    texture = Texture(TexturePath.earthTexture)
+    s = Sphere()
+    image = np.asarray(Image.open(TexturePath.earthTexture))
+    points = np.array([(0, 0, -1, 1), (0.6, 0.8, 0, 1), (0, -0.6, 0.8, 1)], np.float64)
+    colors = texture.pattern_at_shape_array(s, points)
+    for point, color in zip(points, colors):
+        v, u = s.texture_transform(Point(*point[:3]))
+        expected = image[math.floor(texture.u_max * u), math.floor(texture.v_max * v)]
+        assert np.allclose(color, expected / 255)
+        assert texture.pattern_at_shape(s, Point(*point[:3])) == Color(*color)
+
+
+def test_downsample_averages_texels():
+    texels = np.arange(3 * 5 * 3, dtype=np.float32).reshape((3, 5, 3))
+    smaller = downsample(texels)
+    assert smaller.shape == (2, 3, 3)
+    assert np.allclose(smaller[0, 0], texels[:2, :2].mean(axis=(0, 1)))
+    # the last row and column are repeated for odd sizes
+    assert np.allclose(smaller[1, 2], texels[2, 4])
+
+
+def test_texture_cache_builds_mip_levels(tmp_path):
+    path = write_image(tmp_path / "a.png", 5, 3, 255)
+    cache = TextureCache(directory=None)
+    levels = cache.levels(path)
+    assert [level.shape[:2] for level in levels] == [(3, 5), (2, 3), (1, 2), (1, 1)]
+    assert levels[0] is cache.get(path)
+    assert cache.levels(path) is levels
+    assert cache.nbytes == sum(level.nbytes for level in levels)
+    mapped = TextureCache(directory=tmp_path / "cache").levels(path)
+    assert all(np.allclose(a, b) for a, b in zip(levels, mapped, strict=True))
+
+
+def checker_texture(tmp_path):
+    # 64 x 32 texels of alternating black and white
+    texels = np.indices((32, 64)).sum(axis=0) % 2 * 255
+    path = tmp_path / "checker.png"
+    Image.fromarray(np.repeat(texels[..., np.newaxis], 3, 2).astype(np.uint8)).save(
+        path
+    )
+    return str(path)
+
+
+def test_texture_mip_level_follows_footprint(tmp_path):
+    texture = Texture(checker_texture(tmp_path))
+    s = Sphere()
+    point = Point(0, 0, -1)
+    assert texture.pattern_at_shape(s, point) in (Colors.white, Colors.black)
+    assert texture.pattern_at_shape(s, point, 0.01) in (Colors.white, Colors.black)
+    # footprints covering many texels average them
+    assert texture.pattern_at_shape(s, point, 1.0) == Color(0.5, 0.5, 0.5)
+    # a footprint of 0.2 covers about 2 texels of the 64 around the equator
+    levels = texture.mip_level_array(
+        s, np.array([(0, 0, -1, 1)] * 2, np.float64), np.array([0, 0.2])
+    )
+    assert levels.tolist() == [0, 1]
+
+
+def test_texture_mip_level_accounts_for_shape_scale(tmp_path):
+    texture = Texture(checker_texture(tmp_path))
+    s = Sphere()
+    s.set_transform(scaling(4, 4, 4))
+    point = np.array([(0, 0, -1, 1)], np.float64)
+    large = texture.mip_level_array(s, point, np.array([0.8]))
+    small = texture.mip_level_array(Sphere(), point, np.array([0.2]))
+    assert large.tolist() == small.tolist() == [1]
+
+
+def test_texture_object_scale_follows_shape_transformation(tmp_path):
+    texture = Texture(checker_texture(tmp_path))
+    state = pickle.dumps(texture)
+    s = Sphere()
+    point = np.array([(0, 0, -1, 1)], np.float64)
+    assert texture.mip_level_array(s, point, np.array([0.8])).tolist() == [3]
+    s.set_transform(scaling(4, 4, 4))
+    assert s.object_scale == pytest.approx(0.25)
+    assert texture.mip_level_array(s, point, np.array([0.8])).tolist() == [1]
+    # the scale is kept by the shape, not by the shared texture
+    assert pickle.dumps(texture) == state
+
+
+def sphere_point(row, column, height, width):
+    # point on the unit sphere that Sphere.texture_transform maps to the given
+    # row and column of a texture with height x width texels
+    theta = row / height * math.pi
+    phi = column / width * 2 * math.pi - math.pi
+    return Point(
+        math.sin(theta) * math.cos(phi),
+        math.cos(theta),
+        math.sin(theta) * math.sin(phi),
+    )
+
+
+def test_bilinear_texture_interpolates_texels(tmp_path):
+    texture = Texture(checker_texture(tmp_path), filtering="bilinear")
+    s = Sphere()
+    # texel centers lie at half integer coordinates, texel (2, 3) is white
+    center = texture.pattern_at_shape(s, sphere_point(2.5, 3.5, 32, 64))
+    assert center == Colors.white
+    between = texture.pattern_at_shape(s, sphere_point(2.5, 4, 32, 64))
+    assert between == Color(0.5, 0.5, 0.5)
+    nearest = Texture(checker_texture(tmp_path))
+    assert nearest.pattern_at_shape(s, sphere_point(2.5, 4.1, 32, 64)) == Colors.black
+
+
+def test_texture_footprints_match_scalar_lookups(tmp_path):
+    for filtering in ["nearest", "bilinear"]:
+        texture = Texture(checker_texture(tmp_path), filtering)
+        s = Sphere()
+        s.set_transform(translation(1, 0, 0).multiply(scaling(2, 2, 2)))
+        points = np.array([(1, 0, -2, 1), (2.2, 1.6, 0, 1), (1, -1.2, 1.6, 1)])
+        footprints = np.array([0, 0.05, 0.4])
+        colors = texture.pattern_at_shape_array(s, points, footprints)
+        for point, footprint, color in zip(points, footprints, colors):
+            world_point = Point(*point[:3])
+            assert texture.pattern_at_shape(s, world_point, footprint) == Color(*color)
+
+
+def test_unknown_texture_filtering():
+    with pytest.raises(ValueError):
+        Texture(TexturePath.earthTexture, filtering="cubic")
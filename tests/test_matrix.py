@@ -210,3 +210,35 @@ def test_multiply_by_its_inverse():
     assert inverse.multiply_matrix(matrix).approximately_equals(
         create_identity_matrix()
     )
+
+
+def test_affine_fast_path_matches_numpy():
+    matrix = Matrix(values=[1, 2, 3, 4, 2, 4, 4, 2, 8, 6, 4, 1, 0, 0, 0, 1])
+    assert matrix.affine is not None
+    tuple = Tuple(1, 2, 3, 1)
+    expected = matrix.matrix @ [tuple.x, tuple.y, tuple.z, tuple.w]
+    assert matrix.multiply_tuple(tuple) == Tuple(*expected)
+
+
+def test_affine_fast_path_not_used_for_projective_matrix():
+    matrix = Matrix(values=[1, 2, 3, 4, 2, 4, 4, 2, 8, 6, 4, 1, 0, 0, 1, 1])
+    assert matrix.affine is None
+    assert matrix.multiply_tuple(Tuple(1, 2, 3, 1)) == Tuple(18, 24, 33, 4)
+
+
+def test_affine_fast_path_follows_set_value_at():
+    matrix = create_identity_matrix()
+    assert matrix.multiply_tuple(Tuple(1, 2, 3, 1)) == Tuple(1, 2, 3, 1)
+    matrix.set_value_at(0, 3, 5)
+    assert matrix.multiply_tuple(Tuple(1, 2, 3, 1)) == Tuple(6, 2, 3, 1)
+    matrix.set_value_at(3, 3, 2)
+    assert matrix.affine is None
+    assert matrix.multiply_tuple(Tuple(1, 2, 3, 1)) == Tuple(6, 2, 3, 2)
+
+
+def test_multiply_vector_ignores_last_row_and_column():
+    matrix = Matrix(values=[1, 2, 3, 4, 2, 4, 4, 2, 8, 6, 4, 1, 5, 6, 7, 1])
+    assert matrix.affine is None
+    assert matrix.multiply_vector(Tuple(1, 2, 3, 0)) == Tuple(14, 22, 32, 0)
+    matrix.set_value_at(0, 0, 2)
+    assert matrix.multiply_vector(Tuple(1, 2, 3, 0)) == Tuple(15, 22, 32, 0)
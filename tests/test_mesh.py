@@ -0,0 +1,201 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import raytracer as rt
+from raytracer import mesh
+
+
+def _book_triangle():
+    return rt.Triangle(rt.Point(0, 1, 0), rt.Point(-1, 0, 0), rt.Point(1, 0, 0))
+
+
+def test_constructing_triangle():
+    t = _book_triangle()
+    assert t.e1 == rt.Vector(-1, -1, 0)
+    assert t.e2 == rt.Vector(1, -1, 0)
+    assert t.normal == rt.Vector(0, 0, -1)
+    assert t.normal_at(rt.Point(0, 0.5, 0)) == t.normal
+    assert t.bounds() == rt.BoundingBox(rt.Point(-1, 0, 0), rt.Point(1, 1, 0))
+
+
+def test_ray_misses_triangle():
+    t = _book_triangle()
+    assert t.intersect(rt.Ray(rt.Point(0, -1, -2), rt.Vector(0, 1, 0))) == []
+    for origin in [rt.Point(1, 1, -2), rt.Point(-1, 1, -2), rt.Point(0, -1, -2)]:
+        assert t.intersect(rt.Ray(origin, rt.Vector(0, 0, 1))) == []
+
+
+def test_ray_strikes_triangle():
+    t = _book_triangle()
+    xs = t.intersect(rt.Ray(rt.Point(0, 0.5, -2), rt.Vector(0, 0, 1)))
+    assert len(xs) == 1
+    assert xs[0].t == 2
+
+
+def test_batched_kernel_matches_scalar_test():
+    rng = np.random.default_rng(1)
+    triangles = [
+        rt.Triangle(*(rt.Point(*rng.uniform(-1, 1, 3)) for _ in range(3)))
+        for _ in range(10)
+    ]
+    origins = np.column_stack([rng.uniform(-1, 1, (50, 2)), np.full(50, -5)])
+    directions = np.column_stack([rng.uniform(-0.1, 0.1, (50, 2)), np.ones(50)])
+    ts = rt.intersect_triangles(
+        origins,
+        directions,
+        np.array([[t.p1.x, t.p1.y, t.p1.z] for t in triangles]),
+        np.array([[t.e1.x, t.e1.y, t.e1.z] for t in triangles]),
+        np.array([[t.e2.x, t.e2.y, t.e2.z] for t in triangles]),
+    )
+    assert np.isfinite(ts).any()
+    for n in range(50):
+        r = rt.Ray(rt.Point(*origins[n]), rt.Vector(*directions[n]))
+        for k, triangle in enumerate(triangles):
+            xs = [i.t for i in triangle.intersect(r) if i.t > 0]
+            expected = xs[0] if xs else math.inf
+            assert ts[n, k] == pytest.approx(expected)
+
+
+def _cube():
+    vertices = np.array(
+        [(x, y, z) for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], float
+    )
+    # two triangles per side with outward normals, numbered like the corners above
+    faces = np.array(
+        [
+            (3, 1, 0), (2, 3, 0), (7, 6, 4), (5, 7, 4),
+            (5, 4, 0), (1, 5, 0), (7, 3, 2), (6, 7, 2),
+            (6, 2, 0), (4, 6, 0), (7, 5, 1), (3, 7, 1),
+        ]
+    )  # fmt: skip
+    return rt.Mesh(vertices, faces, leaf_size=2)
+
+
+def test_mesh_intersections():
+    cube = _cube()
+    cube.set_transform(rt.translation(0, 0, 3))
+    assert cube.bounds() == rt.BoundingBox(rt.Point(-1, -1, -1), rt.Point(1, 1, 1))
+    r = rt.Ray(rt.Point(0.3, 0.2, -5), rt.Vector(0, 0, 1))
+    xs = cube.intersect(r)
+    assert [i.t for i in xs] == pytest.approx([7, 9])
+    closest = cube.closest_hit(r)
+    assert closest.t == pytest.approx(7)
+    assert rt.Vector(*cube.normals[closest.face]) == rt.Vector(0, 0, -1)
+    assert cube.normal_at(r.position(closest.t), closest) == rt.Vector(0, 0, -1)
+    assert cube.closest_hit(r, 6) is None
+    assert cube.occludes(r, 8) and not cube.occludes(r, 6)
+    with pytest.raises(ValueError):
+        cube.normal_at(r.position(closest.t))
+
+
+def test_mesh_bundle_matches_scalar_queries():
+    cube = _cube()
+    cube.set_transform(rt.rotation_y(0.5).multiply(rt.rotation_x(0.3)))
+    rng = random.Random(4)
+    rays = [
+        rt.Ray(
+            rt.Point(rng.uniform(-2, 2), rng.uniform(-2, 2), -5),
+            rt.Vector(rng.uniform(-0.2, 0.2), rng.uniform(-0.2, 0.2), 1),
+        )
+        for _ in range(100)
+    ]
+    ts, faces = cube.intersect_bundle_faces(rt.RayBundle.from_rays(rays))
+    assert np.isfinite(ts).sum() > 10
+    for r, t, face in zip(rays, ts, faces):
+        closest = cube.closest_hit(r)
+        if closest is None:
+            assert t == math.inf and face == -1
+        else:
+            assert t == pytest.approx(closest.t)
+            assert face == closest.face
+
+
+def test_world_with_mesh_renders_like_vectorized():
+    cube = _cube()
+    cube.set_transform(rt.rotation_y(0.6).multiply(rt.scaling(0.8, 0.8, 0.8)))
+    w = rt.World()
+    w.objects = [rt.Plane(), cube]
+    w.objects[0].set_transform(rt.translation(0, -1, 0))
+    w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+    c = rt.Camera(24, 16, math.pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 2, -5), rt.Point(0, 0, 0), rt.Vector(0, 1, 0)
+    )
+    expected = c.render(w)
+    canvas = c.render_vectorized(w)
+    assert expected.pixel_at(12, 8) != rt.Color(0, 0, 0)
+    for y in range(c.vsize):
+        for x in range(c.hsize):
+            assert canvas.pixel_at(x, y) == expected.pixel_at(x, y)
+
+
+def test_load_obj_triangles(tmp_path, monkeypatch):
+    path = tmp_path / "triangles.obj"
+    lines = ["# triangles", "o strip"]
+    for x in range(30):
+        lines += [f"v {x} 0 0", f"v {x} 1 0.5", f"v {x + 1} 0 1e-1"]
+        lines.append(f"f {3 * x + 1} {3 * x + 2} {3 * x + 3}")
+    path.write_text("\r\n".join(lines))
+    # chunks end in the middle of lines
+    monkeypatch.setattr(mesh, "OBJ_CHUNK_SIZE", 50)
+    loaded = rt.load_obj(path)
+    assert loaded.vertices.shape == (90, 3)
+    assert list(loaded.vertices[4]) == [1, 1, 0.5]
+    assert list(loaded.vertices[2]) == [1, 0, 0.1]
+    assert loaded.faces.shape == (30, 3)
+    assert list(loaded.faces[1]) == [3, 4, 5]
+
+
+def test_load_obj_vertices_of_different_widths(tmp_path):
+    path = tmp_path / "colors.obj"
+    # twelve numbers on three lines look like three vertices of width four
+    path.write_text(
+        """v 0 0 0 1 0 0
+v 1 0 0
+v 0 1 0
+f 1 2 3
+"""
+    )
+    loaded = rt.load_obj(path)
+    assert loaded.vertices.tolist() == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+    assert loaded.faces.tolist() == [[0, 1, 2]]
+
+
+def test_load_obj_indented_lines(tmp_path, monkeypatch):
+    path = tmp_path / "indented.obj"
+    path.write_text("v 0 0 0\n  v 9 9 9\n\tv 1 0 0\nv 0 1 0\nv -inf 0 0\n  f 2 3 4\n")
+
+    def parse_lines(chunk, vertex_count):
+        raise AssertionError("The chunk should have been parsed as a whole")
+
+    monkeypatch.setattr(mesh, "_parse_obj_lines", parse_lines)
+    loaded = rt.load_obj(path)
+    assert loaded.vertices.tolist()[:4] == [[0, 0, 0], [9, 9, 9], [1, 0, 0], [0, 1, 0]]
+    assert loaded.vertices[4, 0] == -math.inf
+    assert loaded.faces.tolist() == [[1, 2, 3]]
+
+
+def test_load_obj_polygons(tmp_path):
+    path = tmp_path / "polygons.obj"
+    path.write_text(
+        """
+v -1 1 0
+v -1 0 0
+v 1 0 0
+v 1 1 0
+vt 0 0
+vn 0 0 1
+g first
+f 1/1/1 2/1/1 3/1/1 4/1/1
+v 0 2 0 1.0
+f -2 1//1 -1
+"""
+    )
+    loaded = rt.load_obj(path)
+    assert loaded.vertices.shape == (5, 3)
+    assert [list(face) for face in loaded.faces] == [[0, 1, 2], [0, 2, 3], [3, 0, 4]]
+    with pytest.raises(ValueError):
+        rt.Mesh(loaded.vertices, [[0, 1, 5]])
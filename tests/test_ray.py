@@ -1,4 +1,6 @@
-from src.raytracer import (Intersection, Point, Ray, Sphere, Vector,
+import numpy as np
+
+from src.raytracer import (Intersection, Point, Ray, RayBundle, Sphere, Vector,
                            create_identity_matrix, hit, scaling, translation)
 
 
@@ -130,3 +132,28 @@ def test_ray_scaling():
     r2 = m.multiply(r)
     assert r2.origin == Point(2, 6, 12)
     assert r2.direction == Vector(0, 3, 0)
+
+
+def test_ray_bundle_from_rays():
+    rays = [
+        Ray(Point(1, 2, 3), Vector(0, 1, 0)),
+        Ray(Point(0, 0, -5), Vector(0, 0, 1)),
+    ]
+    bundle = RayBundle.from_rays(rays)
+    assert len(bundle) == 2
+    assert bundle.origins.shape == (2, 4)
+    assert bundle[1].origin == Point(0, 0, -5)
+    assert bundle[1].direction == Vector(0, 0, 1)
+    assert (bundle.position(np.array([1, 2])) == [[1, 3, 3, 1], [0, 0, -3, 1]]).all()
+
+
+def test_ray_bundle_transformation_matches_single_rays():
+    rays = [
+        Ray(Point(1, 2, 3), Vector(0, 1, 0)),
+        Ray(Point(0, 0, -5), Vector(1, 0, 1)),
+    ]
+    m = translation(3, 4, 5).multiply(scaling(2, 3, 4))
+    bundle = m.multiply(RayBundle.from_rays(rays))
+    for i, r in enumerate(rays):
+        assert bundle[i].origin == m.multiply(r).origin
+        assert bundle[i].direction == m.multiply(r).direction
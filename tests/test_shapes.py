@@ -1,5 +1,9 @@
+import math
 from math import pi, sqrt
 
+import numpy as np
+import pytest
+
 import raytracer as rt
 
 
@@ -152,3 +156,291 @@ def test_texture_transform():
     s = rt.Sphere()
     assert s.texture_transform(rt.Point(0, 0, 1)) == (0.75, 0.5)
     assert s.texture_transform(rt.Point(0, 0, -1)) == (0.25, 0.5)
+
+
+def test_inverse_transform_is_cached_until_transform_changes():
+    s = rt.Sphere()
+    s.set_transform(rt.translation(0, 1, 0))
+    inverse = s.inverse_transform
+    assert inverse is s.inverse_transform
+    assert inverse == rt.translation(0, -1, 0)
+    s.transform = rt.scaling(2, 2, 2)
+    assert s.inverse_transform.approximately_equals(rt.scaling(0.5, 0.5, 0.5))
+    assert s.inverse_transpose.approximately_equals(rt.scaling(0.5, 0.5, 0.5))
+    assert s.normal_at(rt.Point(0, 2, 0)) == rt.Vector(0, 1, 0)
+
+
+def _random_bundle(count=200, seed=1):
+    rng = np.random.default_rng(seed)
+    origins = np.hstack([rng.uniform(-3, 3, (count, 3)), np.ones((count, 1))])
+    directions = np.hstack([rng.normal(size=(count, 3)), np.zeros((count, 1))])
+    directions[:10, 1] = 0  # some rays parallel to the default plane
+    return rt.RayBundle(origins, directions)
+
+
+def test_intersect_bundle_matches_scalar_intersection():
+    s = rt.Sphere()
+    s.set_transform(rt.translation(0.5, 0, 0).multiply(rt.scaling(2, 1, 1.5)))
+    p = rt.Plane()
+    p.set_transform(rt.rotation_z(0.3))
+    bundle = _random_bundle()
+    for shape in [s, p]:
+        ts = shape.intersect_bundle(bundle)
+        assert ts.shape == (len(bundle),)
+        for index in range(len(bundle)):
+            h = rt.hit(shape.intersect(bundle[index]))
+            if h is None:
+                assert ts[index] == np.inf
+            else:
+                assert math.isclose(ts[index], h.t, abs_tol=rt.ABS_TOL)
+
+
+def test_intersect_bundle_reports_misses_as_inf():
+    s = rt.Sphere()
+    p = rt.Plane()
+    bundle = rt.RayBundle.from_rays(
+        [
+            rt.Ray(rt.Point(0, 2, -5), rt.Vector(0, 0, 1)),
+            rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1)),
+            rt.Ray(rt.Point(0, 0, 0), rt.Vector(0, 0, 1)),
+            rt.Ray(rt.Point(0, 1, 0), rt.Vector(0, -1, 0)),
+        ]
+    )
+    assert list(s.intersect_bundle(bundle)) == [np.inf, 4, 1, 2]
+    assert list(p.intersect_bundle(bundle)) == [np.inf, np.inf, np.inf, 1]
+
+
+def test_adding_child_to_group():
+    g = rt.Group()
+    s = rt.Sphere()
+    g.add_child(s)
+    assert g.children == [s]
+    assert s.parent is g
+
+
+def test_intersecting_ray_with_empty_group():
+    g = rt.Group()
+    r = rt.Ray(rt.Point(0, 0, 0), rt.Vector(0, 0, 1))
+    assert g.intersect(r) == []
+
+
+def test_intersecting_ray_with_nonempty_group():
+    s1 = rt.Sphere()
+    s2 = rt.Sphere()
+    s2.set_transform(rt.translation(0, 0, -3))
+    s3 = rt.Sphere()
+    s3.set_transform(rt.translation(5, 0, 0))
+    g = rt.Group([s1, s2, s3])
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    xs = g.intersect(r)
+    assert [i.shape for i in xs] == [s2, s2, s1, s1]
+
+
+def test_intersecting_transformed_group():
+    s = rt.Sphere()
+    s.set_transform(rt.translation(5, 0, 0))
+    g = rt.Group([s])
+    g.set_transform(rt.scaling(2, 2, 2))
+    r = rt.Ray(rt.Point(10, 0, -10), rt.Vector(0, 0, 1))
+    assert len(g.intersect(r)) == 2
+
+
+def test_ray_missing_group_bounds_skips_children():
+    class CountingSphere(rt.Sphere):
+        calls = 0
+
+        def intersect(self, ray):
+            CountingSphere.calls += 1
+            return super().intersect(ray)
+
+    g = rt.Group([CountingSphere(), CountingSphere()])
+    g.children[1].set_transform(rt.translation(3, 0, 0))
+    assert g.bounds() == rt.BoundingBox(rt.Point(-1, -1, -1), rt.Point(4, 1, 1))
+    g.intersect(rt.Ray(rt.Point(0, 5, -5), rt.Vector(0, 0, 1)))
+    assert CountingSphere.calls == 0
+    g.intersect(rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1)))
+    assert CountingSphere.calls == 2
+
+
+def test_group_bounds_follow_child_transform():
+    s = rt.Sphere()
+    g = rt.Group([s])
+    assert g.bounds() == rt.BoundingBox(rt.Point(-1, -1, -1), rt.Point(1, 1, 1))
+    s.set_transform(rt.translation(2, 0, 0))
+    assert g.bounds() == rt.BoundingBox(rt.Point(1, -1, -1), rt.Point(3, 1, 1))
+
+
+def test_normal_on_child_object():
+    g1 = rt.Group()
+    g1.set_transform(rt.rotation_y(pi / 2))
+    g2 = rt.Group()
+    g2.set_transform(rt.scaling(1, 2, 3))
+    g1.add_child(g2)
+    s = rt.Sphere()
+    s.set_transform(rt.translation(5, 0, 0))
+    g2.add_child(s)
+    n = s.normal_at(rt.Point(1.7321, 1.1547, -5.5774))
+    # the expected values are rounded to four digits
+    assert math.isclose(n.x, 0.2857, abs_tol=1e-4)
+    assert math.isclose(n.y, 0.4286, abs_tol=1e-4)
+    assert math.isclose(n.z, -0.8571, abs_tol=1e-4)
+    assert s.world_inverse.multiply(s.world_transform).approximately_equals(
+        rt.create_identity_matrix(), rt.ABS_TOL
+    )
+    assert s.world_bounds() == rt.BoundingBox(
+        rt.Point(-3, -2, -6), rt.Point(3, 2, -4)
+    )
+
+
+def test_grouped_world_renders_like_flat_world():
+    def spheres():
+        s1 = rt.Sphere()
+        s1.material = rt.Material(
+            pattern=rt.StripePattern(rt.Colors.red, rt.Colors.white), specular=0.3
+        )
+        s2 = rt.Sphere()
+        s2.set_transform(rt.translation(2.5, 0, 0))
+        return s1, s2
+
+    flat = rt.World()
+    s1, s2 = spheres()
+    s1.set_transform(rt.translation(-1, 0.5, 0))
+    s2.set_transform(rt.translation(1.5, 0.5, 0))
+    flat.objects = [s1, s2, rt.Plane()]
+    grouped = rt.World()
+    g = rt.Group(spheres())
+    g.set_transform(rt.translation(-1, 0.5, 0))
+    grouped.objects = [g, rt.Plane()]
+    for w in [flat, grouped]:
+        w.objects[-1].set_transform(rt.translation(0, -1, 0))
+        w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+
+    c = rt.Camera(20, 10, pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 1.5, -5), rt.Point(0, 0.5, 0), rt.Vector(0, 1, 0)
+    )
+    expected = c.render(flat)
+    for canvas in [c.render(grouped), c.render_vectorized(grouped)]:
+        for y in range(c.vsize):
+            for x in range(c.hsize):
+                assert canvas.pixel_at(x, y) == expected.pixel_at(x, y)
+
+
+def test_sphere_occludes():
+    s = rt.Sphere()
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    assert s.occludes(r, 10)
+    assert s.occludes(r, 4.5)
+    assert not s.occludes(r, 4)
+    assert not s.occludes(rt.Ray(rt.Point(0, 0, 5), rt.Vector(0, 0, 1)), 10)
+    assert s.occludes(rt.Ray(rt.Point(0, 0, 0), rt.Vector(0, 0, 1)), 10)
+
+
+def test_plane_and_group_occlude():
+    p = rt.Plane()
+    r = rt.Ray(rt.Point(0, 1, 0), rt.Vector(0, -1, 0))
+    assert p.occludes(r, 2)
+    assert not p.occludes(r, 1)
+    assert not p.occludes(rt.Ray(rt.Point(0, 1, 0), rt.Vector(1, 0, 0)), 10)
+    s = rt.Sphere()
+    s.set_transform(rt.translation(0, 0, 5))
+    g = rt.Group([s])
+    assert g.occludes(rt.Ray(rt.Point(0, 0, 0), rt.Vector(0, 0, 1)), 5)
+    assert not g.occludes(rt.Ray(rt.Point(0, 0, 0), rt.Vector(0, 0, 1)), 3)
+
+
+def test_closest_hit():
+    s = rt.Sphere()
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    assert s.closest_hit(r).t == 4
+    assert s.closest_hit(r).shape is s
+    assert s.closest_hit(r, 4) is None
+    assert s.closest_hit(rt.Ray(rt.Point(0, 0, 0), rt.Vector(0, 0, 1))).t == 1
+    p = rt.Plane()
+    assert p.closest_hit(rt.Ray(rt.Point(0, 1, 0), rt.Vector(0, -1, 0))).t == 1
+    assert p.closest_hit(rt.Ray(rt.Point(0, 1, 0), rt.Vector(1, 0, 0))) is None
+
+
+def test_group_closest_hit_reports_child():
+    near, far = rt.Sphere(), rt.Sphere()
+    near.set_transform(rt.translation(0, 0, 2))
+    far.set_transform(rt.translation(0, 0, 6))
+    g = rt.Group([far, rt.Group([near])])
+    g.set_transform(rt.scaling(2, 2, 2))
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    intersection = g.closest_hit(r)
+    assert intersection.shape is near
+    assert intersection.t == rt.hit(g.intersect(r)).t
+
+
+def _instanced_and_copied_spheres():
+    pattern = rt.StripePattern(rt.Colors.red, rt.Colors.white)
+    pattern.transform = rt.scaling(0.2, 1, 1)
+    material = rt.Material(pattern=pattern, diffuse=0.7, specular=0.3)
+    prototype = rt.Sphere()
+    prototype.set_transform(rt.scaling(0.5, 0.8, 0.5))
+    prototype.material = material
+    placements = [
+        rt.translation(x, 0, z).multiply(rt.rotation_y(x + z))
+        for x in (-1.5, 0, 1.5)
+        for z in (0, 2)
+    ]
+    instances = [rt.Instance(prototype, placement) for placement in placements]
+    copies = []
+    for placement in placements:
+        copy = rt.Sphere()
+        copy.set_transform(placement.multiply(prototype.transform))
+        copy.material = material
+        copies.append(copy)
+    return instances, copies
+
+
+def test_instances_render_like_copies():
+    instances, copies = _instanced_and_copied_spheres()
+    worlds = []
+    for objects in [instances, copies]:
+        w = rt.World()
+        w.objects = [rt.Plane()] + objects
+        w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+        worlds.append(w)
+    assert all(s in worlds[0].acceleration_structure().bounded for s in instances)
+    c = rt.Camera(24, 16, math.pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 2, -6), rt.Point(0, 0, 1), rt.Vector(0, 1, 0)
+    )
+    for render in [c.render, c.render_vectorized]:
+        expected = render(worlds[1])
+        canvas = render(worlds[0])
+        for y in range(c.vsize):
+            for x in range(c.hsize):
+                assert canvas.pixel_at(x, y) == expected.pixel_at(x, y)
+
+
+def test_instance_queries_match_copy():
+    instances, copies = _instanced_and_copied_spheres()
+    instance, copy = instances[3], copies[3]
+    assert instance.world_bounds() == copy.world_bounds()
+    r = rt.Ray(rt.Point(0, 0.1, -5), rt.Vector(0.01, 0, 1))
+    assert [i.t for i in instance.intersect(r)] == [i.t for i in copy.intersect(r)]
+    assert all(i.shape is instance for i in instance.intersect(r))
+    assert instance.closest_hit(r).t == copy.closest_hit(r).t
+    assert instance.closest_hit(r).shape is instance
+    assert instance.occludes(r, 10) and not instance.occludes(r, 1)
+    point = r.position(instance.closest_hit(r).t)
+    assert instance.normal_at(point) == copy.normal_at(point)
+
+
+def test_instances_share_prototype():
+    prototype = rt.Sphere()
+    transforms = np.stack([rt.translation(x, 0, 0).matrix for x in range(3)])
+    instances = rt.Instance.from_transforms(prototype, transforms)
+    assert [i.transform.matrix[0, 3] for i in instances] == [0, 1, 2]
+    assert all(np.shares_memory(i.transform.matrix, transforms) for i in instances)
+    prototype.material = rt.Material(ambient=0.5)
+    assert all(i.material is prototype.material for i in instances)
+    with pytest.raises(AttributeError):
+        instances[0].material = rt.Material()
+    with pytest.raises(ValueError):
+        rt.Instance(rt.Group([rt.Sphere()]))
+    with pytest.raises(TypeError):
+        rt.Instance(instances[0])
@@ -159,3 +159,29 @@ def test_color_hadamard_product():
     c1 = Color(1, 0.2, 0.4)
     c2 = Color(0.9, 1, 0.1)
     assert c1.hadamard_product(c2) == Color(0.9, 0.2, 0.04)
+
+
+def test_tuples_and_colors_have_no_instance_dict():
+    for value in [Tuple(1, 2, 3, 4), Point(1, 2, 3), Vector(1, 2, 3), Color(1, 2, 3)]:
+        assert not hasattr(value, "__dict__")
+
+
+def test_in_place_tuple_operations():
+    a = Point(1, -2, 3)
+    assert a.iadd(Vector(1, 1, 1)) is a
+    assert a == Point(2, -1, 4)
+    assert a.imul(0.5) == Tuple(1, -0.5, 2, 0.5)
+
+
+def test_normalize_vector_in_place():
+    v = Vector(1, 2, 3)
+    assert v.normalize_() is v
+    assert v == Vector(1 / math.sqrt(14), 2 / math.sqrt(14), 3 / math.sqrt(14))
+
+
+def test_in_place_color_operations():
+    c = Color(0.2, 0.3, 0.4)
+    assert c.iadd(Color(0.1, 0.1, 0.1)) is c
+    assert c == Color(0.3, 0.4, 0.5)
+    assert c.imul(2) == Color(0.6, 0.8, 1.0)
+    assert c.fma(Color(1, 0.5, 0), 0.2) == Color(0.8, 0.9, 1.0)
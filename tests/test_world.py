@@ -1,3 +1,7 @@
+import math
+
+import numpy as np
+
 import raytracer as rt
 
 
@@ -115,3 +119,202 @@ def test_shade_hit_is_given_intersection_in_shadow():
     comps = rt.prepare_computations(i, r)
     c = w.shade_hit(comps)
     assert c == rt.Color(0.1, 0.1, 0.1)
+
+
+def test_color_at_bundle_matches_color_at():
+    w = rt.World.default()
+    rays = [
+        rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 1, 0)),
+        rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1)),
+        rt.Ray(rt.Point(0, 0, 0.75), rt.Vector(0, 0, -1)),
+    ]
+    colors = w.color_at_bundle(rt.RayBundle.from_rays(rays))
+    for r, color in zip(rays, colors.tolist()):
+        assert rt.Color(*color) == w.color_at(r)
+
+
+def test_is_shadowed_array():
+    w = rt.World.default()
+    points = [rt.Point(0, 10, 0), rt.Point(10, -10, 10), rt.Point(-20, 20, -20)]
+    shadowed = w.is_shadowed_array(np.array([(p.x, p.y, p.z, p.w) for p in points]))
+    assert list(shadowed) == [w.is_shadowed(p) for p in points]
+
+
+def test_occluder_stops_at_first_object():
+    w = rt.World.default()
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    assert w.occluder(r, 4.2) is w.objects[0]
+    assert w.occluder(r, 3.9) is None
+    w.accelerator = None
+    assert w.occluder(r, 4.2) is w.objects[0]
+
+
+def _walls_and_floor_world():
+    floor = rt.Sphere()
+    floor.set_transform(rt.scaling(10, 0.01, 10))
+    floor.material = rt.Material(pattern=rt.ConstantPattern(rt.Color(1, 0.9, 0.9)))
+    walls = []
+    for angle in [-math.pi / 4, math.pi / 4]:
+        wall = rt.Sphere()
+        wall.set_transform(
+            rt.translation(0, 0, 5)
+            .multiply(rt.rotation_y(angle))
+            .multiply(rt.rotation_x(math.pi / 2))
+            .multiply(rt.scaling(10, 0.01, 10))
+        )
+        walls.append(wall)
+    middle = rt.Sphere()
+    middle.set_transform(rt.translation(-0.5, 1, 0.5))
+    w = rt.World()
+    w.objects = [floor, *walls, middle]
+    w.lightSource = rt.PointLight(rt.Point(-10, 10, -10), rt.Color(1, 1, 1))
+    return w
+
+
+def test_shadow_cache_reuses_last_occluder():
+    cached = _walls_and_floor_world()
+    c = rt.Camera(30, 15, math.pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 1.5, -5), rt.Point(0, 1, 0), rt.Vector(0, 1, 0)
+    )
+    canvas = c.render(cached)
+    shadow_rays = cached.shadow_cache_hits + cached.shadow_cache_misses
+    assert shadow_rays + cached.culled_shadow_rays == c.hsize * c.vsize
+
+    uncached = _walls_and_floor_world()
+    shadowed = []
+
+    def is_shadowed(p, light=None):
+        v = uncached.lightSource.position - p
+        shadowed.append(uncached.occluder(rt.Ray(p, v.normalize()), v.magnitude()))
+        return shadowed[-1] is not None
+
+    uncached.is_shadowed = is_shadowed
+    expected = c.render(uncached)
+    for y in range(c.vsize):
+        for x in range(c.hsize):
+            assert canvas.pixel_at(x, y) == expected.pixel_at(x, y)
+    # all but the first shadow ray in each shadowed region hit the cache
+    shadowed_count = len([s for s in shadowed if s is not None])
+    assert cached.shadow_cache_hits > 0.8 * shadowed_count
+
+
+def test_shadow_cache_is_dropped_when_objects_change():
+    w = rt.World.default()
+    p = rt.Point(10, -10, 10)
+    assert w.is_shadowed(p)
+    assert w.is_shadowed(p)
+    assert w.shadow_cache_hits == 1
+    w.objects = []
+    assert not w.is_shadowed(p)
+
+
+def test_removed_objects_leave_the_scene():
+    w = rt.World()
+    shapes = [rt.Sphere() for _ in range(7)]
+    w.objects = shapes
+    group = rt.Group([rt.Sphere()])
+    w.objects.append(group)
+    w.objects.remove(shapes[0])
+    w.objects.pop(0)
+    del w.objects[0]
+    del w.objects[0:1]
+    w.objects[0:1] = []
+    w.objects[0] = rt.Sphere()
+    w.objects.remove(group)
+    removed = [*shapes[:6], group.children[0]]
+    version = w.objects.version
+    for shape in removed:
+        shape.set_transform(rt.translation(0, 1, 0))
+    assert w.objects.version == version
+    shapes[6].set_transform(rt.translation(0, 1, 0))
+    assert w.objects.version != version
+    objects = w.objects
+    objects.clear()
+    w.objects = [shapes[6]]
+    version = objects.version
+    shapes[6].set_transform(rt.translation(0, 2, 0))
+    assert objects.version == version
+
+
+def test_objects_added_twice_stay_in_the_scene_until_removed_twice():
+    w = rt.World()
+    prototype = rt.Sphere()
+    s = rt.Sphere()
+    w.objects = [s, s, rt.Instance(prototype), rt.Instance(prototype)]
+    w.objects.pop()
+    w.objects.remove(s)
+    version = w.objects.version
+    prototype.set_transform(rt.translation(0, 1, 0))
+    s.set_transform(rt.translation(0, 1, 0))
+    assert w.objects.version == version + 2
+    w.objects.clear()
+    prototype.set_transform(rt.translation(0, 2, 0))
+    s.set_transform(rt.translation(0, 2, 0))
+    assert w.objects.version == version + 3
+
+
+def test_light_source_is_the_first_light():
+    w = rt.World()
+    assert w.lights == []
+    light = rt.PointLight(rt.Point(0, 10, 0), rt.Color(1, 1, 1))
+    w.lightSource = light
+    assert w.lights == [light]
+    other = rt.PointLight(rt.Point(10, 0, 0), rt.Color(0.5, 0.5, 0.5))
+    w.lights.append(other)
+    assert w.lightSource is light
+    w.lightSource = None
+    assert w.lights == []
+
+
+def _lights_world():
+    w = rt.World.default()
+    w.lights = [
+        rt.PointLight(rt.Point(-10, 10, -10), rt.Color(0.6, 0.6, 0.6)),
+        rt.PointLight(rt.Point(5, 2, -5), rt.Color(0.2, 0.3, 0.4), radius=20),
+        # too far away to reach the spheres
+        rt.PointLight(rt.Point(0, 0, 30), rt.Color(1, 1, 1), radius=10),
+    ]
+    return w
+
+
+def test_shade_hit_sums_lights():
+    w = _lights_world()
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    comps = rt.prepare_computations(rt.Intersection(4, w.objects[0]), r)
+    expected = rt.Color(0, 0, 0)
+    for light in w.lights[:2]:
+        in_shadow = w.is_shadowed(comps.over_point, light)
+        expected = expected + rt.lighting(light, comps, in_shadow)
+    assert w.shade_hit(comps) == expected
+
+
+def test_lights_out_of_reach_cast_no_shadow_rays():
+    w = _lights_world()
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    comps = rt.prepare_computations(rt.Intersection(4, w.objects[0]), r)
+    w.shade_hit(comps)
+    assert w.shadow_cache_misses + w.shadow_cache_hits == 2
+    assert w.culled_shadow_rays == 1
+
+
+def test_lights_behind_the_surface_cast_no_shadow_rays():
+    w = rt.World.default()
+    w.lightSource = rt.PointLight(rt.Point(0, 0, 10), rt.Color(1, 1, 1))
+    r = rt.Ray(rt.Point(0, 0, -5), rt.Vector(0, 0, 1))
+    comps = rt.prepare_computations(rt.Intersection(4, w.objects[0]), r)
+    assert w.shade_hit(comps) == rt.Color(0.08, 0.1, 0.06)
+    assert w.shadow_cache_misses + w.shadow_cache_hits == 0
+    assert w.culled_shadow_rays == 1
+
+
+def test_color_at_bundle_matches_color_at_with_lights():
+    w = _lights_world()
+    c = rt.Camera(20, 10, math.pi / 3)
+    c.transform = rt.view_transform(
+        rt.Point(0, 1.5, -5), rt.Point(0, 1, 0), rt.Vector(0, 1, 0)
+    )
+    bundle = c.rays_for_pixels(np.arange(200) % 20, np.arange(200) // 20)
+    colors = w.color_at_bundle(bundle)
+    for i, color in enumerate(colors.tolist()):
+        assert rt.Color(*color) == w.color_at(bundle[i])